@@ -0,0 +1,78 @@
+# benchmarks/coldstart.py
+# Movements, Not Chords by Trevor Ritchie
+#
+# Cold start, from launching Python to the first playable note: importing mncengine, setting up a session like mnc.py,
+# then tilting and tapping a chord numeral. Each run is a fresh process, with the voicing tables built before listening
+# (precomputeVoicings(), eager) or on a thread while the first taps build what they need (precomputeInBackground(), lazy).
+# Prints the median milliseconds since launch of each point, and of the tables being full.
+# JythonMusic's own startup (the JVM, Play and OscIn) comes before all of this, and isn't measured here.
+#
+# Run from the repository folder: python benchmarks/coldstart.py [--runs 15]
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+launchedAt = time.time()
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+POINTS = ["python", "imported", "listening", "first note", "tables full"]
+
+# Remembers when the first noteOn was sent
+class FirstNoteMidiOut(object):
+    def __init__(self):
+        self.firstNoteAt = None
+
+    def noteOn(self, pitch, volume=100, channel=0):
+        if self.firstNoteAt is None:
+            self.firstNoteAt = time.time()
+
+    def noteOff(self, pitch, channel=0):
+        pass
+
+    def setVolume(self, volume, channel=0):
+        pass
+
+# One cold start in this process, prints when each point was reached
+def start(lazy):
+    import mncengine
+    importedAt = time.time()
+    midiOut = FirstNoteMidiOut()
+    mncengine.connect(midiOut, mncengine.MemoryTimer, mncengine.ThreadScheduler)
+    if lazy:
+        thread = mncengine.precomputeInBackground()
+    else:
+        mncengine.precomputeVoicings()
+    oscIn = mncengine.MemoryOscIn()
+    mncengine.listen(oscIn)
+    listeningAt = time.time()
+
+    oscIn.receive("/accxyz", [-0.45, -0.5, 0.0])
+    oscIn.receive("/7/push8", [1.0])
+    if lazy:
+        thread.join()
+    print(json.dumps([launchedAt, importedAt, listeningAt, midiOut.firstNoteAt, time.time()]))
+
+def median(values):
+    return sorted(values)[len(values) // 2]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time from launching Python to the first note, with eager and lazy voicing tables")
+    parser.add_argument("--runs", type=int, default=15)
+    parser.add_argument("--child", choices=["eager", "lazy"], help=argparse.SUPPRESS)
+    options = parser.parse_args()
+    if options.child:
+        start(options.child == "lazy")
+        sys.exit(0)
+
+    print("%-6s %s" % ("", "  ".join("%11s" % point for point in POINTS)))
+    for mode in ["eager", "lazy"]:
+        runs = []
+        for _ in range(options.runs):
+            spawnedAt = time.time()
+            output = subprocess.check_output([sys.executable, os.path.abspath(__file__), "--child", mode])
+            runs.append([(at - spawnedAt) * 1000 for at in json.loads(output.decode("ascii"))])
+        print("%-6s %s" % (mode, "  ".join("%8.1f ms" % median([run[index] for run in runs]) for index in range(len(POINTS)))))
@@ -0,0 +1,131 @@
+# benchmarks/envelopes.py
+# Movements, Not Chords by Trevor Ritchie
+#
+# How often envelope timers wake up, and how far their intervals drift from DECAY_TIME_MS, with DECAY on.
+# Phones tap and release at a steady rate, so their release envelopes overlap. mncengine's one envelope timer
+# steps them all, next to a timer for each running envelope, the way the timers per note and per session worked before it.
+# Run from the repository folder: python benchmarks/envelopes.py [--phones 8] [--seconds 5] [--taps 2]
+
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import mncengine
+
+clock = mncengine.clock
+
+# A MIDI output that plays nothing
+class NullMidiOut(object):
+    def noteOn(self, pitch, volume=100, channel=0):
+        pass
+
+    def noteOff(self, pitch, channel=0):
+        pass
+
+    def setVolume(self, volume, channel=0):
+        pass
+
+# When each phone taps, a release envelope starting every time
+def tapTimes(phones, seconds, taps, seed):
+    rng = random.Random(seed)
+    times = []
+    for phone in range(phones):
+        tapAt = rng.uniform(0, 1.0 / taps)
+        while tapAt < seconds:
+            times.append((tapAt, phone))
+            tapAt += 1.0 / taps
+    return sorted(times)
+
+# Tap every phone's session at its times, each tap attacking and then releasing its envelopes
+def play(sessions, taps, started=None):
+    start = clock()
+    for tapAt, phone in taps:
+        time.sleep(max(0.0, start + tapAt - clock()))
+        session = sessions[phone]
+        with session.lock:
+            session.attackEnvelopes()
+            session.releaseEnvelopes()
+            if started is not None:
+                started(session)
+    while mncengine.runningEnvelopes:
+        time.sleep(0.01)
+    return clock() - start
+
+# One ThreadTimer steps every running envelope, counting its wakeups and jitter in the engine
+def runShared(phones, taps):
+    mncengine.connect(NullMidiOut(), mncengine.ThreadTimer)
+    mncengine.envelopeWakeups = 0
+    mncengine.envelopeMaxJitterMs = 0.0
+    sessions = [mncengine.Session(mncengine.midiOut, 2 * phone, 2 * phone + 1) for phone in range(phones)]
+    seconds = play(sessions, taps)
+    mncengine.envelopeTimer.stop()
+    return mncengine.envelopeWakeups, mncengine.envelopeMaxJitterMs, seconds
+
+# A timer for each running envelope, started by the tap and stopped when its envelope ends
+class EnvelopeTimers(object):
+    def __init__(self):
+        self.timers = {} # (session, channel) -> ThreadTimer
+        self.lastTicks = {} # (session, channel) -> time.time() of its last wakeup, None until it has one
+        self.wakeups = 0
+        self.maxJitterMs = 0.0
+        self.lock = threading.Lock()
+
+    # Called with the session's lock held, after it started its envelopes
+    def start(self, session):
+        for key in list(mncengine.runningEnvelopes):
+            if key[0] is session:
+                if key not in self.timers:
+                    self.timers[key] = mncengine.ThreadTimer(mncengine.DECAY_TIME_MS, self.tick, [key], True)
+                if not self.timers[key].isRunning():
+                    self.lastTicks[key] = None
+                    self.timers[key].start()
+
+    def tick(self, key):
+        now = time.time()
+        with self.lock:
+            if self.lastTicks[key] is not None:
+                self.maxJitterMs = max(self.maxJitterMs, abs((now - self.lastTicks[key]) * 1000 - mncengine.DECAY_TIME_MS))
+            self.lastTicks[key] = now
+            self.wakeups += 1
+        session, channel = key
+        with session.lock:
+            if key in mncengine.runningEnvelopes:
+                session.stepEnvelope(channel)
+            if key not in mncengine.runningEnvelopes:
+                self.timers[key].stop()
+
+def runTimers(phones, taps):
+    mncengine.connect(NullMidiOut(), mncengine.MemoryTimer) # the shared timer never fires
+    timers = EnvelopeTimers()
+    sessions = [mncengine.Session(mncengine.midiOut, 2 * phone, 2 * phone + 1) for phone in range(phones)]
+    seconds = play(sessions, taps, timers.start)
+    for timer in timers.timers.values():
+        timer.stop()
+    return timers.wakeups, timers.maxJitterMs, seconds
+
+def report(name, wakeups, maxJitterMs, seconds, threads):
+    print("%-18s %8.0f wakeups/s  max jitter %7.3f ms  %3d timer threads" % (name, wakeups / seconds, maxJitterMs, threads))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Envelope timer wakeups and jitter, one timer against one per envelope")
+    parser.add_argument("--phones", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--taps", type=float, default=2.0, help="taps per second per phone")
+    parser.add_argument("--seed", type=int, default=1)
+    options = parser.parse_args()
+
+    mncengine.configure(DECAY=True)
+    taps = tapTimes(options.phones, options.seconds, options.taps, options.seed)
+    print("%d phones, %d taps, DECAY_TIME_MS %d, release %d ms" % (options.phones, len(taps), mncengine.DECAY_TIME_MS,
+                                                                  mncengine.ENVELOPES[0][3]))
+
+    wakeups, maxJitterMs, seconds = runShared(options.phones, taps)
+    report("one envelope timer", wakeups, maxJitterMs, seconds, 1)
+
+    threadsBefore = threading.active_count()
+    wakeups, maxJitterMs, seconds = runTimers(options.phones, taps)
+    report("timer per envelope", wakeups, maxJitterMs, seconds, threading.active_count() - threadsBefore)
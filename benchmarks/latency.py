@@ -0,0 +1,234 @@
+# benchmarks/latency.py
+# Movements, Not Chords by Trevor Ritchie
+#
+# Latency of every stage between a tap and its noteOn, for gesture streams like a performance:
+# chord numeral taps, family button sequences, continuous tilt sweeps, and recordings from recorder.py.
+# MIDI goes to a stub that only notes when the first noteOn of each tap arrives.
+# Stage times include the stages they call, ex: handleTouchInput includes playChord.
+#
+# Run from the repository folder:
+#   python benchmarks/latency.py [--recording performance.mncr] [--json results.json] [--compare baseline.json]
+# With --compare, stages whose p50 or p95 got slower than --tolerance exit with status 1.
+# To see what a mode costs, save a run without it and compare a run with it, ex: --voice-leading --compare baseline.json
+
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import mncengine
+
+EVENTS_PER_STREAM = 30000
+STAGES = ["handleTouchInput", "buttonOperations", "mapAccelerometerToPitch", "contraryMotion", "leadVoices", "playChord"]
+PERCENTILES = [("p50", 0.5), ("p95", 0.95), ("p99", 0.99)]
+SENDER = ("10.0.0.2", 9000)
+
+NUMERAL_BUTTONS = ["16", "12", "h8", "h4", "15", "11", "h7", "h3"]
+FAMILY_BUTTONS = ["h5", "h9", "13", "14", "h2", "10", "h6"] # family down, across, up, alt, dominant, on and off chord lock
+
+clock = time.perf_counter
+
+# A MIDI output that throws messages away, remembering when the first noteOn after start() arrived
+class StubMidiSink(object):
+    def __init__(self):
+        self.firstNoteOn = None
+        self.messages = 0
+
+    def start(self):
+        self.firstNoteOn = None
+
+    def noteOn(self, pitch, volume=100, channel=0):
+        if self.firstNoteOn is None:
+            self.firstNoteOn = clock()
+        self.messages += 1
+
+    def noteOff(self, pitch, channel=0):
+        self.messages += 1
+
+    def setVolume(self, volume, channel=0):
+        self.messages += 1
+
+# region Gesture Streams
+def tilt(rng):
+    return [rng.uniform(-0.99, 0.1), rng.uniform(-0.99, 0.0), rng.uniform(-1.0, 1.0)]
+
+def press(button, onOrOff):
+    button = button[1:] if button.startswith("h") else button # "h8" is the button named by "/7/push8"
+    return (SENDER, "/7/push" + button, [onOrOff])
+
+# Chord numeral taps, a few tilt messages between each press and release
+def numeralStream(rng, eventCount):
+    events = [(SENDER, "/accxyz", tilt(rng))]
+    while len(events) < eventCount:
+        button = rng.choice(NUMERAL_BUTTONS)
+        events.append(press(button, 1.0))
+        events.extend((SENDER, "/accxyz", tilt(rng)) for _ in range(rng.randrange(1, 4)))
+        events.append(press(button, 0.0))
+        events.append((SENDER, "/accxyz", tilt(rng)))
+    return events
+
+# Hold a chord numeral and tap through family, alt and dominant buttons over it
+def familyStream(rng, eventCount):
+    events = [(SENDER, "/accxyz", tilt(rng))]
+    while len(events) < eventCount:
+        numeral = rng.choice(NUMERAL_BUTTONS)
+        events.append(press(numeral, 1.0))
+        for _ in range(rng.randrange(2, 6)):
+            button = rng.choice(FAMILY_BUTTONS)
+            events.append((SENDER, "/accxyz", tilt(rng)))
+            events.append(press(button, 1.0))
+            events.append(press(button, 0.0))
+        events.append(press(numeral, 0.0))
+    return events
+
+# Smooth tilt sweeps at the rate TouchOSC sends /accxyz, tapping a chord numeral every few messages
+def sweepStream(rng, eventCount):
+    events = []
+    step = 0
+    while len(events) < eventCount:
+        phase = step * 0.02
+        events.append((SENDER, "/accxyz", [-0.45 + 0.5 * math.sin(phase), -0.5 + 0.45 * math.sin(phase * 0.7), math.cos(phase)]))
+        if step % 8 == 0:
+            button = NUMERAL_BUTTONS[(step // 64) % len(NUMERAL_BUTTONS)]
+            events.append(press(button, 1.0))
+            events.append(press(button, 0.0))
+        step += 1
+    return events
+
+# The OSC of a recording, every phone played into one session
+def recordedStream(path):
+    import recorder
+    return [(SENDER, address, arguments) for seconds, phone, address, arguments in recorder.readRecords(path)]
+# endregion
+
+# region Measurement
+def percentile(sortedValues, fraction):
+    return sortedValues[min(int(len(sortedValues) * fraction), len(sortedValues) - 1)]
+
+# count, mean and percentiles in microseconds
+def summarize(samples):
+    if not samples:
+        return {"count": 0}
+    samples = sorted(samples)
+    summary = {"count": len(samples), "mean": sum(samples) / len(samples) * 1e6}
+    for name, fraction in PERCENTILES:
+        summary[name] = percentile(samples, fraction) * 1e6
+    return summary
+
+# Wrap a Session method so every call is timed into samples
+def timeStage(function, samples):
+    def timed(*arguments):
+        start = clock()
+        try:
+            return function(*arguments)
+        finally:
+            samples.append(clock() - start)
+    return timed
+
+# Play a stream through a fresh session, returns {stage: summary}
+def measure(events):
+    sink = StubMidiSink()
+    host = mncengine.SessionHost([sink])
+    for sender, address, arguments in events[:500]: # warm up
+        host.receive(sender, address, arguments)
+
+    samples = dict((stage, []) for stage in STAGES)
+    originals = dict((stage, getattr(mncengine.Session, stage)) for stage in STAGES)
+    for stage in STAGES:
+        setattr(mncengine.Session, stage, timeStage(originals[stage], samples[stage]))
+
+    tapLatencies = [] # receive() of a press to its first noteOn
+    accelerometerLatencies = []
+    try:
+        for sender, address, arguments in events:
+            sink.start()
+            start = clock()
+            host.receive(sender, address, arguments)
+            end = clock()
+            if address == mncengine.ACCELEROMETER_ADDRESS:
+                accelerometerLatencies.append(end - start)
+            elif sink.firstNoteOn is not None:
+                tapLatencies.append(sink.firstNoteOn - start)
+    finally:
+        for stage in STAGES:
+            setattr(mncengine.Session, stage, originals[stage])
+
+    results = dict((stage, summarize(samples[stage])) for stage in STAGES)
+    results["tapToNoteOn"] = summarize(tapLatencies)
+    results["accelerometer"] = summarize(accelerometerLatencies)
+    return results
+# endregion
+
+# region Results
+def revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def printResults(streams):
+    print("%-10s %-24s %7s %9s %9s %9s" % ("stream", "stage", "count", "p50 us", "p95 us", "p99 us"))
+    for streamName in streams:
+        for stage, summary in streams[streamName].items():
+            if summary["count"]:
+                print("%-10s %-24s %7d %9.2f %9.2f %9.2f" % (streamName, stage, summary["count"], summary["p50"], summary["p95"], summary["p99"]))
+
+# Print stages that got slower than the baseline by more than tolerance, returns how many did
+def compare(streams, baseline, tolerance):
+    regressions = 0
+    for streamName in streams:
+        for stage, summary in streams[streamName].items():
+            before = baseline.get("streams", {}).get(streamName, {}).get(stage)
+            if not before or not before.get("count") or not summary["count"]:
+                continue
+            for name in ["p50", "p95"]:
+                ratio = summary[name] / before[name] if before[name] else 1.0
+                if ratio > 1.0 + tolerance:
+                    regressions += 1
+                    print("slower: %s %s %s %.2f us -> %.2f us (%+.0f%%)" % (streamName, stage, name, before[name], summary[name], (ratio - 1) * 100))
+    return regressions
+# endregion
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tap to noteOn latency per stage")
+    parser.add_argument("--recording", action="append", default=[], help="also measure a recording from recorder.py")
+    parser.add_argument("--events", type=int, default=EVENTS_PER_STREAM, help="events per synthetic stream")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="save the results here")
+    parser.add_argument("--compare", help="results saved by an earlier run to compare against")
+    parser.add_argument("--voice-leading", action="store_true", help="turn VOICE_LEADING on")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="how much slower counts as a regression, 0.25 = 25%%")
+    options = parser.parse_args()
+
+    mncengine.configure(VOICE_LEADING=options.voice_leading)
+    mncengine.precomputeVoicings()
+    rng = random.Random(options.seed)
+    streams = {
+        "numerals": numeralStream(rng, options.events),
+        "families": familyStream(rng, options.events),
+        "sweeps": sweepStream(rng, options.events),
+    }
+    for path in options.recording:
+        streams[os.path.basename(path)] = recordedStream(path)
+
+    results = dict((streamName, measure(events)) for streamName, events in streams.items())
+    printResults(results)
+
+    if options.json:
+        with open(options.json, "w") as jsonFile:
+            json.dump({"revision": revision(), "python": platform.python_version(), "platform": platform.platform(),
+                       "settings": dict((name, getattr(mncengine, name)) for name in mncengine.SETTINGS),
+                       "events": options.events, "seed": options.seed, "streams": results}, jsonFile, indent=2, sort_keys=True)
+
+    if options.compare:
+        with open(options.compare) as baselineFile:
+            regressions = compare(results, json.load(baselineFile), options.tolerance)
+        print(str(regressions) + " regressions against " + options.compare)
+        sys.exit(1 if regressions else 0)
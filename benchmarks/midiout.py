@@ -0,0 +1,147 @@
+# benchmarks/midiout.py
+# Movements, Not Chords by Trevor Ritchie
+#
+# How long a chord change takes to send, from tap to its last MIDI byte written to a loopback port:
+# RawMidiOut sending each noteOn, noteOff and setVolume as its own write, the way separate Play calls go out,
+# next to RawMidiOut sending the whole chord change as one buffer with running status.
+# The loopback is a pipe read back on another thread, and what comes out of it is checked against MemoryMidiOut.
+# Pass --port to write to a real port instead, ex: a snd-virmidi rawmidi device, which is not read back.
+#
+# Run from the repository folder: python benchmarks/midiout.py [--taps 20000] [--port /dev/snd/midiC1D0]
+
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import mncengine
+
+PERCENTILES = [("p50", 0.5), ("p95", 0.95), ("p99", 0.99)]
+SENDER = ("10.0.0.2", 9000)
+NUMERAL_BUTTONS = ["16", "12", "8", "4", "15", "11", "7", "3"]
+
+clock = time.perf_counter
+
+# Counts the writes and bytes sent to a port
+class CountingPort(object):
+    def __init__(self, port):
+        self.port = port
+        self.writes = 0
+        self.bytes = 0
+
+    def write(self, data):
+        self.writes += 1
+        self.bytes += len(data)
+        self.port.write(data)
+
+    def close(self):
+        self.port.close()
+
+# A pipe whose read end is drained into received by a thread
+class Loopback(object):
+    def __init__(self):
+        readFd, writeFd = os.pipe()
+        self.reader = os.fdopen(readFd, "rb", 0)
+        self.writer = os.fdopen(writeFd, "wb", 0)
+        self.received = bytearray()
+        self.thread = threading.Thread(target=self.drain)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def drain(self):
+        while True:
+            data = self.reader.read(65536)
+            if not data:
+                return
+            self.received.extend(data)
+
+    # Close the write end and wait for everything written to be read
+    def finish(self):
+        self.writer.close()
+        self.thread.join()
+        self.reader.close()
+        return bytes(self.received)
+
+# Turn raw MIDI back into MemoryMidiOut messages, following running status
+def decode(data):
+    messages = []
+    status = None
+    index = 0
+    while index < len(data):
+        if data[index] & 0x80:
+            status = data[index]
+            index += 1
+        kind, channel = status & 0xF0, status & 0x0F
+        if kind == 0xC0:
+            index += 1
+            continue
+        data1, data2 = data[index], data[index + 1]
+        index += 2
+        if kind == 0x90:
+            messages.append(("noteOn", data1, data2, channel) if data2 else ("noteOff", data1, channel))
+        elif kind == 0xB0 and data1 == 7:
+            messages.append(("setVolume", data2, channel))
+    return messages
+
+def percentile(sortedValues, fraction):
+    return sortedValues[min(int(len(sortedValues) * fraction), len(sortedValues) - 1)]
+
+# Chord numeral taps at random tilts
+def tapStream(taps, seed):
+    rng = random.Random(seed)
+    events = []
+    for _ in range(taps):
+        button = "/7/push" + rng.choice(NUMERAL_BUTTONS)
+        events.append(("/accxyz", [rng.uniform(-0.99, 0.1), rng.uniform(-0.99, 0.0), 0.0], False))
+        events.append((button, [1.0], True))
+        events.append((button, [0.0], False))
+    return events
+
+# Play the taps through a session on midiOut, returns the seconds each chord change took
+def run(midiOut, events):
+    mncengine.connect(midiOut, mncengine.MemoryTimer)
+    mncengine.runningEnvelopes.clear()
+    host = mncengine.SessionHost([midiOut])
+    times = []
+    for address, arguments, timed in events:
+        startedAt = clock()
+        host.receive(SENDER, address, arguments)
+        if timed:
+            times.append(clock() - startedAt)
+    return times
+
+def report(name, times, port):
+    times = sorted(times)
+    line = "%-22s %s" % (name, "  ".join("%s %.2f us" % (label, percentile(times, fraction) * 1e6) for label, fraction in PERCENTILES))
+    if port is not None:
+        line += "  %.2f writes, %.1f bytes per tap and release" % (port.writes / float(len(times)), port.bytes / float(len(times)))
+    print(line)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Chord change send time, one write per message against one buffer per chord")
+    parser.add_argument("--taps", type=int, default=20000)
+    parser.add_argument("--port", help="a rawmidi device to write to instead of a pipe, ex: /dev/snd/midiC1D0")
+    parser.add_argument("--seed", type=int, default=1)
+    options = parser.parse_args()
+
+    mncengine.precomputeVoicings()
+    events = tapStream(options.taps, options.seed)
+
+    memoryOut = mncengine.MemoryMidiOut()
+    report("MemoryMidiOut", run(memoryOut, events), None)
+
+    for name, batch in [("one write per message", False), ("one buffer per chord", True)]:
+        loopback = None if options.port else Loopback()
+        port = CountingPort(open(options.port, "wb", 0) if options.port else loopback.writer)
+        midiOut = mncengine.RawMidiOut(port)
+        midiOut.batch = batch
+        report(name, run(midiOut, events), port)
+        if loopback:
+            if decode(loopback.finish()) != memoryOut.messages:
+                print("%-22s MIDI read back from the loopback differs from MemoryMidiOut" % "")
+                sys.exit(1)
+        else:
+            midiOut.close()
@@ -0,0 +1,225 @@
+# benchmarks/phones.py
+# Movements, Not Chords by Trevor Ritchie
+#
+# How many phones one laptop can host, and how fast they can send /accxyz before taps are delayed.
+# A load process pretends to be N phones running TouchOSC over local UDP: each streams /accxyz at --rates per second,
+# sweeping its tilt, and presses and releases buttons on the /7/push addresses, mostly chord numerals.
+# oscserver.py serves them in this process, sending MIDI through RawMidiOut to pipes that other processes read back,
+# one for every MIDI out the phones fill, so every tap is timed from its datagram being sent to its first noteOn coming out of the loopback.
+# Prints a throughput-vs-latency curve, one row for every number of phones at every rate.
+# One load process sends up to about 14000 messages per second. Past that, sent/s stops following the phones,
+# and --load-processes spreads the phones over more processes, if the laptop has the cores for them.
+#
+# Run from the repository folder:
+#   python benchmarks/phones.py [--phones 1,2,4,8,16] [--rates 50,100,200] [--load-processes 1] [--csv curve.csv]
+
+import argparse
+import asyncio
+import bisect
+import math
+import multiprocessing
+import os
+import random
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import mncengine
+import oscserver
+from midiout import decode
+
+PERCENTILES = [("p50", 0.5), ("p95", 0.95), ("p99", 0.99)]
+NUMERAL_BUTTONS = ["16", "12", "8", "4", "15", "11", "7", "3"]
+MODIFIER_BUTTONS = ["14", "2", "10", "6", "5", "9", "13"] # alt, dominant, on and off chord lock, family down, across and up
+HOLD_SECONDS = (0.08, 0.4) # how long a button is held
+GAP_SECONDS = (0.1, 0.6) # between releasing a button and pressing the next
+TAIL_SECONDS = 0.25 # wait after the phones stop, for the last taps to come out
+
+# Both processes time with the system wide monotonic clock
+clock = time.monotonic
+
+# region Load
+# Send like phoneCount phones for seconds, each from its own socket. Sends back through connection
+# {phone's port: [when each press was sent]}, how many messages were sent and how long sending them really took,
+# which is longer than seconds when one process can't keep up with that many phones.
+def sendLoad(serverPort, phoneCount, rate, seconds, seed, connection):
+    rng = random.Random(seed)
+    sockets = []
+    for _ in range(phoneCount):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind(("127.0.0.1", 0))
+        sockets.append(sock)
+    target = ("127.0.0.1", serverPort)
+    presses = dict((sock.getsockname()[1], []) for sock in sockets)
+    sent = 0
+
+    start = clock() + 0.05
+    # every phone's next /accxyz and next button event, [when, phone, button held or None]
+    accelerometerAt = [start + rng.random() / rate for _ in sockets]
+    buttonAt = [[start + rng.uniform(*GAP_SECONDS), None] for _ in sockets]
+    phases = [rng.random() * 2 * math.pi for _ in sockets]
+    end = start + seconds
+    while True:
+        nextAccelerometer = min(accelerometerAt)
+        nextButton = min(at for at, held in buttonAt)
+        now = min(nextAccelerometer, nextButton)
+        if now >= end:
+            break
+        time.sleep(max(0.0, now - clock()))
+
+        if nextAccelerometer <= nextButton:
+            phone = accelerometerAt.index(nextAccelerometer)
+            sweep = phases[phone] + now * 0.7
+            tilt = [-0.45 + 0.5 * math.sin(sweep), -0.5 + 0.45 * math.sin(sweep * 1.3), 0.0]
+            sockets[phone].sendto(oscserver.encodeMessage("/accxyz", tilt), target)
+            accelerometerAt[phone] += 1.0 / rate
+        else:
+            phone = [at for at, held in buttonAt].index(nextButton)
+            held = buttonAt[phone][1]
+            if held is None:
+                button = rng.choice(NUMERAL_BUTTONS) if rng.random() < 0.8 else rng.choice(MODIFIER_BUTTONS)
+                presses[sockets[phone].getsockname()[1]].append(clock())
+                sockets[phone].sendto(oscserver.encodeMessage("/7/push" + button, [1.0]), target)
+                buttonAt[phone] = [now + rng.uniform(*HOLD_SECONDS), button]
+            else:
+                sockets[phone].sendto(oscserver.encodeMessage("/7/push" + held, [0.0]), target)
+                buttonAt[phone] = [now + rng.uniform(*GAP_SECONDS), None]
+        sent += 1
+
+    connection.send((presses, sent, clock() - start))
+    connection.close()
+
+# Read raw MIDI from a pipe until it closes, sending back through connection [(channel, when its noteOn came out)]
+def readMidi(readFd, writeFd, connection):
+    os.close(writeFd) # or the pipe never ends
+    chunks = []
+    with os.fdopen(readFd, "rb", 0) as reader:
+        while True:
+            data = reader.read(65536)
+            if not data:
+                break
+            chunks.append((clock(), data))
+
+    noteOns = []
+    status = None
+    for receivedAt, data in chunks:
+        if not data[0] & 0x80:
+            data = bytes([status]) + data # the write before this read left running status on
+        for message in decode(data):
+            if message[0] == "noteOn":
+                noteOns.append((message[3], receivedAt))
+        status = [byte for byte in data if byte & 0x80][-1]
+    connection.send(noteOns)
+    connection.close()
+# endregion
+
+# region Measurement
+def percentile(sortedValues, fraction):
+    return sortedValues[min(int(len(sortedValues) * fraction), len(sortedValues) - 1)]
+
+# A RawMidiOut writing to a pipe read back by a readMidi process, returns (midiOut, connection, process)
+def loopbackMidiOut(context):
+    readFd, writeFd = os.pipe()
+    connection, readerConnection = context.Pipe(False)
+    reader = context.Process(target=readMidi, args=(readFd, writeFd, readerConnection))
+    reader.start()
+    os.close(readFd)
+    return mncengine.RawMidiOut(os.fdopen(writeFd, "wb", 0)), connection, reader
+
+# Serve phoneCount phones sending /accxyz at rate for seconds, returns a row of the curve
+async def measure(phoneCount, rate, seconds, seed, loadProcesses):
+    context = multiprocessing.get_context("fork")
+    loopbacks = [loopbackMidiOut(context) for _ in range(int(math.ceil(phoneCount / float(len(mncengine.CHANNEL_PAIRS)))))]
+    midiOuts = [midiOut for midiOut, connection, reader in loopbacks]
+    mncengine.connect(midiOuts[0], mncengine.MemoryTimer)
+    mncengine.runningEnvelopes.clear()
+    host = mncengine.SessionHost(midiOuts, phoneCount)
+    handled = [0]
+    def receive(sender, address, arguments, receivedAt=None):
+        handled[0] += 1
+        host.receive(sender, address, arguments, receivedAt)
+
+    transport, server = await oscserver.startServer(receive, 0, "127.0.0.1")
+    loads = []
+    for index in range(min(loadProcesses, phoneCount)):
+        loadConnection, senderConnection = context.Pipe(False)
+        phones = phoneCount // loadProcesses + (index < phoneCount % loadProcesses)
+        load = context.Process(target=sendLoad, args=(transport.get_extra_info("sockname")[1], phones, rate, seconds, seed + index, senderConnection))
+        load.start()
+        loads.append((load, loadConnection))
+    presses = {}
+    sent = elapsed = 0
+    for load, loadConnection in loads:
+        while not loadConnection.poll():
+            await asyncio.sleep(0.05)
+        loadPresses, loadSent, loadElapsed = loadConnection.recv()
+        presses.update(loadPresses)
+        sent += loadSent
+        elapsed = max(elapsed, loadElapsed)
+        load.join()
+    await asyncio.sleep(TAIL_SECONDS)
+    transport.close()
+    for task in asyncio.all_tasks():
+        if task is not asyncio.current_task():
+            task.cancel() # the server's serve()
+
+    # the first noteOn on a phone's chord channel after a press, and before its next press, is the press coming out
+    noteOnsByChannel = {} # (MIDI out, channel) -> when its noteOns came out
+    for midiOut in midiOuts:
+        midiOut.close() # every reader holds the pipes opened before it, so none of them ends until all are closed
+    for midiOut, connection, reader in loopbacks:
+        for channel, receivedAt in connection.recv():
+            noteOnsByChannel.setdefault((midiOut, channel), []).append(receivedAt)
+        reader.join()
+    latencies = []
+    missed = 0
+    for (address, port), session in host.sessions.items():
+        times = noteOnsByChannel.get((session.midiOut, session.chordChannel), [])
+        pressTimes = presses.get(port, [])
+        for index, pressedAt in enumerate(pressTimes):
+            nextPress = pressTimes[index + 1] if index + 1 < len(pressTimes) else float("inf")
+            found = bisect.bisect_left(times, pressedAt)
+            if found < len(times) and times[found] < nextPress:
+                latencies.append(times[found] - pressedAt)
+            else:
+                missed += 1
+    latencies.sort()
+    stats = server.stats()
+    row = {"phones": phoneCount, "rate": rate, "sent/s": sent / elapsed, "handled/s": handled[0] / elapsed,
+           "coalesced": stats["accelerometerDropped"], "taps": len(latencies), "missed": missed + stats["touchDropped"]}
+    for label, fraction in PERCENTILES:
+        row[label + " ms"] = percentile(latencies, fraction) * 1000 if latencies else float("nan")
+    return row
+# endregion
+
+COLUMNS = ["phones", "rate", "sent/s", "handled/s", "coalesced", "taps", "missed", "p50 ms", "p95 ms", "p99 ms"]
+
+def formatRow(row):
+    return "  ".join(("%9.2f" if isinstance(row[column], float) and column.endswith("ms") else "%9d") % row[column] for column in COLUMNS)
+
+async def main(options):
+    mncengine.precomputeVoicings()
+    rows = []
+    print("  ".join("%9s" % column for column in COLUMNS))
+    for rate in options.rates:
+        for phoneCount in options.phones:
+            row = await measure(phoneCount, rate, options.seconds, options.seed, options.load_processes)
+            rows.append(row)
+            print(formatRow(row))
+    if options.csv:
+        with open(options.csv, "w") as csvFile:
+            csvFile.write(",".join(COLUMNS) + "\n")
+            for row in rows:
+                csvFile.write(",".join(str(row[column]) for column in COLUMNS) + "\n")
+
+if __name__ == "__main__":
+    numbers = lambda text: [int(part) for part in text.split(",")]
+    parser = argparse.ArgumentParser(description="Tap latency from phone to MIDI as more phones send faster")
+    parser.add_argument("--phones", type=numbers, default=[1, 2, 4, 8, 16], help="numbers of phones, ex: 1,2,4,8,16")
+    parser.add_argument("--rates", type=numbers, default=[50, 100, 200], help="/accxyz messages per second per phone, ex: 50,100,200")
+    parser.add_argument("--seconds", type=float, default=5.0, help="how long each point of the curve runs")
+    parser.add_argument("--load-processes", type=int, default=1, help="processes sending the phones' messages")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--csv", help="also write the curve here")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,120 @@
+# benchmarks/scheduler.py
+# Movements, Not Chords by Trevor Ritchie
+#
+# How late strum notes play against the wall clock: mncengine's ThreadScheduler (one thread, one heap)
+# next to a threading.Timer per note, the way one JythonMusic Timer per note would work.
+# Phones strum STRUM_MS chords at a steady rate, and a quarter of the taps land mid-strum and cancel it.
+# Run from the repository folder: python benchmarks/scheduler.py [--seconds 5] [--taps 10]
+
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import mncengine
+
+PERCENTILES = [("p50", 0.5), ("p95", 0.95), ("p99", 0.99)]
+STRUM_MS = 40
+
+clock = mncengine.clock
+
+# A MIDI output that remembers how late each noteOn was, against the time its strum meant it for
+class LatenessSink(object):
+    def __init__(self):
+        self.dueAt = {} # pitch -> when its noteOn is due
+        self.lateness = []
+        self.lock = threading.Lock()
+
+    def noteOn(self, pitch, volume=100, channel=0):
+        now = clock()
+        with self.lock:
+            dueAt = self.dueAt.pop(pitch, None)
+            if dueAt is not None:
+                self.lateness.append(now - dueAt)
+
+    def noteOff(self, pitch, channel=0):
+        pass
+
+    def setVolume(self, volume, channel=0):
+        pass
+
+def percentile(sortedValues, fraction):
+    return sortedValues[min(int(len(sortedValues) * fraction), len(sortedValues) - 1)]
+
+# Chords to strum, 4 notes each, a new register every tap so no notes are shared
+def chords(count, seed):
+    rng = random.Random(seed)
+    return [tuple(sorted(rng.sample(range(36 + 12 * (index % 4), 48 + 12 * (index % 4)), 4))) for index in range(count)]
+
+# Strum every chord through a session on mncengine's ThreadScheduler
+def runScheduler(taps, sink):
+    mncengine.configure(STRUM_MS=STRUM_MS, STRUM_DIRECTION="up")
+    mncengine.scheduler = mncengine.ThreadScheduler()
+    session = mncengine.Session(sink, 0, 1)
+    start = clock()
+    for tapAt, chord in taps:
+        time.sleep(max(0.0, start + tapAt - clock()))
+        now = clock()
+        with sink.lock:
+            sink.dueAt.clear() # notes of a cancelled strum never play
+            for index in range(1, len(chord)):
+                sink.dueAt[chord[index]] = now + STRUM_MS / 1000.0 * index / (len(chord) - 1)
+        session.playChord(chord)
+    time.sleep(STRUM_MS / 1000.0 + 0.05)
+    return mncengine.scheduler
+
+# Strum every chord with a threading.Timer per note, cancelling them one by one
+def runTimers(taps, sink):
+    pending = []
+    start = clock()
+    for tapAt, chord in taps:
+        time.sleep(max(0.0, start + tapAt - clock()))
+        for timer in pending:
+            timer.cancel()
+        now = clock()
+        with sink.lock:
+            sink.dueAt.clear()
+            for index in range(1, len(chord)):
+                sink.dueAt[chord[index]] = now + STRUM_MS / 1000.0 * index / (len(chord) - 1)
+        sink.noteOn(chord[0])
+        pending = [threading.Timer(STRUM_MS / 1000.0 * index / (len(chord) - 1), sink.noteOn, [chord[index]]) for index in range(1, len(chord))]
+        for timer in pending:
+            timer.start()
+    time.sleep(STRUM_MS / 1000.0 + 0.05)
+
+def report(name, lateness):
+    lateness = sorted(lateness)
+    if not lateness:
+        print("%-16s no notes" % name)
+        return
+    print("%-16s %6d notes  %s  max %.3f ms" % (name, len(lateness),
+          "  ".join("%s %.3f ms" % (label, percentile(lateness, fraction) * 1000) for label, fraction in PERCENTILES), lateness[-1] * 1000))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Strum note timing, one scheduler thread against a timer per note")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--taps", type=float, default=10.0, help="taps per second")
+    parser.add_argument("--seed", type=int, default=1)
+    options = parser.parse_args()
+
+    rng = random.Random(options.seed)
+    tapCount = int(options.seconds * options.taps)
+    tapTimes = []
+    tapAt = 0.0
+    for index in range(tapCount):
+        tapTimes.append(tapAt)
+        # a quarter of the taps land in the middle of the strum before them
+        tapAt += STRUM_MS / 2000.0 if rng.random() < 0.25 else 1.0 / options.taps
+    taps = list(zip(tapTimes, chords(tapCount, options.seed)))
+
+    sink = LatenessSink()
+    scheduler = runScheduler(taps, sink)
+    report("ThreadScheduler", sink.lateness)
+    print("%-16s %6d cancelled events skipped" % ("", scheduler.cancelled))
+
+    sink = LatenessSink()
+    runTimers(taps, sink)
+    report("Timer per note", sink.lateness)
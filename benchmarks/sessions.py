@@ -0,0 +1,70 @@
+# benchmarks/sessions.py
+# Movements, Not Chords by Trevor Ritchie
+#
+# Events per second and per-event latency as one SessionHost serves more phones.
+# Every phone streams /accxyz and taps chord numerals and modifiers, like in a performance.
+# Run from the repository folder: python benchmarks/sessions.py
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import mncengine
+
+SESSION_COUNTS = [1, 2, 4, 8, 12, 16]
+EVENTS_PER_RUN = 40000
+BUTTONS = ["16", "12", "8", "4", "15", "11", "7", "3", "10", "6", "14", "2", "5", "9", "13"]
+
+# Build a stream of OSC events from every phone, 4 accelerometer messages for each button press or release
+def makeEvents(sessionCount, eventCount, seed):
+    rng = random.Random(seed)
+    held = dict((phone, []) for phone in range(sessionCount))
+    events = [(("10.0.0." + str(phone + 2), 9000), "/accxyz", [-0.5, -0.5, 0.0]) for phone in range(sessionCount)]
+    while len(events) < eventCount:
+        phone = rng.randrange(sessionCount)
+        sender = ("10.0.0." + str(phone + 2), 9000)
+        if rng.random() < 0.8:
+            events.append((sender, "/accxyz", [rng.uniform(-0.99, 0.2), rng.uniform(-0.99, 0.2), rng.uniform(-1.0, 1.0)]))
+        elif held[phone] and rng.random() < 0.5:
+            button = held[phone].pop(0)
+            events.append((sender, "/7/push" + button, [0.0]))
+        else:
+            button = rng.choice(BUTTONS)
+            held[phone].append(button)
+            events.append((sender, "/7/push" + button, [1.0]))
+    return events
+
+def percentile(sortedValues, fraction):
+    return sortedValues[min(int(len(sortedValues) * fraction), len(sortedValues) - 1)]
+
+def run(sessionCount):
+    host = mncengine.SessionHost([mncengine.MemoryMidiOut(), mncengine.MemoryMidiOut()])
+    events = makeEvents(sessionCount, EVENTS_PER_RUN, sessionCount)
+    for sender, address, arguments in events[:1000]: # warm up
+        host.receive(sender, address, arguments)
+
+    latencies = []
+    tapLatencies = []
+    clock = time.perf_counter
+    start = clock()
+    for sender, address, arguments in events:
+        eventStart = clock()
+        host.receive(sender, address, arguments)
+        latency = clock() - eventStart
+        latencies.append(latency)
+        if address != "/accxyz":
+            tapLatencies.append(latency)
+    elapsed = clock() - start
+
+    latencies.sort()
+    tapLatencies.sort()
+    return (len(events) / elapsed, percentile(latencies, 0.5) * 1e6, percentile(latencies, 0.99) * 1e6,
+            percentile(tapLatencies, 0.5) * 1e6, percentile(tapLatencies, 0.99) * 1e6)
+
+if __name__ == "__main__":
+    mncengine.precomputeVoicings()
+    print("sessions   events/s   p50 us   p99 us   tap p50 us   tap p99 us")
+    for sessionCount in SESSION_COUNTS:
+        print("%8d %10d %8.1f %8.1f %12.1f %12.1f" % ((sessionCount,) + run(sessionCount)))
@@ -0,0 +1,85 @@
+# benchmarks/voices.py
+# Movements, Not Chords by Trevor Ritchie
+#
+# What VOICE_CHANNELS costs per chord change. First the VoiceAllocator alone, moving four voices to a new chord:
+# four releases and four allocations, from pools big enough that nothing is stolen and from one that steals every time.
+# Then rapid chord numeral taps through a SessionHost, timed from OSC received to the last MIDI message,
+# with every voice on the chord channel against every voice on its own channel.
+#
+# Run from the repository folder: python benchmarks/voices.py [--taps 20000] [--changes 200000]
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import mncengine
+from midiout import SENDER, percentile, tapStream, PERCENTILES
+
+POOLS = [("chord channel", []), ("4 voice channels", [2, 3, 4, 5]), ("7 voice channels", [2, 3, 4, 5, 6, 7, 8]),
+         ("14 voice channels", [0, 2, 3, 4, 5, 6, 7, 8, 10, 11, 12, 13, 14, 15]), ("2, stealing", [2, 3])]
+
+clock = time.perf_counter
+
+# Chords of four voices jumping around the register, like taps on one chord numeral after another
+def chordChanges(changes, seed):
+    rng = random.Random(seed)
+    chords = []
+    for _ in range(changes):
+        base = 48 + 4 * rng.randrange(8) + (len(chords) % 2) * 2
+        chords.append((base, base + 5, base + 9, base + 14))
+    return chords
+
+# Seconds for the allocator to move every voice from each chord to the next
+def allocatorTime(channels, chords):
+    allocator = mncengine.VoiceAllocator(channels)
+    lastChord = ()
+    startedAt = clock()
+    for chord in chords:
+        for pitch in lastChord:
+            allocator.release(pitch)
+        for pitch in chord:
+            allocator.allocate(pitch)
+        lastChord = chord
+    return clock() - startedAt, allocator.steals
+
+# Play the taps through a SessionHost, returns the seconds each tap took and how many voices were stolen
+def tapTimes(voiceChannels, events):
+    mncengine.configure(VOICE_CHANNELS=voiceChannels)
+    midiOut = mncengine.MemoryMidiOut()
+    mncengine.connect(midiOut, mncengine.MemoryTimer)
+    mncengine.runningEnvelopes.clear()
+    host = mncengine.SessionHost([midiOut])
+    times = []
+    for address, arguments, timed in events:
+        startedAt = clock()
+        host.receive(SENDER, address, arguments)
+        if timed:
+            times.append(clock() - startedAt)
+    allocator = list(host.sessions.values())[0].voiceAllocator
+    return times, allocator.steals if allocator is not None else 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Voice allocation cost per chord change")
+    parser.add_argument("--taps", type=int, default=20000)
+    parser.add_argument("--changes", type=int, default=200000, help="chord changes for the allocator alone")
+    parser.add_argument("--seed", type=int, default=1)
+    options = parser.parse_args()
+
+    chords = chordChanges(options.changes, options.seed)
+    allocatorTime(POOLS[1][1], chords) # warm up
+    print("VoiceAllocator, 4 voices moving to a new chord")
+    for name, channels in POOLS[1:]:
+        seconds, steals = allocatorTime(channels, chords)
+        print("  %-20s %6.2f us per chord change, %.2f steals" % (name, seconds / len(chords) * 1e6, steals / float(len(chords))))
+
+    mncengine.precomputeVoicings()
+    events = tapStream(options.taps, options.seed)
+    print("Chord numeral taps, OSC to MIDI")
+    for name, channels in POOLS:
+        times, steals = tapTimes(channels, events)
+        times.sort()
+        print("  %-20s %s  %.2f steals per tap" % (name, "  ".join("%s %.2f us" % (label, percentile(times, fraction) * 1e6)
+                                                                  for label, fraction in PERCENTILES), steals / float(len(times))))
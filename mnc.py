@@ -5,617 +5,208 @@
 # played with touch and accelerometer inputs from the TouchOSC mobile app on a smartphone.
 # See the README for detailed performance instructions and a brief introduction to the music theory.
 
+import time
+startedAt = time.time()
 from midi import *
 from music import *
 from osc import *
 from timer import *
-import sys
+import mncengine
+jythonMusicNames = set(globals()) # the constants of JythonMusic, ex: the instruments
 
 ######## USER SETTINGS #########
-TRANSPOSE_KEY_SEMITONES = -3  # 0 = C, 2 = D, -2 = Bb, +10 = Bb, etc.
+TRANSPOSE_KEY_SEMITONES = -3  # 0 = C, 2 = D, -2 = Bb, +10 = Bb, etc. Change it live by sending OSC to /mnc/key
+KEY_MODE = "major"            # "major" or "minor" (harmonic minor)
 BASS = True                   # want a bass root note for each chord numeral?
 DECAY = False                 # want notes to decay quicker?
-DECAY_TIME_MS = 10            # time between each volume decrement in ms
+DECAY_TIME_MS = 10            # time between each volume step of the envelopes in ms
+ENVELOPES = {                 # (attack ms, decay ms, sustain volume 0-127, release ms) per channel, used when DECAY is True
+    0: (0, 0, 127, 430)       # top 4 voices fade out over 430 ms after the last button is released
+}
+RESTRIKE_COMMON_TONES = True  # re-strike notes shared with the last chord? False lets them ring on (SQUARE, SAWTOOTH)
+CONTINUOUS_MOTION = False     # keep moving the chord with the tilt while a button is held? ("pouring water")
+MAX_REVOICE_HZ = 30           # most chords per second CONTINUOUS_MOTION plays
+STRUM_MS = 0                  # strum the chord over this many ms, like a guitar? 0 plays every note at once
+STRUM_DIRECTION = "up"        # "up" strums lowest note first, "down" highest first
+ARPEGGIO = None               # play held chords one note at a time? None, "up", "down" or "updown"
+ARPEGGIO_BPM = 120            # tempo of the arpeggio
+ARPEGGIO_STEPS_PER_BEAT = 4   # arpeggio notes per beat, 4 = sixteenth notes
+VOICE_LEADING = False         # play each new chord numeral or family member as its voicing nearest the last chord?
+EXPRESSION = []               # tilt to MIDI controllers? ex: [("z", 1, "chord"), ("y", 11, "both")], mod wheel and expression
+                              # each is (axis "x", "y" or "z", controller, "chord", "bass" or "both"), needs MIDI_PORT
+EXPRESSION_MAX_HZ = 50        # most values per second each controller sends
+EXPRESSION_14_BIT = False     # send controllers 0-31 as 14 bits, the fine part on controller + 32?
+VOICE_CHANNELS = []           # give each of the top 4 voices its own channel, MPE style? ex: [2, 3, 4, 5, 6, 7, 8], [] = all on channel 0
+                              # they play channel 0's instrument unless INSTRUMENTS has their own, best with MIDI_PORT
+MIDI_PORT = None              # send raw MIDI to a port instead of JythonMusic's synth? ex: "/dev/snd/midiC1D0" (snd-virmidi)
 OSC_LISTENER_PORT = 50380     # what port do you want to send OSC messages to?
+LAYOUT_FILE = None            # another controller's buttons? ex: "layouts/touchosc-simple.json", None = TouchOSC LiveControl page 7
+RECORD_FILE = None            # record the performance to this file? ex: "performance.mncr", replay with recorder.py
+STATS = False                 # time every tap and count fallbacks? send OSC to /mnc/stats for a snapshot
+STATS_REPLY = ("localhost", 50381) # where the snapshot is sent, (host, port)
+SETTINGS_FILE = "settings.json" # change any of these settings live by saving them in this JSON file, see the README
+SETTINGS_POLL_MS = 1000       # how often to check if SETTINGS_FILE was saved
 
 # Choose MIDI Sounds
 # For all instrument constants, see https://jythonmusic.me/api/midi-constants/instrument/
-Play.setInstrument(NYLON_GUITAR, 0)  # channel 0 for top 4 voices
-Play.setInstrument(SAWTOOTH, 1)      # channel 1 for bass
+INSTRUMENTS = {
+    0: NYLON_GUITAR,          # channel 0 for top 4 voices
+    1: SAWTOOTH               # channel 1 for bass
+}
 ################################
+USER_SETTINGS = ["TRANSPOSE_KEY_SEMITONES", "KEY_MODE", "BASS", "DECAY", "DECAY_TIME_MS", "ENVELOPES", "RESTRIKE_COMMON_TONES",
+                 "CONTINUOUS_MOTION", "MAX_REVOICE_HZ", "STRUM_MS", "STRUM_DIRECTION", "ARPEGGIO", "ARPEGGIO_BPM", "ARPEGGIO_STEPS_PER_BEAT",
+                 "VOICE_LEADING", "EXPRESSION", "EXPRESSION_MAX_HZ", "EXPRESSION_14_BIT", "VOICE_CHANNELS", "MIDI_PORT", "OSC_LISTENER_PORT",
+                 "LAYOUT_FILE", "RECORD_FILE", "STATS", "STATS_REPLY", "SETTINGS_FILE", "SETTINGS_POLL_MS", "INSTRUMENTS"]
 
 # region MIDI Sound Suggestions:
-# Play.setInstrument(PIANO, 0) 
-# Play.setInstrument(JAZZ_GUITAR, 0) 
-# Play.setInstrument(DISTORTION_GUITAR, 0)
-# Play.setInstrument(SQUARE, 0) 
-# Play.setInstrument(SAWTOOTH, 0) 
-# Play.setInstrument(SQUARE, 1) 
-# Play.setInstrument(ACOUSTIC_BASS, 1) 
-# Play.setInstrument(DISTORTION_GUITAR, 1)
-# endregion
-
-# region Constants
-# Scales of chords by "pitch class". Semitones are assigned to 0-11. 
-MAJOR_SIXTH_DIMINISHED_SCALE = [0, 2, 4, 5, 7, 8, 9, 11]    
-MAJOR_SIXTH_DIMINISHED_SCALE_FROM_THIRD = [0, 1, 3, 4, 5, 7, 8, 10]   
-MAJOR_SIXTH_DIMINISHED_SCALE_FROM_FIFTH = [0, 1, 2, 4, 5, 7, 9, 10]   
-MINOR_SEVENTH_DIMINISHED_SCALE = [0, 2, 3, 5, 7, 8, 10, 11] # aka major sixth diminished scale from sixth
-
-MINOR_SIXTH_DIMINISHED_SCALE = [0, 2, 3, 5, 7, 8, 9, 11] 
-MINOR_SIXTH_DIMINISHED_SCALE_FROM_THIRD = [0, 2, 4, 5, 6, 8, 9, 11] 
-MINOR_SIXTH_DIMINISHED_SCALE_FROM_FIFTH = [0, 1, 2, 4, 5, 7, 8, 10]
-MINOR_SEVENTH_FLAT_FIVE_DIMINISHED_SCALE = [0, 2, 3, 5, 6, 8, 10, 11] # aka minor sixth diminished scale from sixth
-
-DOMINANT_SEVENTH_DIMINISHED_SCALE = [0, 2, 4, 5, 7, 8, 10, 11]
-DOMINANT_SEVENTH_DIMINISHED_SCALE_FROM_THIRD = [0, 1, 3, 4, 6, 7, 8, 10] 
-DOMINANT_SEVENTH_DIMINISHED_SCALE_FROM_FIFTH = [0, 1, 3, 4, 5, 7, 9, 10, ]
-DOMINANT_SEVENTH_DIMINISHED_SCALE_FROM_SEVENTH = [0, 1, 2, 4, 6, 7, 9, 10]
-
-DOMINANT_SEVENTH_FLAT_FIVE_DIMINISHED_SCALE = [0, 2, 4, 5, 6, 8, 10, 11]
-DOMINANT_ROOTS_AND_THEIR_DIMINISHED = [0, 2, 3, 5, 6, 8, 9, 11] # aka whole-half diminished scale
-
-# Mapping chord numerals of a key to button names
-chordNumeralToButtonNameDict = {
-    1 : "16",
-    2: "12",
-    3 : "h8",
-    4 : "h4",
-    5 : "15",
-    6: "11",
-    7 : "h7",
-    8 : "h3"
-}
-
-KEY = MAJOR_SCALE  # 7 note scales, different from the "scales of chords". Used to follow typical chord progression notations.
-OCTAVE = 12  # 12 semitones in an octave
-BASS_OCTAVE_OFFSET =  OCTAVE * 3
-# endregion
-
-# region Global Variables
-scaleOfChords = MAJOR_SIXTH_DIMINISHED_SCALE # choose a chord scale to move through
-scaleOfChordsRoot = KEY[0] # the root of the scale of chords
-pivotPitch = OCTAVE * 5 # the note around which the contrary motion expands/shrinks
-                # if the pivot pitch is played, only that single pitch will sound
-bassNote = OCTAVE * 4
-keysPressed = 0
-buttonsHeld = 0
-lastChord = []
-chordNumeral = 1
-offChordLock = False
-alternate = False # alternate scale of chords for each chord numeral in the key
-dominant = False
-familyUp = False
-familyDown = False
-familyAcross = False
-accelerometerValues = []
+# 0: PIANO
+# 0: JAZZ_GUITAR
+# 0: DISTORTION_GUITAR
+# 0: SQUARE
+# 0: SAWTOOTH
+# 1: SQUARE
+# 1: ACOUSTIC_BASS
+# 1: DISTORTION_GUITAR
 # endregion
 
-# region Functions
-# turn volume down on a repeating timer to achieve decay effect
-def decay(channel):
-    currentVolume = Play.getVolume(channel)
-    newVolume = max(currentVolume - 3, 0)  # Ensure volume doesn't go below 0
-
-    Play.setVolume(newVolume)
-    if newVolume == 0: 
-        Play.allNotesOff()
-
-# timer to call decay()
-decayTimer = Timer(DECAY_TIME_MS, decay, [0], True)
-
-# Parse accelerometer data from OSC messages
-def parseAccelerometerData(message):
-    global accelerometerValues
-
-    address = message.getAddress()
-    accelerometerValues = message.getArguments()
-
-# Map accelerometer values to pitches
-def mapAccelerometerToPitch(x, y, z):
-    global scaleOfChords, scaleOfChordsRoot, offChordLock
-
-    # Ensure x and y are within range
-    if x > 0.0: x = 0.0
-    if y > 0.0: y = 0.0
-    
-    # print("x: " + str(x))
-    # print("y: " + str(y))
-    # print("z: " + str(z))
-    # map acc range to octave + 1 range, ex. C4-C5
-    xMapped = mapValue(x, -1.0, 0.1, 0, 9)
-    yMapped = mapValue(y, -1.0, 0.0, 9, 0)
-    # zMapped = 0 # $$$ come back to this if need more accel input
-
-    if offChordLock: 
-        # if off chord locked, only play odd scale degrees
-        if xMapped % 2 == 0: xMapped += 1
-    
-    else: 
-        # if on chord locked, only play even scale degrees
-        if xMapped % 2 == 1: xMapped += 1
-
-    # x
-    octaveX = (xMapped // 8) + 4
-    scaleDegree = xMapped % 8
-    pitchX = scaleOfChords[scaleDegree] + scaleOfChordsRoot + (octaveX * OCTAVE)
-
-    # y
-    octaveY = (yMapped // 8) + 5
-    scaleDegree = yMapped % 8
-    pitchY = scaleOfChords[scaleDegree] + scaleOfChordsRoot + (octaveY * OCTAVE)
-    
-    # print("Input Pitch: " + str(pitchX))
-    return [pitchX, pitchY]
-
-# fill in the middle of contrary motion chords, take a note - skip a note
-def contraryMotion(contraryPitch):
-    global pivotPitch, scaleOfChords, scaleOfChordsRoot
-    chord = []
-    # print("\nPivot pitch: " + str(pivotPitch))
-    # print("Contrary pitch: " + str(contraryPitch))
-
-    # If playing the pivot pitch, play one note
-    if contraryPitch >= pivotPitch:
-        chord.append(pivotPitch)
-        return chord
-
-    # Map pitches to a pitch class (0 to 11),
-    # adjusted to make "0" represent the scale root
-    inputPitchClass  = (contraryPitch - scaleOfChordsRoot) % OCTAVE
-    pivotPitchClass = (pivotPitch - scaleOfChordsRoot) % OCTAVE
-
-    inputOctave = contraryPitch // OCTAVE # the MIDI octave of the input note
-    currentOctave = inputOctave
-    octaveSpread = (abs(contraryPitch - pivotPitch)) // OCTAVE # how many octaves apart are the input and pivot pitches?
-    inputScaleDegree = scaleOfChords.index(inputPitchClass) # the scale degree of the input note (0-7)
-    pivotScaleDegree = scaleOfChords.index(pivotPitchClass) # the scale degree of the pivot note (0-7)
-    previousPitch = contraryPitch
-
-    # How many notes should be in the chord?
-    chordWidth = 1 + ((pivotScaleDegree - inputScaleDegree) % 8) + (8 * octaveSpread)
-
-    #max chord size is double octave chord so oblique motion works
-    chordWidth = min(chordWidth, 9)
-    
-    # chord voicings by width
-    octaveChord = 5
-    drop2 = 6
-    drop3 = 7
-    drop2and4 = 8
-    doubleOctaveChord = 9
-
-    # Fill in the chord list by taking a note, skipping a note, taking a note...
-    # until the desired chord width is achieved
-    contrary = 0 # used for iteration to build the polyphony
-    for note in range(1, chordWidth+1):
-        currentPitch = scaleOfChords[(inputScaleDegree + contrary) % 8] + scaleOfChordsRoot + (OCTAVE * (currentOctave - 1))
-        
-        # Keep adding higher notes
-        if currentPitch < previousPitch:
-            currentOctave += 1
-            currentPitch += OCTAVE
-        
-        contrary += 2
-        previousPitch = currentPitch
-        
-        # maintain 4 voices
-        if (chordWidth == octaveChord and note == 3) or\
-        (chordWidth == drop2 and note in (2, 5) ) or\
-        (chordWidth == drop3 and note in (2, 3, 5) ) or\
-        (chordWidth == drop2and4 and note in (2, 4, 5, 7) ) or\
-        (chordWidth == doubleOctaveChord and note in (2, 3, 5, 7, 8)): 
-            continue
-    
-        # Add a pitch to the chord
-        chord.append(currentPitch)
-
-    # Return the complete chord 
-    return chord
-
-# keep the bottom note the same, while moving the notes above
-def obliqueMotion(inputPitch):
-    # redundant, but named differently for clarity
-    # may add more functionality to obliqueMotion later on
-    setPivotPitch(inputPitch)
-
-# display and play the chord!
-def playChord(chord):
-    volume, chordChannel = 127, 0
-    Play.allNotesOff()
-    Play.setVolume(127)
-    
-    for note in chord:
-        note += TRANSPOSE_KEY_SEMITONES  #TODO:bandage
-        Play.noteOn(note, volume, chordChannel)
-
-# change the chord scale TODO: this was not working for some reason with iteration ***
-def setScaleOfChords(newScaleOfChords):
-    global scaleOfChords
-    scaleOfChords = newScaleOfChords
-
-# change the root note of the chord scale
-def setScaleOfChordsRoot(newRoot):
-    global scaleOfChordsRoot
-    scaleOfChordsRoot = newRoot
-
-# Change the pivot pitch
-def setPivotPitch(newPivotPitch):
-    global pivotPitch
-    pivotPitch = newPivotPitch   
-
-# Play a bass note for the chord numeral
-def toggleBassNote(bassNote, onOrOff):
-    volume, channel = 100, 1 
-    bassNote += TRANSPOSE_KEY_SEMITONES
-
-    if onOrOff == 1.0:
-        # print("Bass note: " + str(bassNote))
-        Play.noteOn(bassNote, volume, channel)
-    elif onOrOff == 0.0:
-        bassNoteOn = True
-        while bassNoteOn:
-            try: Play.noteOff(bassNote, channel)
-            except: bassNoteOn = False
-
-# Play the appropriate chord from a touch input
-def handleTouchInput(message):
-    global chordNumeralToButtonNameDict, buttonsHeld, accelerometerValues, lastChord, bassNote
-
-    address = message.getAddress()
-    arguments = message.getArguments()
-    onOrOff = arguments[0]         
-    buttonName = str(address[-2] + address[-1]) # we identify the touch OSC button names by the last two characters
-    currentChordNumeral = chordNumeralToButtonNameDict.get(buttonName)
-
-    buttonOperations(buttonName)
-    
-    # if releasing a button, stop all sounds. this allows for touch to hold sustain notes on certain instruments, such as SQUARE
-    if onOrOff == 0: 
-        buttonsHeld -= 1
-        if buttonsHeld == 0:
-            if DECAY: decayTimer.start() # turn volume down on a repeating timer, achieves decay effect
-            if BASS: toggleBassNote(bassNote, onOrOff)
+# region Settings File
+# Settings saved in SETTINGS_FILE are read at startup and again whenever the file is saved, on a timer.
+# Only what a changed setting affects is rebuilt: the instrument of one channel, the key of the session,
+# the envelopes, or the OSC listener. Instruments in the file are names, ex: {"INSTRUMENTS": {"0": "PIANO"}}.
+RESTART_SETTINGS = ["VOICE_CHANNELS", "MIDI_PORT", "LAYOUT_FILE", "RECORD_FILE", "STATS", "STATS_REPLY", "SETTINGS_FILE", "SETTINGS_POLL_MS"]
+settingsFile = mncengine.SettingsFile(SETTINGS_FILE)
+
+# The USER SETTINGS in the file, with instrument names turned into instruments
+def readSettings():
+    settings = {}
+    changes = settingsFile.changes()
+    for name in changes:
+        if name not in USER_SETTINGS:
+            print("Unknown setting in " + SETTINGS_FILE + ": " + name)
+        elif name == "INSTRUMENTS" and not isinstance(changes[name], dict):
+            print("INSTRUMENTS in " + SETTINGS_FILE + " are {channel: instrument}, not " + str(changes[name]))
+        elif name == "INSTRUMENTS":
+            settings[name] = {}
+            for channel, instrument in changes[name].items():
+                instrument = instrumentNumber(instrument)
+                if instrument is None:
+                    print("Unknown instrument in " + SETTINGS_FILE + ": " + str(changes[name][channel]))
+                else:
+                    settings[name][channel] = instrument
+        else:
+            settings[name] = changes[name]
+    return settings
+
+# The MIDI program of a JythonMusic instrument constant name (ex: "PIANO") or number, None for anything else
+def instrumentNumber(instrument):
+    if isinstance(instrument, str) and instrument in jythonMusicNames:
+        instrument = globals()[instrument]
+    if isinstance(instrument, int) and not isinstance(instrument, bool) and 0 <= instrument <= 127:
+        return instrument
+    return None
+
+# Leave out every engine setting if one of them can't be used, reporting why, so a mistake in the file changes nothing
+def checkedSettings(settings):
+    engineSettings = dict((name, settings[name]) for name in settings if name in mncengine.SETTINGS)
+    try: mncengine.checkSettings(engineSettings)
+    except ValueError as error:
+        print("Can't use the settings in " + SETTINGS_FILE + ": " + str(error))
+        for name in engineSettings:
+            del settings[name]
+    return settings
+
+# Send the instrument of a channel to the synth, and to MIDI_PORT
+def setInstrument(instrument, channel):
+    Play.setInstrument(instrument, channel)
+    if midiOut is not Play:
+        midiOut.setInstrument(instrument, channel)
+
+# Put settings into the USER SETTINGS. Dict settings only change the keys given,
+# ex: {"INSTRUMENTS": {"0": "PIANO"}} keeps the instrument of channel 1.
+def updateSettings(settings):
+    for name in settings:
+        if isinstance(settings[name], dict) and isinstance(globals().get(name), dict):
+            merged = dict(globals()[name])
+            merged.update(settings[name])
+            globals()[name] = merged
+        else:
+            globals()[name] = settings[name]
+
+# Apply the settings saved since the last check, called by settingsTimer
+def pollSettings():
+    global oscIn
+    settings = readSettings()
+    for name in sorted(settings):
+        if name in RESTART_SETTINGS:
+            print(name + " changes when mnc.py is restarted")
+            del settings[name]
+    settings = checkedSettings(settings)
+    if not settings:
         return
-    else:
-        buttonsHeld += 1
-        if DECAY: decayTimer.stop()
-        
-
-    try: 
-        x, y, z = accelerometerValues
-    except:
-        print("\nTurn on the accelerometer in TouchOSC!!!\nSettings -> Options -> OSC -> Accelerometer (/accxyz)")
-        sys.exit(1)
-
-    if  (-1.0 < x < 1.0) and (-1.0 < y < 1.0): 
-        pitchX, pitchY = mapAccelerometerToPitch(x, y, z)
-    
-    try : obliqueMotion(pitchY)
-    except: NotImplemented
-    
-    try: chord = contraryMotion(pitchX)
-    except: chord = lastChord
-    
-    # play the appropriate chord
-    lastChord = chord
-    playChord(chord)
-    if BASS: toggleBassNote(bassNote, onOrOff)
-    # print("Chord: " + str(chord))
-
-# Update global variables based on what button was pressed
-def buttonOperations(buttonName):
-    global KEY, offChordLock, alternate, dominant, familyUp, familyDown, familyAcross, chordNumeral, bassNote
-    offChordLock = False      
-
-    # Handle modifier buttons
-    if buttonName == "10":   # On Chord lock
-        resetFamilyTransformations() 
-        if alternate or dominant: 
-            makeDefault(chordNumeral)
-    elif buttonName == "h6": # Off Chord lock
-        offChordLock = True
-    elif buttonName == "14": # "Alt" button
-        resetFamilyTransformations()
-        if not alternate: 
-            makeAlternate(chordNumeral)
-            alternate = True
-    elif buttonName == "h2": # "Make Dominant" Button, turns any chord into a Dom7
-        makeDominant()
-    elif buttonName == "h5": # Family Down / "Sister" Button, transform down a minor third
-        if familyUp: 
-            makeFamilyDown()
-            familyUp = False
-        if familyAcross: 
-            makeFamilyAcross()
-            familyAcross = False
-        if alternate or dominant: 
-            makeDefault(chordNumeral)
-        if not familyDown: 
-            makeFamilyDown()
-            familyDown = True # Call helper function
-    elif buttonName == "h9": # Family Across / "Cousin" Button, transform across a tritone
-        if familyUp: 
-            makeFamilyDown()
-            familyUp = False
-        if familyDown: 
-            makeFamilyUp()
-            familyDown = False
-        if alternate or dominant: 
-            makeDefault(chordNumeral)
-        if not familyAcross: 
-            makeFamilyAcross()
-            familyAcross = True
-    elif buttonName == "13": # "Family Up / Brother" Button, transform up minor third
-        if familyAcross:
-            makeFamilyAcross()
-            familyAcross = False
-        if familyDown: 
-            makeFamilyUp()
-            familyDown = False
-        if alternate or dominant: 
-            makeDefault(chordNumeral)
-        if not familyUp: 
-            makeFamilyUp()
-            familyUp = True
-    else:
-        handleChordNumerals(buttonName)  # Call the function to handle chord numerals
-
-# Reset family transformations
-def resetFamilyTransformations():
-    global familyUp, familyDown, familyAcross
-    
-    if familyUp:
-        makeFamilyDown()
-        familyUp = False
-    if familyDown:
-        makeFamilyUp()
-        familyDown = False
-    if familyAcross:
-        makeFamilyAcross()
-        familyAcross = False
-
-# Chord numeral buttons logic
-def handleChordNumerals(buttonName):
-    global chordNumeral, bassNote, offChordLock
-
-    resetFamilyTransformations()
-    # Set offChordLock to False
-    offChordLock = False
-
-    # Logic for setting chord numerals and bass notes
-    if buttonName == "16":  # 1 chord
-        chordNumeral = 1
-        bassNote = KEY[0] + BASS_OCTAVE_OFFSET
-        setScaleOfChords(MAJOR_SIXTH_DIMINISHED_SCALE)
-        setScaleOfChordsRoot( KEY[0] )
-    elif buttonName == "12":  # 2 chord
-        chordNumeral = 2
-        bassNote = KEY[1] + BASS_OCTAVE_OFFSET
-        setScaleOfChords(MINOR_SEVENTH_DIMINISHED_SCALE)
-        setScaleOfChordsRoot( KEY[1] )
-    elif buttonName == "h8":  # 3 chord
-        chordNumeral = 3
-        bassNote = KEY[2] + BASS_OCTAVE_OFFSET
-        setScaleOfChords(MINOR_SEVENTH_DIMINISHED_SCALE)
-        setScaleOfChordsRoot( KEY[2] )
-    elif buttonName == "h4":  # 4 chord
-        chordNumeral = 4
-        bassNote = KEY[3] + BASS_OCTAVE_OFFSET
-        setScaleOfChords(MAJOR_SIXTH_DIMINISHED_SCALE)
-        setScaleOfChordsRoot( KEY[3] )
-    elif buttonName == "15":  # 5 chord
-        chordNumeral = 5
-        bassNote = KEY[4] + BASS_OCTAVE_OFFSET
-        setScaleOfChords(DOMINANT_SEVENTH_DIMINISHED_SCALE)
-        setScaleOfChordsRoot( KEY[4] )
-    elif buttonName == "11":  # 6 chord
-        chordNumeral = 6
-        bassNote = KEY[5] + BASS_OCTAVE_OFFSET
-        setScaleOfChords(MINOR_SEVENTH_DIMINISHED_SCALE)
-        setScaleOfChordsRoot( KEY[5] )
-    elif buttonName == "h7":  # 7 chord
-        chordNumeral = 7
-        bassNote = KEY[6] + BASS_OCTAVE_OFFSET
-        setScaleOfChords(MINOR_SEVENTH_FLAT_FIVE_DIMINISHED_SCALE)
-        setScaleOfChordsRoot( KEY[6] )
-    elif buttonName == "h3":  # 1 chord + 1 octave, aka 8 chord
-        chordNumeral = 8
-        bassNote = KEY[0] + BASS_OCTAVE_OFFSET + OCTAVE
-        setScaleOfChords(MAJOR_SIXTH_DIMINISHED_SCALE)
-        setScaleOfChordsRoot( KEY[0] + OCTAVE )
-    
-    return True
-
-# Switch to an alternate scale of chords based on the current chord numeral
-def makeAlternate(chordNumeral):
-    global KEY, alternate
-    # print("\nAlt scale of chords")
-
-    if chordNumeral in [1, 8]: # 1 chord alt
-        # the major 6th on the 5
-        # Ex: Cmaj6 --> Gmaj6/C (Cmaj9)
-        setScaleOfChords(MAJOR_SIXTH_DIMINISHED_SCALE_FROM_FIFTH)
-        setScaleOfChordsRoot( KEY[1] )
-    elif chordNumeral == 2: # 2 chord alt
-        # Ex: Dmin7 --> Cmaj6/D (Dmin11)
-        setScaleOfChords(MAJOR_SIXTH_DIMINISHED_SCALE_FROM_THIRD)
-        setScaleOfChordsRoot( KEY[2] )
-    elif chordNumeral == 3: # 3 chord alt
-        # Ex: Emin7 --> Cmaj6/E
-        setScaleOfChords(MAJOR_SIXTH_DIMINISHED_SCALE_FROM_THIRD)
-        setScaleOfChordsRoot( KEY[2] )
-    elif chordNumeral == 4: # 4 chord alt
-        # Ex: Fmaj6dim --> Cmaj6dim/F (Fmaj9)
-        setScaleOfChords(MAJOR_SIXTH_DIMINISHED_SCALE_FROM_FIFTH)
-        setScaleOfChordsRoot( KEY[4] )
-    elif chordNumeral == 5: # 5 chord alt
-        # minor 6th on the 5
-        # Ex: G7dim --> Dmin6dim/G
-        setScaleOfChords(MINOR_SIXTH_DIMINISHED_SCALE_FROM_FIFTH)
-        setScaleOfChordsRoot( KEY[5] )
-    elif chordNumeral == 6:
-        # Ex: Amin7 --> Gmaj6/A (Amin11)
-        setScaleOfChords(MAJOR_SIXTH_DIMINISHED_SCALE_FROM_THIRD)
-        setScaleOfChordsRoot( KEY[6] )
-    elif chordNumeral == 7:
-        # Ex: Bmin7b5 --> G7/B
-        setScaleOfChords(DOMINANT_SEVENTH_DIMINISHED_SCALE_FROM_THIRD)
-        setScaleOfChordsRoot( KEY[6] )
-
-    alternate = True
-
-# Make current scale of chords a dominant seventh diminished scale with the same root
-def makeDominant():
-    global dominant
-    setScaleOfChords(DOMINANT_SEVENTH_DIMINISHED_SCALE)
-    dominant = True
-
-# Switch to family a minor third up
-def makeFamilyUp():
-    global scaleOfChords, scaleOfChordsRoot
-    # bass note of scale of chords goes down in cycle through 1 - 3 - 5 - 6/7, for voice leading
-    # scale of chords goes ups in minor thirds
-    # ex: Dmin6 --> Fmin6/D
-
-    # maj6 variants
-    if scaleOfChords == MAJOR_SIXTH_DIMINISHED_SCALE:
-        setScaleOfChords(MINOR_SEVENTH_DIMINISHED_SCALE)
-    elif scaleOfChords == MAJOR_SIXTH_DIMINISHED_SCALE_FROM_THIRD:
-        setScaleOfChords(MAJOR_SIXTH_DIMINISHED_SCALE)
-        setScaleOfChordsRoot(scaleOfChordsRoot - 1)
-    elif scaleOfChords == MAJOR_SIXTH_DIMINISHED_SCALE_FROM_FIFTH:
-        setScaleOfChords(MAJOR_SIXTH_DIMINISHED_SCALE_FROM_THIRD)
-    elif scaleOfChords == MINOR_SEVENTH_DIMINISHED_SCALE:
-        setScaleOfChords(MAJOR_SIXTH_DIMINISHED_SCALE_FROM_FIFTH)
-        setScaleOfChordsRoot(scaleOfChordsRoot + 1)
-    # min6 variants
-    elif scaleOfChords == MINOR_SIXTH_DIMINISHED_SCALE:
-        setScaleOfChords(MINOR_SEVENTH_FLAT_FIVE_DIMINISHED_SCALE)
-    elif scaleOfChords == MINOR_SIXTH_DIMINISHED_SCALE_FROM_THIRD:
-        setScaleOfChords(MINOR_SIXTH_DIMINISHED_SCALE)
-    elif scaleOfChords == MINOR_SIXTH_DIMINISHED_SCALE_FROM_FIFTH:
-        setScaleOfChords(MINOR_SIXTH_DIMINISHED_SCALE_FROM_THIRD)
-        setScaleOfChordsRoot(scaleOfChordsRoot - 1)
-    elif scaleOfChords == MINOR_SEVENTH_FLAT_FIVE_DIMINISHED_SCALE:
-        setScaleOfChords(MINOR_SIXTH_DIMINISHED_SCALE_FROM_FIFTH)
-        setScaleOfChordsRoot(scaleOfChordsRoot + 1)
-    # dom7 variants
-    elif scaleOfChords == DOMINANT_SEVENTH_DIMINISHED_SCALE:
-        setScaleOfChords(DOMINANT_SEVENTH_DIMINISHED_SCALE_FROM_SEVENTH)
-        setScaleOfChordsRoot(scaleOfChordsRoot + 1)
-    elif scaleOfChords == DOMINANT_SEVENTH_DIMINISHED_SCALE_FROM_THIRD:
-        setScaleOfChords(DOMINANT_SEVENTH_DIMINISHED_SCALE)
-        setScaleOfChordsRoot(scaleOfChordsRoot - 1)
-    elif scaleOfChords == DOMINANT_SEVENTH_DIMINISHED_SCALE_FROM_FIFTH:
-        setScaleOfChords(DOMINANT_SEVENTH_DIMINISHED_SCALE_FROM_THIRD)
-    elif scaleOfChords == DOMINANT_SEVENTH_DIMINISHED_SCALE_FROM_SEVENTH:
-        setScaleOfChords(DOMINANT_SEVENTH_DIMINISHED_SCALE_FROM_FIFTH)
-    
-    familyUp = True
-
-# Switch to family a minor third down
-def makeFamilyDown():
-    global scaleOfChords, scaleOfChordsRoot
-    # bass note of scale of chords goes up in cycle through 1 - 3 - 5 - 6/7, for voice leading
-    # scale of chords goes down in minor thirds
-    # ex: Dmin6 --> Bmin6/D
-
-    # maj6 variants
-    if scaleOfChords == MAJOR_SIXTH_DIMINISHED_SCALE:
-        setScaleOfChords(MAJOR_SIXTH_DIMINISHED_SCALE_FROM_THIRD)
-        setScaleOfChordsRoot(scaleOfChordsRoot + 1)
-    elif scaleOfChords == MAJOR_SIXTH_DIMINISHED_SCALE_FROM_THIRD:
-        setScaleOfChords(MAJOR_SIXTH_DIMINISHED_SCALE_FROM_FIFTH)
-    elif scaleOfChords == MAJOR_SIXTH_DIMINISHED_SCALE_FROM_FIFTH:
-        setScaleOfChords(MINOR_SEVENTH_DIMINISHED_SCALE)
-        setScaleOfChordsRoot(scaleOfChordsRoot - 1)
-    elif scaleOfChords == MINOR_SEVENTH_DIMINISHED_SCALE:
-        setScaleOfChords(MAJOR_SIXTH_DIMINISHED_SCALE)
-    # min6 variants
-    elif scaleOfChords == MINOR_SIXTH_DIMINISHED_SCALE:
-        setScaleOfChords(MINOR_SIXTH_DIMINISHED_SCALE_FROM_THIRD)
-    elif scaleOfChords == MINOR_SIXTH_DIMINISHED_SCALE_FROM_THIRD:
-        setScaleOfChords(MINOR_SIXTH_DIMINISHED_SCALE_FROM_FIFTH)
-        setScaleOfChordsRoot(scaleOfChordsRoot + 1)
-    elif scaleOfChords == MINOR_SIXTH_DIMINISHED_SCALE_FROM_FIFTH:
-        setScaleOfChords(MINOR_SEVENTH_FLAT_FIVE_DIMINISHED_SCALE)
-        setScaleOfChordsRoot(scaleOfChordsRoot - 1)
-    elif scaleOfChords == MINOR_SEVENTH_FLAT_FIVE_DIMINISHED_SCALE:
-        setScaleOfChords(MINOR_SIXTH_DIMINISHED_SCALE)
-    # dom7 variants
-    elif scaleOfChords == DOMINANT_SEVENTH_DIMINISHED_SCALE:
-        setScaleOfChords(DOMINANT_SEVENTH_DIMINISHED_SCALE_FROM_THIRD)
-        setScaleOfChordsRoot(scaleOfChordsRoot + 1)
-    elif scaleOfChords == DOMINANT_SEVENTH_DIMINISHED_SCALE_FROM_THIRD:
-        setScaleOfChords(DOMINANT_SEVENTH_DIMINISHED_SCALE_FROM_FIFTH)
-    elif scaleOfChords == DOMINANT_SEVENTH_DIMINISHED_SCALE_FROM_FIFTH:
-        setScaleOfChords(DOMINANT_SEVENTH_DIMINISHED_SCALE_FROM_SEVENTH)
-    elif scaleOfChords == DOMINANT_SEVENTH_DIMINISHED_SCALE_FROM_SEVENTH:
-        setScaleOfChords(DOMINANT_SEVENTH_DIMINISHED_SCALE)
-        setScaleOfChordsRoot(scaleOfChordsRoot - 1)
-
-    familyDown = True
-
-# Switch to family a tritone across
-def makeFamilyAcross():
-    global scaleOfChords, scaleOfChordsRoot
-    # bass note of scale of chords go between 1 - 5  or 3 - 6/7, for voice leading
-    # scale of chords goes across in tritones
-    # ex: Dmin6 --> Abmin6/Eb
-
-    # maj6 variants
-    if scaleOfChords == MAJOR_SIXTH_DIMINISHED_SCALE:
-        setScaleOfChords(MAJOR_SIXTH_DIMINISHED_SCALE_FROM_FIFTH)
-        setScaleOfChordsRoot(scaleOfChordsRoot + 1)
-    elif scaleOfChords == MAJOR_SIXTH_DIMINISHED_SCALE_FROM_THIRD:
-        setScaleOfChords(MINOR_SEVENTH_DIMINISHED_SCALE)
-        setScaleOfChordsRoot(scaleOfChordsRoot - 1)
-    elif scaleOfChords == MAJOR_SIXTH_DIMINISHED_SCALE_FROM_FIFTH:
-        setScaleOfChords(MAJOR_SIXTH_DIMINISHED_SCALE)
-        setScaleOfChordsRoot(scaleOfChordsRoot - 1)
-    elif scaleOfChords == MINOR_SEVENTH_DIMINISHED_SCALE:
-        setScaleOfChords(MAJOR_SIXTH_DIMINISHED_SCALE_FROM_THIRD)
-        setScaleOfChordsRoot(scaleOfChordsRoot + 1)
-    # min6 variants
-    elif scaleOfChords == MINOR_SIXTH_DIMINISHED_SCALE:
-        setScaleOfChords(MINOR_SIXTH_DIMINISHED_SCALE_FROM_FIFTH)
-        setScaleOfChordsRoot(scaleOfChordsRoot + 1)
-    elif scaleOfChords == MINOR_SIXTH_DIMINISHED_SCALE_FROM_THIRD:
-        setScaleOfChords(MINOR_SEVENTH_FLAT_FIVE_DIMINISHED_SCALE)
-    elif scaleOfChords == MINOR_SIXTH_DIMINISHED_SCALE_FROM_FIFTH:
-        setScaleOfChords(MINOR_SIXTH_DIMINISHED_SCALE)
-        setScaleOfChordsRoot(scaleOfChordsRoot - 1)
-    elif scaleOfChords == MINOR_SEVENTH_FLAT_FIVE_DIMINISHED_SCALE:
-        setScaleOfChords(MINOR_SIXTH_DIMINISHED_SCALE_FROM_THIRD)
-    # dom7 variants
-    elif scaleOfChords == DOMINANT_SEVENTH_DIMINISHED_SCALE:
-        setScaleOfChords(DOMINANT_SEVENTH_DIMINISHED_SCALE_FROM_FIFTH)
-        setScaleOfChordsRoot(scaleOfChordsRoot + 1)
-    elif scaleOfChords == DOMINANT_SEVENTH_DIMINISHED_SCALE_FROM_THIRD:
-        setScaleOfChords(DOMINANT_SEVENTH_DIMINISHED_SCALE_FROM_SEVENTH)
-    elif scaleOfChords == DOMINANT_SEVENTH_DIMINISHED_SCALE_FROM_FIFTH:
-        setScaleOfChords(DOMINANT_SEVENTH_DIMINISHED_SCALE)
-        setScaleOfChordsRoot(scaleOfChordsRoot - 1)
-    elif scaleOfChords == DOMINANT_SEVENTH_DIMINISHED_SCALE_FROM_SEVENTH:
-        setScaleOfChords(DOMINANT_SEVENTH_DIMINISHED_SCALE_FROM_THIRD)
-
-    familyAcross = True
-
-# Reset to default scale of chords for the current chord numeral
-def makeDefault(chordNumeral):
-    global alternate, dominant
-    alternate = False
-    dominant = False
-    buttonName = chordNumeralToButtonNameDict.get(chordNumeral)
-    buttonOperations(buttonName)
+    engineSettings = dict((name, settings[name]) for name in settings if name in mncengine.SETTINGS)
+    if engineSettings:
+        mncengine.reconfigure([session], **engineSettings)
+    oldInstruments, oldPort = INSTRUMENTS, OSC_LISTENER_PORT
+    updateSettings(settings)
+    for channel in set(INSTRUMENTS) | set(VOICE_CHANNELS):
+        instrument = INSTRUMENTS.get(channel, INSTRUMENTS.get(0))
+        if instrument != oldInstruments.get(channel, oldInstruments.get(0)):
+            setInstrument(instrument, channel)
+    if OSC_LISTENER_PORT != oldPort:
+        closeOscIn(oscIn)
+        oscIn = OscIn(OSC_LISTENER_PORT) # the session carries on, from the new port
+        oscIn.hideMessages()
+        mncengine.listen(oscIn, performanceRecorder, statsOut, session)
+    print("Settings changed: " + ", ".join(sorted(settings)))
+
+# Stop an OscIn listening, so its port is closed and its handlers no longer play the session.
+# JythonMusic's OscIn listens on a JavaOSC OSCPortIn, kept in oscPortIn.
+def closeOscIn(oldOscIn):
+    port = getattr(oldOscIn, "oscPortIn", oldOscIn)
+    for method in ["stopListening", "close"]:
+        if hasattr(port, method):
+            getattr(port, method)()
+
+updateSettings(checkedSettings(readSettings())) # the file's settings, checked like later changes, before anything is set up
 # endregion
 
 # region OSC and MIDI Setup
+mncengine.configure(TRANSPOSE_KEY_SEMITONES=TRANSPOSE_KEY_SEMITONES, KEY_MODE=KEY_MODE, BASS=BASS, DECAY=DECAY, DECAY_TIME_MS=DECAY_TIME_MS,
+                    ENVELOPES=ENVELOPES, RESTRIKE_COMMON_TONES=RESTRIKE_COMMON_TONES, STATS=STATS,
+                    CONTINUOUS_MOTION=CONTINUOUS_MOTION, MAX_REVOICE_HZ=MAX_REVOICE_HZ,
+                    STRUM_MS=STRUM_MS, STRUM_DIRECTION=STRUM_DIRECTION, ARPEGGIO=ARPEGGIO, ARPEGGIO_BPM=ARPEGGIO_BPM,
+                    ARPEGGIO_STEPS_PER_BEAT=ARPEGGIO_STEPS_PER_BEAT, VOICE_LEADING=VOICE_LEADING,
+                    EXPRESSION=EXPRESSION, EXPRESSION_MAX_HZ=EXPRESSION_MAX_HZ, EXPRESSION_14_BIT=EXPRESSION_14_BIT,
+                    VOICE_CHANNELS=VOICE_CHANNELS)
+midiOut = Play
+if MIDI_PORT:
+    midiOut = mncengine.RawMidiOut(MIDI_PORT)
+elif EXPRESSION:
+    print("EXPRESSION sends MIDI controllers, which JythonMusic's Play can't. Set MIDI_PORT to use it.")
+for channel in INSTRUMENTS:
+    setInstrument(INSTRUMENTS[channel], channel)
+for channel in VOICE_CHANNELS:
+    if channel not in INSTRUMENTS:
+        setInstrument(INSTRUMENTS[0], channel) # the voices sound like channel 0 unless they have their own
+mncengine.connect(midiOut, Timer, mncengine.ThreadScheduler)
+mncengine.precomputeInBackground() # the first taps build what they need until the tables are ready
+if LAYOUT_FILE:
+    mncengine.useLayout(mncengine.loadLayout(LAYOUT_FILE))
+
 oscIn = OscIn( OSC_LISTENER_PORT )  
 oscIn.hideMessages()
-oscIn.onInput("/7/push.*", handleTouchInput) 
-oscIn.onInput("/accxyz", parseAccelerometerData) 
+performanceRecorder = None
+if RECORD_FILE:
+    import recorder
+    performanceRecorder = recorder.Recorder(RECORD_FILE)
+statsOut = None
+if STATS:
+    statsOut = OscOut(STATS_REPLY[0], STATS_REPLY[1])
+session = mncengine.listen(oscIn, performanceRecorder, statsOut)
+settingsTimer = Timer(SETTINGS_POLL_MS, pollSettings, [], True)
+settingsTimer.start()
+print("Ready to play in " + str(int((time.time() - startedAt) * 1000)) + " ms") # since JythonMusic started loading
 # endregion
 
 # region ASCII Art and Intro Message
@@ -635,6 +226,28 @@ print("Play movements, not chords!")
 # endregion
 
 # region Changelog
+# 10.17.26:
+# contraryMotion() serves chords from a voicing table built once at startup.
+# Scales of chords have integer ids, and family transformations are a single table read.
+# playChord() only sends noteOff/noteOn for the voices that changed, and counts MIDI messages per tap.
+# Chord and bass notes go through a reference counted registry, so releasing the bass is one noteOff.
+# DECAY runs precomputed per-channel envelopes on one timer that stops when they finish.
+# The instrument itself moved to mncengine.py, which runs without JythonMusic.
+# Performer state lives in a Session, and a SessionHost serves one session per phone.
+# RECORD_FILE records the OSC of a performance, and recorder.py replays it to the same MIDI every time.
+# STATS times every tap into histograms and counts fallbacks, voicings and MIDI messages, snapshots on /mnc/stats.
+# CONTINUOUS_MOTION re-voices held chords from filtered tilt, with hysteresis at the step edges and a rate limit.
+# Chord numerals and alternates come from harmony tables for every key and mode (KEY_MODE), built at startup.
+# Transposing is part of the tables instead of a bandage in playChord(), and /mnc/key changes key live.
+# Buttons come from a controller layout (LAYOUT_FILE) mapping OSC addresses to actions, one dict lookup per tap.
+# Strum (STRUM_MS) and arpeggio (ARPEGGIO) modes, played by one scheduler thread instead of a timer per note.
+# VOICE_LEADING plays new chords as their inversion or drop voicing nearest the last chord, from precomputed candidates.
+# MIDI_PORT writes raw MIDI to an ALSA port, each chord change one buffer with running status. Play is the fallback.
+# EXPRESSION sends the filtered tilt and z to MIDI controllers, deduplicated and rate limited, optionally 14-bit.
+# What the buttons set is one immutable state from precomputed transitions, giving undo (the spare button) and scenes.
+# SETTINGS_FILE changes settings live, rebuilding only what they affect. The voicing tables fill in after startup.
+# VOICE_CHANNELS gives every voice its own MIDI channel from a pool, common tones keeping theirs, MPE style.
+#
 # 11.16.24:
 # Added global transpose, bass, and decay settings. Cleaned up octave logic.
 # Refactored buttonOperations() with clearer helper functions.
@@ -0,0 +1,1932 @@
+# mncengine.py
+# Movements, Not Chords by Trevor Ritchie
+#
+# The instrument without JythonMusic: accelerometer mapping, voicing, the button state machine and family transformations.
+# MIDI goes out through a midiOut adapter and OSC comes in through an oscIn adapter, see the Adapters region.
+# Importing this module opens no sockets and starts no timers. mnc.py connects it to JythonMusic.
+
+import bisect
+import collections
+import heapq
+import json
+import math
+import numbers
+import operator
+import os
+import re
+import threading
+import time
+
+# region Settings
+# Defaults for the USER SETTINGS in mnc.py, change them with configure()
+TRANSPOSE_KEY_SEMITONES = 0   # 0 = C, 2 = D, -2 = Bb, +10 = Bb, etc. Keys play in the register nearest C (-6 to +5)
+KEY_MODE = "major"            # "major" or "minor" (harmonic minor), see MODES
+BASS = True                   # want a bass root note for each chord numeral?
+DECAY = False                 # want notes to decay quicker?
+DECAY_TIME_MS = 10            # time between each volume step of the envelopes in ms
+ENVELOPES = {                 # (attack ms, decay ms, sustain volume 0-127, release ms) per channel, used when DECAY is True
+    0: (0, 0, 127, 430)       # top 4 voices fade out over 430 ms after the last button is released
+}                             # channel 0 is each performer's top 4 voices channel, 1 is their bass channel
+RESTRIKE_COMMON_TONES = True  # re-strike notes shared with the last chord? False lets them ring on (SQUARE, SAWTOOTH)
+STATS = False                 # time every tap and count fallbacks, voicings and MIDI messages? see the Statistics region
+CONTINUOUS_MOTION = False     # keep re-voicing from /accxyz while a button is held, instead of only when it is tapped?
+MOTION_FILTER = (1.0, 0.5)    # one euro filter on x and y: (cutoff Hz when still, how fast the cutoff rises with speed)
+MOTION_HYSTERESIS = 0.25      # how far past a step edge the tilt must go before the scale degree changes, in steps (0-0.5)
+MAX_REVOICE_HZ = 30           # most chords per second continuous motion plays
+VOICE_LEADING = False         # play a new chord numeral or family member as its voicing nearest the last chord?
+EXPRESSION = []               # tilt to MIDI controllers: (axis "x", "y" or "z", controller, "chord", "bass" or "both") each
+                              # ex: [("z", 1, "chord"), ("y", 11, "both"), ("x", 74, "bass")], mod wheel, expression, cutoff
+EXPRESSION_MAX_HZ = 50        # most values per second each controller sends
+EXPRESSION_14_BIT = False     # send controllers 0-31 as 14 bits, the fine part on controller + 32?
+VOICE_CHANNELS = []           # give each chord voice its own channel from this pool, MPE style? ex: [2, 3, 4, 5, 6, 7, 8]
+                              # [] plays every voice on the chord channel, see the Voice Channels region
+STRUM_MS = 0                  # spread the notes a chord adds over this many ms? 0 plays them all at once
+STRUM_DIRECTION = "up"        # "up" strums lowest note first, "down" highest first
+ARPEGGIO = None               # play held chords one note at a time? None, "up", "down" or "updown"
+ARPEGGIO_BPM = 120            # tempo of the arpeggio
+ARPEGGIO_STEPS_PER_BEAT = 4   # arpeggio notes per beat, 4 = sixteenth notes
+# endregion
+
+# region Adapters
+# midiOut: anything with noteOn(pitch, volume, channel), noteOff(pitch, channel) and setVolume(volume, channel),
+#          such as JythonMusic's Play or RawMidiOut. If its batch attribute is True, it also has startBatch() and
+#          sendBatch(), and sessions send each chord change between them.
+#          EXPRESSION needs controlChange(controller, value, channel) too, which Play doesn't have.
+# timer:   a class built like JythonMusic's Timer(delayMs, function, parameters, repeat),
+#          with start(), stop(), isRunning() and setDelay(delayMs), such as ThreadTimer.
+# oscIn:   anything with onInput(addressPattern, function), such as JythonMusic's OscIn.
+#          The function gets a message with getAddress() and getArguments().
+
+# Remembers every MIDI message instead of playing it, for tests and benchmarks
+class MemoryMidiOut(object):
+    def __init__(self):
+        self.messages = []
+
+    def noteOn(self, pitch, volume=100, channel=0):
+        self.messages.append(("noteOn", pitch, volume, channel))
+
+    def noteOff(self, pitch, channel=0):
+        self.messages.append(("noteOff", pitch, channel))
+
+    def setVolume(self, volume, channel=0):
+        self.messages.append(("setVolume", volume, channel))
+
+    def controlChange(self, controller, value, channel=0):
+        self.messages.append(("controlChange", controller, value, channel))
+
+# Writes raw MIDI bytes to a port instead of JythonMusic's synth, ex: an ALSA rawmidi device such as "/dev/snd/midiC1D0".
+# The snd-virmidi kernel module makes virtual ones, which other programs see as ALSA sequencer ports.
+# A port can also be any binary file object, ex: the write end of a pipe.
+# Sessions call startBatch() and sendBatch() around a chord change, so all of its messages go out as one write,
+# encoded with running status. noteOff is sent as noteOn with velocity 0, so a chord change needs one status byte per channel.
+# Messages sent outside a batch, ex: by the envelopes, are written one at a time.
+class RawMidiOut(object):
+    batch = True # sessions batch chord changes
+
+    def __init__(self, port):
+        self.port = port if hasattr(port, "write") else open(port, "wb", 0) # a path, ex: MIDI_PORT from settings.json
+        self.buffer = bytearray()
+        self.status = None # status byte of the last message in the buffer
+        self.batching = False
+        self.lock = threading.Lock() # strums, arpeggios and envelopes send from their own threads
+
+    def noteOn(self, pitch, volume=100, channel=0):
+        self.send(0x90 | channel, pitch, volume)
+
+    def noteOff(self, pitch, channel=0):
+        self.send(0x90 | channel, pitch, 0)
+
+    def setVolume(self, volume, channel=0):
+        self.send(0xB0 | channel, 7, volume) # channel volume controller
+
+    def controlChange(self, controller, value, channel=0):
+        self.send(0xB0 | channel, controller, value)
+
+    # Program change, like Play.setInstrument
+    def setInstrument(self, instrument, channel=0):
+        with self.lock:
+            self.buffer.append(0xC0 | channel)
+            self.buffer.append(instrument)
+            self.status = None # program changes are not sent with running status here
+            if not self.batching:
+                self.write()
+
+    def send(self, status, data1, data2):
+        with self.lock:
+            if status != self.status:
+                self.buffer.append(status)
+                self.status = status
+            self.buffer.append(data1)
+            self.buffer.append(data2)
+            if not self.batching:
+                self.write()
+
+    def startBatch(self):
+        with self.lock:
+            self.batching = True
+
+    def sendBatch(self):
+        with self.lock:
+            self.batching = False
+            self.write()
+
+    # Every write starts with a status byte, so a receiver can start listening at any write
+    def write(self):
+        if self.buffer:
+            self.port.write(bytes(self.buffer))
+            del self.buffer[:]
+        self.status = None
+
+    def close(self):
+        self.port.close()
+
+# A timer that only fires when tick() is called, so tests and benchmarks control time
+class MemoryTimer(object):
+    def __init__(self, delayMs, function, parameters=[], repeat=True):
+        self.delayMs = delayMs
+        self.function = function
+        self.parameters = parameters
+        self.repeat = repeat
+        self.running = False
+
+    def start(self):
+        self.running = True
+
+    def stop(self):
+        self.running = False
+
+    def isRunning(self):
+        return self.running
+
+    def setDelay(self, delayMs):
+        self.delayMs = delayMs
+
+    def tick(self):
+        if self.running:
+            if not self.repeat: 
+                self.running = False
+            self.function(*self.parameters)
+
+# A timer like JythonMusic's Timer, firing on a thread of its own, for running without JythonMusic (ex: oscserver.py).
+# The thread starts with the first start() and waits while the timer is stopped.
+class ThreadTimer(object):
+    def __init__(self, delayMs, function, parameters=[], repeat=True):
+        self.delayMs = delayMs
+        self.function = function
+        self.parameters = parameters
+        self.repeat = repeat
+        self.running = False
+        self.nextAt = None # clock() time of the next firing
+        self.wakeup = threading.Condition()
+        self.thread = None
+
+    def start(self):
+        with self.wakeup:
+            if self.running:
+                return
+            self.running = True
+            self.nextAt = clock() + self.delayMs / 1000.0
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="mncengine timer")
+                self.thread.daemon = True
+                self.thread.start()
+            self.wakeup.notify()
+
+    def stop(self):
+        with self.wakeup:
+            self.running = False
+            self.wakeup.notify()
+
+    def isRunning(self):
+        return self.running
+
+    def setDelay(self, delayMs):
+        self.delayMs = delayMs
+
+    # Fire every delayMs from start(), catching up without bursts if a firing ran long
+    def run(self):
+        while True:
+            with self.wakeup:
+                while not self.running or clock() < self.nextAt:
+                    self.wakeup.wait(self.nextAt - clock() if self.running else None)
+                self.nextAt = max(self.nextAt + self.delayMs / 1000.0, clock())
+                if not self.repeat:
+                    self.running = False
+            try:
+                self.function(*self.parameters)
+            except Exception as error:
+                print("\nTimer " + getattr(self.function, "__name__", "function") + " failed: " + repr(error))
+
+# An OSC message built in memory, with the same getters as JythonMusic's
+class MemoryOscMessage(object):
+    def __init__(self, address, arguments):
+        self.address = address
+        self.arguments = arguments
+
+    def getAddress(self):
+        return self.address
+
+    def getArguments(self):
+        return self.arguments
+
+# Whether the arguments of an OSC message are count numbers, ex: isNumbers(arguments, 3) for an accelerometer message
+def isNumbers(arguments, count):
+    return len(arguments) == count and all(isinstance(argument, numbers.Real) for argument in arguments)
+
+# Delivers OSC messages passed to receive() to the handlers registered with onInput(),
+# matching address patterns from the start of the address like JythonMusic's OscIn
+class MemoryOscIn(object):
+    def __init__(self):
+        self.handlers = []
+
+    def onInput(self, addressPattern, function):
+        self.handlers.append((re.compile(addressPattern), function))
+
+    def receive(self, address, arguments):
+        message = MemoryOscMessage(address, arguments)
+        for pattern, function in self.handlers:
+            if pattern.match(address):
+                function(message)
+
+midiOut = MemoryMidiOut() # where new sessions send their MIDI
+
+# Send MIDI to midiOut, run envelopes on timers built by timerClass, and strums and arpeggios on a schedulerClass,
+# ex: connect(Play, Timer, ThreadScheduler)
+def connect(newMidiOut, timerClass, schedulerClass=None):
+    global midiOut, envelopeTimer, scheduler
+    midiOut = newMidiOut
+    envelopeTimer = timerClass(DECAY_TIME_MS, envelopeTick, [], True)
+    scheduler = (schedulerClass or Scheduler)()
+
+# Play one performer's session from the OSC messages of oscIn, on channels 0 and 1, optionally recording them.
+# The buttons and accelerometer are the addresses of the layout in use, see the Controller Layouts region.
+# With an oscOut (anything with sendMessage(address, *arguments), such as JythonMusic's OscOut),
+# a message to STATS_ADDRESS is answered with a statistics snapshot.
+# Pass the session from before to listen on another oscIn, ex: after OSC_LISTENER_PORT changed.
+def listen(oscIn, recorder=None, oscOut=None, session=None):
+    session = session or Session(midiOut, 0, 1, VOICE_CHANNELS)
+    # OscIn matches every pattern it has against every message, so one pattern takes them all
+    # and the address is looked up, like SessionHost.receive()
+    def receive(message):
+        address = message.getAddress()
+        if address == layout.accelerometer:
+            handle = session.parseAccelerometerData
+        elif address in layout.buttons:
+            handle = session.handleTouchInput
+        elif address == KEY_ADDRESS:
+            handle = session.handleKeyChange
+        else:
+            if address == STATS_ADDRESS and oscOut is not None:
+                sendStats(oscOut)
+            return
+        if recorder is not None:
+            recorder.record(0, address, message.getArguments()) # ex: recorder.Recorder, before the session plays it
+        handle(message)
+    oscIn.onInput("/.*", receive)
+    return session
+
+# Send the statistics snapshot as OSC messages
+def sendStats(oscOut):
+    for address, arguments in stats.messages():
+        oscOut.sendMessage(address, *arguments)
+
+# Change settings by name, ex: configure(BASS=False, TRANSPOSE_KEY_SEMITONES=2)
+# Dict settings only change the keys given, ex: configure(ENVELOPES={1: (0, 0, 127, 200)}) keeps the envelope of channel 0.
+def configure(**settings):
+    for name in settings:
+        if isinstance(settings[name], dict) and isinstance(globals().get(name), dict):
+            merged = dict(globals()[name])
+            merged.update(settings[name])
+            settings[name] = merged
+    useSettings(settings)
+
+# Set settings to exactly these values, ex: ones saved by currentSettings().
+# Every setting is checked before any changes, so a ValueError leaves them all as they were.
+# The envelopes are only rebuilt when ENVELOPES or DECAY_TIME_MS change.
+def useSettings(settings):
+    global envelopeTables
+    checkSettings(settings)
+    globals().update(settings)
+    if "ENVELOPES" in settings or "DECAY_TIME_MS" in settings:
+        envelopeTables = dict((channel, buildEnvelope(*ENVELOPES[channel])) for channel in ENVELOPES)
+    if "DECAY_TIME_MS" in settings:
+        envelopeTimer.setDelay(DECAY_TIME_MS)
+
+# Change settings while sessions are playing, ex: from a SettingsFile.
+# Each session only rebuilds what the settings affect, see Session.settingsChanged().
+def reconfigure(sessions, **settings):
+    configure(**settings)
+    for session in sessions:
+        session.settingsChanged(settings)
+
+# Smallest value of the number settings
+SETTING_MINIMUMS = {"DECAY_TIME_MS": 1, "MOTION_HYSTERESIS": 0, "MAX_REVOICE_HZ": 0.001, "EXPRESSION_MAX_HZ": 0.001,
+                    "STRUM_MS": 0, "ARPEGGIO_BPM": 0.001, "ARPEGGIO_STEPS_PER_BEAT": 1}
+
+# Raise ValueError for a setting that isn't one of SETTINGS or that the engine can't play with
+def checkSettings(settings):
+    for name in settings:
+        if name not in SETTINGS:
+            raise ValueError("unknown setting " + name)
+        try: checkSetting(name, settings[name])
+        except TypeError: raise ValueError(name + " can't be " + repr(settings[name]))
+
+def checkSetting(name, value):
+    if name in SETTING_MINIMUMS and not (isNumbers([value], 1) and value >= SETTING_MINIMUMS[name]):
+        raise ValueError(name + " is a number from " + str(SETTING_MINIMUMS[name]) + ", not " + repr(value))
+    elif name in ("TRANSPOSE_KEY_SEMITONES", "DECAY_TIME_MS") and not isinstance(value, numbers.Integral):
+        raise ValueError(name + " is a whole number, not " + repr(value))
+    elif name == "KEY_MODE" and value not in MODES:
+        raise ValueError("KEY_MODE is one of " + ", ".join(MODE_NAMES) + ", not " + repr(value))
+    elif name == "STRUM_DIRECTION" and value not in ("up", "down"):
+        raise ValueError("STRUM_DIRECTION is \"up\" or \"down\", not " + repr(value))
+    elif name == "ARPEGGIO" and value and value not in ("up", "down", "updown"):
+        raise ValueError("ARPEGGIO is None, \"up\", \"down\" or \"updown\", not " + repr(value))
+    elif name == "MOTION_FILTER" and not isNumbers(value, 2):
+        raise ValueError("MOTION_FILTER is (cutoff Hz, beta), not " + repr(value))
+    elif name == "ENVELOPES":
+        for channel in dict(value):
+            envelope = value[channel]
+            if channel not in (0, 1) or not isNumbers(envelope, 4) or envelope[2] > 127 or \
+               not all(isinstance(part, numbers.Integral) and part >= 0 for part in envelope):
+                raise ValueError("unknown envelope " + repr(channel) + ": " + repr(envelope))
+    elif name == "EXPRESSION":
+        expressionRoutes(value, (0,), 1)
+    elif name == "VOICE_CHANNELS":
+        if len(set(value)) != len(value) or not all(isinstance(channel, numbers.Integral) and 0 <= channel <= 15 for channel in value):
+            raise ValueError("VOICE_CHANNELS are different channels from 0 to 15, not " + repr(value))
+        if 1 in value:
+            raise ValueError("VOICE_CHANNELS can't have channel 1, the bass channel")
+
+# The value of every setting, ex: to save with a recording
+def currentSettings():
+    return dict((name, globals()[name]) for name in SETTINGS)
+
+SETTINGS = ["TRANSPOSE_KEY_SEMITONES", "KEY_MODE", "BASS", "DECAY", "DECAY_TIME_MS", "ENVELOPES", "RESTRIKE_COMMON_TONES", "STATS",
+            "CONTINUOUS_MOTION", "MOTION_FILTER", "MOTION_HYSTERESIS", "MAX_REVOICE_HZ",
+            "STRUM_MS", "STRUM_DIRECTION", "ARPEGGIO", "ARPEGGIO_BPM", "ARPEGGIO_STEPS_PER_BEAT", "VOICE_LEADING",
+            "EXPRESSION", "EXPRESSION_MAX_HZ", "EXPRESSION_14_BIT", "VOICE_CHANNELS"]
+
+# Settings saved in a JSON file, ex: settings.json, {"TRANSPOSE_KEY_SEMITONES": 2, "BASS": false, "ENVELOPES": {"0": [0, 0, 127, 200]}},
+# read again whenever the file is saved. Checking costs one stat, so a timer can poll it every second.
+class SettingsFile(object):
+    def __init__(self, path):
+        self.path = path
+        self.mtime = None # modification time of the file when it was last read
+        self.settings = {}
+
+    # The settings that are new or changed since the file was last read, {} if it hasn't been saved since.
+    # Settings taken out of the file keep their value. A file that can't be read is reported and skipped until it is saved again.
+    def changes(self):
+        try: mtime = os.path.getmtime(self.path)
+        except OSError: return {} # no file, nothing to change
+        if mtime == self.mtime:
+            return {}
+        self.mtime = mtime
+        try:
+            with open(self.path) as settingsFile:
+                settings = fromJson(json.load(settingsFile))
+            if not isinstance(settings, dict):
+                raise ValueError("not a JSON object")
+        except (IOError, ValueError) as error:
+            print("\nCan't read settings from " + self.path + ": " + str(error))
+            return {}
+        changed = dict((name, settings[name]) for name in settings if name not in self.settings or self.settings[name] != settings[name])
+        self.settings = settings
+        return changed
+
+# JSON has no tuples and only string keys, so lists become tuples and number keys become ints, ex: the channels of ENVELOPES.
+# Strings become str, which Jython's json reads as unicode, ex: MIDI_PORT.
+def fromJson(value):
+    if isinstance(value, list):
+        return tuple(fromJson(item) for item in value)
+    if isinstance(value, dict):
+        return dict((int(key) if key.lstrip("-").isdigit() else str(key), fromJson(value[key])) for key in value)
+    if isinstance(value, type(u"")) and not isinstance(value, str):
+        return value.encode("utf-8")
+    return value
+# endregion
+
+# region Constants
+# Scales of chords by "pitch class". Semitones are assigned to 0-11. 
+MAJOR_SIXTH_DIMINISHED_SCALE = (0, 2, 4, 5, 7, 8, 9, 11)    
+MAJOR_SIXTH_DIMINISHED_SCALE_FROM_THIRD = (0, 1, 3, 4, 5, 7, 8, 10)   
+MAJOR_SIXTH_DIMINISHED_SCALE_FROM_FIFTH = (0, 1, 2, 4, 5, 7, 9, 10)   
+MINOR_SEVENTH_DIMINISHED_SCALE = (0, 2, 3, 5, 7, 8, 10, 11) # aka major sixth diminished scale from sixth
+
+MINOR_SIXTH_DIMINISHED_SCALE = (0, 2, 3, 5, 7, 8, 9, 11) 
+MINOR_SIXTH_DIMINISHED_SCALE_FROM_THIRD = (0, 2, 4, 5, 6, 8, 9, 11) 
+MINOR_SIXTH_DIMINISHED_SCALE_FROM_FIFTH = (0, 1, 2, 4, 5, 7, 8, 10)
+MINOR_SEVENTH_FLAT_FIVE_DIMINISHED_SCALE = (0, 2, 3, 5, 6, 8, 10, 11) # aka minor sixth diminished scale from sixth
+
+DOMINANT_SEVENTH_DIMINISHED_SCALE = (0, 2, 4, 5, 7, 8, 10, 11)
+DOMINANT_SEVENTH_DIMINISHED_SCALE_FROM_THIRD = (0, 1, 3, 4, 6, 7, 8, 10) 
+DOMINANT_SEVENTH_DIMINISHED_SCALE_FROM_FIFTH = (0, 1, 3, 4, 5, 7, 9, 10, )
+DOMINANT_SEVENTH_DIMINISHED_SCALE_FROM_SEVENTH = (0, 1, 2, 4, 6, 7, 9, 10)
+
+DOMINANT_SEVENTH_FLAT_FIVE_DIMINISHED_SCALE = (0, 2, 4, 5, 6, 8, 10, 11)
+DOMINANT_ROOTS_AND_THEIR_DIMINISHED = (0, 2, 3, 5, 6, 8, 9, 11) # aka whole-half diminished scale
+
+SCALES_OF_CHORDS = [
+    MAJOR_SIXTH_DIMINISHED_SCALE, MAJOR_SIXTH_DIMINISHED_SCALE_FROM_THIRD,
+    MAJOR_SIXTH_DIMINISHED_SCALE_FROM_FIFTH, MINOR_SEVENTH_DIMINISHED_SCALE,
+    MINOR_SIXTH_DIMINISHED_SCALE, MINOR_SIXTH_DIMINISHED_SCALE_FROM_THIRD,
+    MINOR_SIXTH_DIMINISHED_SCALE_FROM_FIFTH, MINOR_SEVENTH_FLAT_FIVE_DIMINISHED_SCALE,
+    DOMINANT_SEVENTH_DIMINISHED_SCALE, DOMINANT_SEVENTH_DIMINISHED_SCALE_FROM_THIRD,
+    DOMINANT_SEVENTH_DIMINISHED_SCALE_FROM_FIFTH, DOMINANT_SEVENTH_DIMINISHED_SCALE_FROM_SEVENTH,
+    DOMINANT_SEVENTH_FLAT_FIVE_DIMINISHED_SCALE, DOMINANT_ROOTS_AND_THEIR_DIMINISHED
+]
+# Each scale of chords is identified by its index in SCALES_OF_CHORDS
+SCALE_IDS = dict((scale, scaleId) for scaleId, scale in enumerate(SCALES_OF_CHORDS))
+
+# Family transformations, as (family scale of chords, root shift in semitones)
+NO_FAMILY, FAMILY_UP, FAMILY_DOWN, FAMILY_ACROSS = 0, 1, 2, 3
+
+# bass note of scale of chords goes down in cycle through 1 - 3 - 5 - 6/7, for voice leading
+# scale of chords goes ups in minor thirds
+# ex: Dmin6 --> Fmin6/D
+FAMILY_UP_STEPS = {
+    # maj6 variants
+    MAJOR_SIXTH_DIMINISHED_SCALE: (MINOR_SEVENTH_DIMINISHED_SCALE, 0),
+    MAJOR_SIXTH_DIMINISHED_SCALE_FROM_THIRD: (MAJOR_SIXTH_DIMINISHED_SCALE, -1),
+    MAJOR_SIXTH_DIMINISHED_SCALE_FROM_FIFTH: (MAJOR_SIXTH_DIMINISHED_SCALE_FROM_THIRD, 0),
+    MINOR_SEVENTH_DIMINISHED_SCALE: (MAJOR_SIXTH_DIMINISHED_SCALE_FROM_FIFTH, +1),
+    # min6 variants
+    MINOR_SIXTH_DIMINISHED_SCALE: (MINOR_SEVENTH_FLAT_FIVE_DIMINISHED_SCALE, 0),
+    MINOR_SIXTH_DIMINISHED_SCALE_FROM_THIRD: (MINOR_SIXTH_DIMINISHED_SCALE, 0),
+    MINOR_SIXTH_DIMINISHED_SCALE_FROM_FIFTH: (MINOR_SIXTH_DIMINISHED_SCALE_FROM_THIRD, -1),
+    MINOR_SEVENTH_FLAT_FIVE_DIMINISHED_SCALE: (MINOR_SIXTH_DIMINISHED_SCALE_FROM_FIFTH, +1),
+    # dom7 variants
+    DOMINANT_SEVENTH_DIMINISHED_SCALE: (DOMINANT_SEVENTH_DIMINISHED_SCALE_FROM_SEVENTH, +1),
+    DOMINANT_SEVENTH_DIMINISHED_SCALE_FROM_THIRD: (DOMINANT_SEVENTH_DIMINISHED_SCALE, -1),
+    DOMINANT_SEVENTH_DIMINISHED_SCALE_FROM_FIFTH: (DOMINANT_SEVENTH_DIMINISHED_SCALE_FROM_THIRD, 0),
+    DOMINANT_SEVENTH_DIMINISHED_SCALE_FROM_SEVENTH: (DOMINANT_SEVENTH_DIMINISHED_SCALE_FROM_FIFTH, 0)
+}
+
+# bass note of scale of chords goes up in cycle through 1 - 3 - 5 - 6/7, for voice leading
+# scale of chords goes down in minor thirds
+# ex: Dmin6 --> Bmin6/D
+FAMILY_DOWN_STEPS = {
+    # maj6 variants
+    MAJOR_SIXTH_DIMINISHED_SCALE: (MAJOR_SIXTH_DIMINISHED_SCALE_FROM_THIRD, +1),
+    MAJOR_SIXTH_DIMINISHED_SCALE_FROM_THIRD: (MAJOR_SIXTH_DIMINISHED_SCALE_FROM_FIFTH, 0),
+    MAJOR_SIXTH_DIMINISHED_SCALE_FROM_FIFTH: (MINOR_SEVENTH_DIMINISHED_SCALE, -1),
+    MINOR_SEVENTH_DIMINISHED_SCALE: (MAJOR_SIXTH_DIMINISHED_SCALE, 0),
+    # min6 variants
+    MINOR_SIXTH_DIMINISHED_SCALE: (MINOR_SIXTH_DIMINISHED_SCALE_FROM_THIRD, 0),
+    MINOR_SIXTH_DIMINISHED_SCALE_FROM_THIRD: (MINOR_SIXTH_DIMINISHED_SCALE_FROM_FIFTH, +1),
+    MINOR_SIXTH_DIMINISHED_SCALE_FROM_FIFTH: (MINOR_SEVENTH_FLAT_FIVE_DIMINISHED_SCALE, -1),
+    MINOR_SEVENTH_FLAT_FIVE_DIMINISHED_SCALE: (MINOR_SIXTH_DIMINISHED_SCALE, 0),
+    # dom7 variants
+    DOMINANT_SEVENTH_DIMINISHED_SCALE: (DOMINANT_SEVENTH_DIMINISHED_SCALE_FROM_THIRD, +1),
+    DOMINANT_SEVENTH_DIMINISHED_SCALE_FROM_THIRD: (DOMINANT_SEVENTH_DIMINISHED_SCALE_FROM_FIFTH, 0),
+    DOMINANT_SEVENTH_DIMINISHED_SCALE_FROM_FIFTH: (DOMINANT_SEVENTH_DIMINISHED_SCALE_FROM_SEVENTH, 0),
+    DOMINANT_SEVENTH_DIMINISHED_SCALE_FROM_SEVENTH: (DOMINANT_SEVENTH_DIMINISHED_SCALE, -1)
+}
+
+# bass note of scale of chords go between 1 - 5  or 3 - 6/7, for voice leading
+# scale of chords goes across in tritones
+# ex: Dmin6 --> Abmin6/Eb
+FAMILY_ACROSS_STEPS = {
+    # maj6 variants
+    MAJOR_SIXTH_DIMINISHED_SCALE: (MAJOR_SIXTH_DIMINISHED_SCALE_FROM_FIFTH, +1),
+    MAJOR_SIXTH_DIMINISHED_SCALE_FROM_THIRD: (MINOR_SEVENTH_DIMINISHED_SCALE, -1),
+    MAJOR_SIXTH_DIMINISHED_SCALE_FROM_FIFTH: (MAJOR_SIXTH_DIMINISHED_SCALE, -1),
+    MINOR_SEVENTH_DIMINISHED_SCALE: (MAJOR_SIXTH_DIMINISHED_SCALE_FROM_THIRD, +1),
+    # min6 variants
+    MINOR_SIXTH_DIMINISHED_SCALE: (MINOR_SIXTH_DIMINISHED_SCALE_FROM_FIFTH, +1),
+    MINOR_SIXTH_DIMINISHED_SCALE_FROM_THIRD: (MINOR_SEVENTH_FLAT_FIVE_DIMINISHED_SCALE, 0),
+    MINOR_SIXTH_DIMINISHED_SCALE_FROM_FIFTH: (MINOR_SIXTH_DIMINISHED_SCALE, -1),
+    MINOR_SEVENTH_FLAT_FIVE_DIMINISHED_SCALE: (MINOR_SIXTH_DIMINISHED_SCALE_FROM_THIRD, 0),
+    # dom7 variants
+    DOMINANT_SEVENTH_DIMINISHED_SCALE: (DOMINANT_SEVENTH_DIMINISHED_SCALE_FROM_FIFTH, +1),
+    DOMINANT_SEVENTH_DIMINISHED_SCALE_FROM_THIRD: (DOMINANT_SEVENTH_DIMINISHED_SCALE_FROM_SEVENTH, 0),
+    DOMINANT_SEVENTH_DIMINISHED_SCALE_FROM_FIFTH: (DOMINANT_SEVENTH_DIMINISHED_SCALE, -1),
+    DOMINANT_SEVENTH_DIMINISHED_SCALE_FROM_SEVENTH: (DOMINANT_SEVENTH_DIMINISHED_SCALE_FROM_THIRD, 0)
+}
+
+MAJOR_SCALE = [0, 2, 4, 5, 7, 9, 11] # same as JythonMusic's MAJOR_SCALE
+HARMONIC_MINOR_SCALE = [0, 2, 3, 5, 7, 8, 11] # same as JythonMusic's HARMONIC_MINOR_SCALE
+ACCELEROMETER_ADDRESS = "/accxyz" # sent by TouchOSC, the default layout's accelerometer address
+STATS_ADDRESS = "/mnc/stats" # send anything here to get a statistics snapshot back
+KEY_ADDRESS = "/mnc/key" # change key, arguments: semitones from C, and optionally "major" or "minor"
+
+OCTAVE = 12  # 12 semitones in an octave
+BASS_OCTAVE_OFFSET =  OCTAVE * 3
+# endregion
+
+# region Family Transition Table
+# FAMILY_TRANSITIONS[fromFamily][toFamily][scaleId] = (new scale id, root shift in semitones)
+# Undoing the current family and applying the new one is a single read, including resets to NO_FAMILY.
+def buildFamilyTransitions():
+    # scales of chords without a family stay where they are
+    def stepsById(steps):
+        table = []
+        for scale in SCALES_OF_CHORDS:
+            familyScale, rootShift = steps.get(scale, (scale, 0))
+            table.append((SCALE_IDS[familyScale], rootShift))
+        return table
+
+    identity = [(scaleId, 0) for scaleId in range(len(SCALES_OF_CHORDS))]
+    apply = [identity, stepsById(FAMILY_UP_STEPS), stepsById(FAMILY_DOWN_STEPS), stepsById(FAMILY_ACROSS_STEPS)]
+    undo = [apply[NO_FAMILY], apply[FAMILY_DOWN], apply[FAMILY_UP], apply[FAMILY_ACROSS]]
+
+    transitions = []
+    for fromFamily in range(4):
+        row = []
+        for toFamily in range(4):
+            if fromFamily == toFamily:
+                row.append(identity)
+                continue
+            table = []
+            for scaleId in range(len(SCALES_OF_CHORDS)):
+                undoneId, undoShift = undo[fromFamily][scaleId]
+                familyId, familyShift = apply[toFamily][undoneId]
+                table.append((familyId, undoShift + familyShift))
+            row.append(table)
+        transitions.append(row)
+    return transitions
+
+FAMILY_TRANSITIONS = buildFamilyTransitions()
+# endregion
+
+# region Voicing Table
+voicingTable = {} # (scale of chords id, root, pivot pitch, input pitch) -> chord tuple, or None if unplayable, shared by every session
+transposedVoicings = {} # key offset -> voicing table of the same chords moved to that key, filled as keys are played
+voicingCandidates = {} # chord in C -> (every voicing in the table with the same notes and doubling, sorted, their lowest notes,
+                       #                 [per voice: pitch -> semitones to that voice of each voicing], index of the chord among them)
+voiceLeadingTable = {} # (last chord, chord) -> the chord's voicing nearest the last chord, filled as chords are played
+
+# JythonMusic's mapValue(), so the engine maps the accelerometer exactly like it did inside JythonMusic
+def mapValue(value, minValue, maxValue, minResult, maxResult):
+    if value < minValue or value > maxValue:
+        raise ValueError("value, " + str(value) + ", is outside the specified range, " + str(minValue) + " to " + str(maxValue) + ".")
+
+    normal = (float(value) - minValue) / (maxValue - minValue)
+    result = normal * (maxResult - minResult) + minResult
+    return type(minResult)(result)
+
+# fill in the middle of contrary motion chords, take a note - skip a note
+def buildContraryMotion(scaleOfChords, scaleOfChordsRoot, pivotPitch, contraryPitch):
+    chord = []
+    # print("\nPivot pitch: " + str(pivotPitch))
+    # print("Contrary pitch: " + str(contraryPitch))
+
+    # If playing the pivot pitch, play one note
+    if contraryPitch >= pivotPitch:
+        chord.append(pivotPitch)
+        return tuple(chord)
+
+    # Map the input pitch to a pitch class (0 to 11),
+    # adjusted to make "0" represent the scale root
+    inputPitchClass  = (contraryPitch - scaleOfChordsRoot) % OCTAVE
+
+    inputOctave = contraryPitch // OCTAVE # the MIDI octave of the input note
+    currentOctave = inputOctave
+    inputScaleDegree = scaleOfChords.index(inputPitchClass) # the scale degree of the input note (0-7)
+    previousPitch = contraryPitch
+
+    # How many notes should be in the chord?
+    chordWidth = voicingWidth(scaleOfChords, scaleOfChordsRoot, pivotPitch, contraryPitch)
+    
+    # chord voicings by width
+    octaveChord = 5
+    drop2 = 6
+    drop3 = 7
+    drop2and4 = 8
+    doubleOctaveChord = 9
+
+    # Fill in the chord list by taking a note, skipping a note, taking a note...
+    # until the desired chord width is achieved
+    contrary = 0 # used for iteration to build the polyphony
+    for note in range(1, chordWidth+1):
+        currentPitch = scaleOfChords[(inputScaleDegree + contrary) % 8] + scaleOfChordsRoot + (OCTAVE * (currentOctave - 1))
+        
+        # Keep adding higher notes
+        if currentPitch < previousPitch:
+            currentOctave += 1
+            currentPitch += OCTAVE
+        
+        contrary += 2
+        previousPitch = currentPitch
+        
+        # maintain 4 voices
+        if (chordWidth == octaveChord and note == 3) or\
+        (chordWidth == drop2 and note in (2, 5) ) or\
+        (chordWidth == drop3 and note in (2, 3, 5) ) or\
+        (chordWidth == drop2and4 and note in (2, 4, 5, 7) ) or\
+        (chordWidth == doubleOctaveChord and note in (2, 3, 5, 7, 8)): 
+            continue
+    
+        # Add a pitch to the chord
+        chord.append(currentPitch)
+
+    # Return the complete chord 
+    return tuple(chord)
+
+# How many scale degrees a contrary motion chord spans, from 1 (the pivot pitch alone) to 9 (double octave chord)
+def voicingWidth(scaleOfChords, scaleOfChordsRoot, pivotPitch, contraryPitch):
+    if contraryPitch >= pivotPitch:
+        return 1
+    inputScaleDegree = scaleOfChords.index((contraryPitch - scaleOfChordsRoot) % OCTAVE)
+    pivotScaleDegree = scaleOfChords.index((pivotPitch - scaleOfChordsRoot) % OCTAVE)
+    octaveSpread = (abs(contraryPitch - pivotPitch)) // OCTAVE # how many octaves apart are the input and pivot pitches?
+    width = 1 + ((pivotScaleDegree - inputScaleDegree) % 8) + (8 * octaveSpread)
+
+    #max chord size is double octave chord so oblique motion works
+    return min(width, 9)
+
+# Voicing names by width, widths under an octave chord keep every note they span
+VOICING_NAMES = ["", "single", "close", "close", "close", "octave", "drop2", "drop3", "drop2and4", "doubleOctave"]
+
+# The voicing of a voicing table key in C, building it on the first miss
+def lookUpVoicing(key):
+    try:
+        return voicingTable[key]
+    except KeyError:
+        try: chord = buildContraryMotion(SCALES_OF_CHORDS[key[0]], key[1], key[2], key[3])
+        except ValueError: chord = None
+        voicingTable[key] = chord
+        return chord
+
+# Fill the voicing table with every chord that mapAccelerometerToPitch() can ask for.
+# Roots cover every key degree of every mode, the 8 chord, alternates, and the +/- 1 semitone shifts of the family transformations.
+# The button transitions of every mode are filled in at the same time, see precomputeTransitions().
+def precomputeVoicings():
+    for scaleId, scale in enumerate(SCALES_OF_CHORDS):
+        for root in range(-1, OCTAVE + 3):
+            # the same pitches that mapAccelerometerToPitch() produces for x (0-10) and y (0-9)
+            inputPitches = [scale[degree % 8] + root + ((degree // 8) + 4) * OCTAVE for degree in range(11)]
+            pivotPitches = [scale[degree % 8] + root + ((degree // 8) + 5) * OCTAVE for degree in range(10)]
+            for pivot in pivotPitches:
+                for contraryPitch in inputPitches:
+                    try: chord = buildContraryMotion(scale, root, pivot, contraryPitch)
+                    except ValueError: chord = None
+                    voicingTable[(scaleId, root, pivot, contraryPitch)] = chord
+    indexVoicingCandidates()
+    precomputeTransitions()
+
+# Run precomputeVoicings() on another thread, so the first note can play before the tables are full (~0.4 s under CPython 3).
+# Until it finishes, taps build the voicings and transitions they need on the first miss,
+# and VOICE_LEADING plays new chords as voiced.
+def precomputeInBackground():
+    thread = threading.Thread(target=precomputeVoicings)
+    thread.daemon = True
+    thread.start()
+    return thread
+
+# Group the voicings of the voicing table by the notes they play, so every inversion and drop of a chord is one lookup away,
+# with the distance of every pitch a voice can have to that voice of each of them, so finding the nearest one is a few sums
+# The new tables are swapped in whole, since taps may be reading them, see precomputeInBackground().
+def indexVoicingCandidates():
+    global voicingCandidates, voiceLeadingTable
+    groups = {}
+    for chord in sorted(set(chord for chord in list(voicingTable.values()) if chord is not None)):
+        groups.setdefault(pitchClasses(chord), []).append(chord)
+
+    pitches = range(OCTAVE * 2, OCTAVE * 10)
+    newCandidates = {}
+    for candidates in groups.values():
+        lowestNotes = [candidate[0] for candidate in candidates]
+        distances = [dict((pitch, tuple(abs(pitch - candidate[voice]) for candidate in candidates)) for pitch in pitches)
+                     for voice in range(len(candidates[0]))]
+        for index, chord in enumerate(candidates):
+            newCandidates[chord] = (candidates, lowestNotes, distances, index)
+    voicingCandidates = newCandidates
+    voiceLeadingTable = {}
+
+# The notes of a chord as sorted pitch classes with their doublings, ex: (60, 64, 67, 72) -> (0, 0, 4, 7)
+def pitchClasses(chord):
+    return tuple(sorted(note % OCTAVE for note in chord))
+
+# Total semitones the voices move from one chord to another with as many voices, lowest voice to lowest voice
+def voiceMotion(lastChord, chord):
+    return sum(abs(note - lastNote) for lastNote, note in zip(lastChord, chord))
+
+# The voicing of chord, among every voicing of its notes in the voicing table, with the least voiceMotion() from lastChord.
+# Ties, chords with another number of voices than lastChord, and chords outside the table keep the chord as voiced.
+def nearestVoicing(lastChord, chord, keyOffset):
+    if len(lastChord) != len(chord):
+        return chord
+    # motion is the same in every key, so the table in C answers for all of them
+    candidate = voicingCandidates.get(tuple(note - keyOffset for note in chord) if keyOffset else chord)
+    if candidate is None:
+        return chord
+    candidates, lowestNotes, distances, index = candidate
+    try:
+        rows = [distances[voice][note - keyOffset] for voice, note in enumerate(lastChord)]
+    except KeyError:
+        return chord
+
+    # a voicing only moves less than the chord as voiced if its lowest voice does, so only those are summed
+    chordMotion = sum([row[index] for row in rows])
+    if chordMotion == 0:
+        return chord
+    lowestNote = lastChord[0] - keyOffset
+    start = bisect.bisect_right(lowestNotes, lowestNote - chordMotion)
+    end = bisect.bisect_left(lowestNotes, lowestNote + chordMotion)
+    if start >= end:
+        return chord
+    motions = rows[0][start:end]
+    for row in rows[1:]:
+        motions = map(operator.add, motions, row[start:end])
+    motions = list(motions)
+    nearestMotion = min(motions)
+    if nearestMotion >= chordMotion:
+        return chord
+    return tuple(note + keyOffset for note in candidates[start + motions.index(nearestMotion)])
+# endregion
+
+# region Harmony Tables
+# Which scale of chords, root and bass note each chord numeral plays, and its alternate, for every key and mode.
+# Keys are 7 note scales, different from the "scales of chords". Used to follow typical chord progression notations.
+# Numerals play the scale of chords of the seventh chord stacked on their degree of the key.
+
+# Scales of chords by the seventh chord they belong to, as (third, fifth, seventh) in semitones above the root
+SEVENTH_CHORD_SCALES = {
+    (4, 7, 11): MAJOR_SIXTH_DIMINISHED_SCALE,             # maj7, played as maj6
+    (3, 7, 10): MINOR_SEVENTH_DIMINISHED_SCALE,           # min7
+    (4, 7, 10): DOMINANT_SEVENTH_DIMINISHED_SCALE,        # dom7
+    (3, 6, 10): MINOR_SEVENTH_FLAT_FIVE_DIMINISHED_SCALE, # min7b5
+    (3, 7, 11): MINOR_SIXTH_DIMINISHED_SCALE,             # minMaj7, played as min6
+    (4, 8, 11): MAJOR_SIXTH_DIMINISHED_SCALE,             # maj7#5, the #5 is the diminished note of the maj6 scale
+    (3, 6, 9): DOMINANT_ROOTS_AND_THEIR_DIMINISHED        # dim7
+}
+
+# Alternate scale of chords for each numeral's scale of chords, as (alternate, root shift in semitones)
+ALTERNATE_STEPS = {
+    # the major 6th on the 5
+    # Ex: Cmaj6 --> Gmaj6/C (Cmaj9), Fmaj6dim --> Cmaj6dim/F (Fmaj9)
+    MAJOR_SIXTH_DIMINISHED_SCALE: (MAJOR_SIXTH_DIMINISHED_SCALE_FROM_FIFTH, +2),
+    # Ex: Dmin7 --> Cmaj6/D (Dmin11), Amin7 --> Gmaj6/A (Amin11)
+    MINOR_SEVENTH_DIMINISHED_SCALE: (MAJOR_SIXTH_DIMINISHED_SCALE_FROM_THIRD, +2),
+    # minor 6th on the 5
+    # Ex: G7dim --> Dmin6dim/G
+    DOMINANT_SEVENTH_DIMINISHED_SCALE: (MINOR_SIXTH_DIMINISHED_SCALE_FROM_FIFTH, +2),
+    # Ex: Bmin7b5 --> G7/B
+    MINOR_SEVENTH_FLAT_FIVE_DIMINISHED_SCALE: (DOMINANT_SEVENTH_DIMINISHED_SCALE_FROM_THIRD, 0),
+    # the minor 6th on the 5
+    # Ex: Cmin6 --> Gmin6/C
+    MINOR_SIXTH_DIMINISHED_SCALE: (MINOR_SIXTH_DIMINISHED_SCALE_FROM_FIFTH, +2),
+    # Ex: Bdim7 --> G7/B
+    DOMINANT_ROOTS_AND_THEIR_DIMINISHED: (DOMINANT_SEVENTH_DIMINISHED_SCALE_FROM_THIRD, 0)
+}
+
+# Modes by name: (key scale, {chord numeral: (alternate, root shift)} for numerals that don't follow ALTERNATE_STEPS)
+MODES = {
+    "major": (MAJOR_SCALE, {
+        3: (MAJOR_SIXTH_DIMINISHED_SCALE_FROM_THIRD, 0) # Ex: Emin7 --> Cmaj6/E
+    }),
+    "minor": (HARMONIC_MINOR_SCALE, {})
+}
+MODE_NAMES = sorted(MODES)
+
+# One key of one mode. numerals[chordNumeral] = (scale of chords id, root, bass note, alternate scale of chords id, alternate root),
+# for chord numerals 1-8, 8 being 1 an octave up. Roots and bass notes are in C,
+# the key offset is added by voicings and when the bass note is played.
+# Every key of a mode shares the mode's transitions, see the Instrument State region.
+class Harmony(object):
+    __slots__ = ["mode", "keyOffset", "numerals", "voicings", "transitions"]
+
+    def __init__(self, mode, keyOffset):
+        self.mode = mode
+        self.keyOffset = keyOffset # -6 to +5 semitones from C
+        self.voicings = transposedVoicings.setdefault(keyOffset, {}) if keyOffset else voicingTable
+        self.transitions = modeTransitions.setdefault(mode, {})
+
+        keyScale, alternateOverrides = MODES[mode]
+        self.numerals = [None]
+        for degree in range(8):
+            root = keyScale[degree % 7]
+            seventhChord = tuple((keyScale[(degree + step) % 7] - root) % OCTAVE for step in (2, 4, 6))
+            scale = SEVENTH_CHORD_SCALES[seventhChord]
+            alternate, rootShift = alternateOverrides.get(degree + 1, ALTERNATE_STEPS[scale])
+            octave = OCTAVE * (degree // 7)
+            # the 8 chord's alternate stays in the octave of the 1 chord's alternate
+            self.numerals.append((SCALE_IDS[scale], root + octave, root + octave + BASS_OCTAVE_OFFSET,
+                                  SCALE_IDS[alternate], root + rootShift))
+
+# HARMONY_TABLES[mode][semitones % 12], built once, so changing key is a single read
+def buildHarmonyTables():
+    return dict((mode, [Harmony(mode, ((semitones + 6) % OCTAVE) - 6) for semitones in range(OCTAVE)]) for mode in MODES)
+
+# The harmony of a key, ex: harmony(-3, "minor") for A minor
+def harmony(semitones, mode):
+    if mode not in MODES:
+        raise ValueError("unknown mode " + str(mode))
+    return HARMONY_TABLES[mode][int(semitones) % OCTAVE]
+
+modeTransitions = {} # mode -> {state: {button: next state}}
+HARMONY_TABLES = buildHarmonyTables()
+# endregion
+
+# region Instrument State
+# What the buttons have set, as one immutable value. Roots and the bass note are in C, like the harmony tables,
+# so a state means the same chord in every key. The pivot pitch isn't part of it, the tilt sets it on every tap.
+# A button makes a new state from the transition table of the mode, and the session swaps it in with one assignment,
+# so a state is never half changed, even with OSC callbacks on other threads. Undo and scenes are states kept aside.
+InstrumentState = collections.namedtuple("InstrumentState", ["chordNumeral", "scaleOfChordsId", "scaleOfChordsRoot", "bassNote",
+                                                             "alternate", "dominant", "family", "offChordLock"])
+UNDO_STEPS = 64 # button changes undo can go back
+
+# The state a session starts in, before any button is pressed
+def initialState(harmony):
+    scaleOfChordsId, root, bassNote, alternateId, alternateRoot = harmony.numerals[1]
+    return InstrumentState(1, scaleOfChordsId, root, OCTAVE * 4, False, False, NO_FAMILY, False)
+
+# Switch to another family member, undoing the current family transformation in the same step
+def makeFamily(state, newFamily):
+    newScaleOfChordsId, rootShift = FAMILY_TRANSITIONS[state.family][newFamily][state.scaleOfChordsId]
+    return state._replace(scaleOfChordsId=newScaleOfChordsId, scaleOfChordsRoot=state.scaleOfChordsRoot + rootShift, family=newFamily)
+
+# Chord numeral buttons logic, from the harmony of the key
+def chooseChordNumeral(state, harmony, chordNumeral):
+    state = makeFamily(state, NO_FAMILY)
+    scaleOfChordsId, root, bassNote, alternateId, alternateRoot = harmony.numerals[chordNumeral]
+    return state._replace(chordNumeral=chordNumeral, scaleOfChordsId=scaleOfChordsId, scaleOfChordsRoot=root, bassNote=bassNote,
+                          offChordLock=False)
+
+# Reset to default scale of chords for the current chord numeral
+def makeDefault(state, harmony):
+    return chooseChordNumeral(state._replace(alternate=False, dominant=False), harmony, state.chordNumeral)
+
+# On Chord lock, back to the default scale of chords of the chord numeral
+def lockOnChord(state, harmony):
+    state = makeFamily(state, NO_FAMILY)
+    if state.alternate or state.dominant:
+        state = makeDefault(state, harmony)
+    return state
+
+# Off Chord lock
+def lockOffChord(state, harmony):
+    return state._replace(offChordLock=True)
+
+# "Alt" button, switch to the alternate scale of chords of the chord numeral
+def pressAlternate(state, harmony):
+    state = makeFamily(state, NO_FAMILY)
+    if not state.alternate:
+        scaleOfChordsId, root, bassNote, alternateId, alternateRoot = harmony.numerals[state.chordNumeral]
+        state = state._replace(scaleOfChordsId=alternateId, scaleOfChordsRoot=alternateRoot, alternate=True)
+    return state
+
+# Make current scale of chords a dominant seventh diminished scale with the same root
+def makeDominant(state, harmony):
+    return state._replace(scaleOfChordsId=SCALE_IDS[DOMINANT_SEVENTH_DIMINISHED_SCALE], dominant=True)
+
+# Move to a family member of the default scale of chords for the current chord numeral
+def changeFamily(state, harmony, newFamily):
+    if state.alternate or state.dominant:
+        state = makeDefault(state, harmony)
+    return makeFamily(state, newFamily)
+
+# Reset family transformations
+def resetFamilyTransformations(state, harmony):
+    return makeFamily(state, NO_FAMILY)
+
+# What each button does to the state, action name -> (function(state, harmony, arguments...), fixed arguments).
+# The buttons of a layout add their own arguments, ex: ["numeral", 3].
+STATE_ACTIONS = {
+    "numeral": (chooseChordNumeral, ()),           # ["numeral", 1 to 8], the chord numerals of the key
+    "onChord": (lockOnChord, ()),                  # On Chord lock
+    "offChord": (lockOffChord, ()),                # Off Chord lock
+    "alternate": (pressAlternate, ()),             # "Alt" button
+    "dominant": (makeDominant, ()),                # "Make Dominant" Button, turns any chord into a Dom7
+    "familyDown": (changeFamily, (FAMILY_DOWN,)),  # Family Down / "Sister" Button, transform down a minor third
+    "familyAcross": (changeFamily, (FAMILY_ACROSS,)), # Family Across / "Cousin" Button, transform across a tritone
+    "familyUp": (changeFamily, (FAMILY_UP,)),      # "Family Up / Brother" Button, transform up minor third
+    "resetFamily": (resetFamilyTransformations, ()), # replay the chord numeral without family transformations
+}
+STATE_BUTTONS = [("numeral", chordNumeral) for chordNumeral in range(1, 9)] + [(name,) for name in sorted(STATE_ACTIONS) if name != "numeral"]
+
+# The state a button leads to, button is (action name, arguments...), ex: ("numeral", 3).
+# Every button starts from the state with Off Chord lock let go, like pressing any button does.
+# States the table doesn't have yet are worked out and added.
+def nextState(harmony, state, button):
+    try:
+        return harmony.transitions[state][button]
+    except KeyError:
+        function, arguments = STATE_ACTIONS[button[0]]
+        newState = function(state._replace(offChordLock=False), harmony, *(arguments + tuple(button[1:])))
+        harmony.transitions.setdefault(state, {})[button] = newState
+        return newState
+
+# Fill the transition table of every mode with every state the buttons can reach
+def precomputeTransitions():
+    for mode in MODES:
+        modeHarmony = HARMONY_TABLES[mode][0]
+        waiting = [initialState(modeHarmony)]
+        seen = set(waiting)
+        while waiting:
+            state = waiting.pop()
+            for button in STATE_BUTTONS:
+                newState = nextState(modeHarmony, state, button)
+                if newState not in seen:
+                    seen.add(newState)
+                    waiting.append(newState)
+# endregion
+
+# region Envelopes
+# Each envelope is precomputed as one volume per DECAY_TIME_MS step.
+# Returns the attack + decay steps, the release steps from full volume down to 0,
+# and the release step to start from for each current volume.
+def buildEnvelope(attackMs, decayMs, sustainVolume, releaseMs):
+    attackSteps = attackMs // DECAY_TIME_MS
+    decaySteps = decayMs // DECAY_TIME_MS
+    releaseSteps = releaseMs // DECAY_TIME_MS
+
+    onSteps = [127 * (step + 1) // attackSteps for step in range(attackSteps)]
+    onSteps += [127 - (127 - sustainVolume) * (step + 1) // decaySteps for step in range(decaySteps)]
+    if not onSteps or onSteps[-1] != sustainVolume:
+        onSteps.append(sustainVolume)
+
+    offSteps = [127 - 127 * (step + 1) // releaseSteps for step in range(releaseSteps)] or [0]
+    
+    # release from wherever the attack or decay got to, never jumping the volume up
+    offStart = []
+    for volume in range(128):
+        step = 0
+        while offSteps[step] >= volume and step < len(offSteps) - 1:
+            step += 1
+        offStart.append(step)
+
+    return onSteps, offSteps, offStart
+
+envelopeTables = dict((channel, buildEnvelope(*ENVELOPES[channel])) for channel in ENVELOPES)
+runningEnvelopes = {} # (session, channel) -> (envelope steps, index of the next step)
+envelopeWakeups = 0 # how many times the envelope timer has fired
+envelopeMaxJitterMs = 0.0 # largest difference between an envelope timer interval and DECAY_TIME_MS
+lastEnvelopeTick = None
+
+# One timer steps every running envelope of every session, and stops itself once they have all finished
+def envelopeTick():
+    global envelopeWakeups, envelopeMaxJitterMs, lastEnvelopeTick
+    now = time.time()
+    if lastEnvelopeTick is not None:
+        envelopeMaxJitterMs = max(envelopeMaxJitterMs, abs((now - lastEnvelopeTick) * 1000 - DECAY_TIME_MS))
+    lastEnvelopeTick = now
+    envelopeWakeups += 1
+
+    # in channel order, since sessions hash by identity
+    for session, channel in sorted(runningEnvelopes, key=lambda key: key[1]):
+        with session.lock:
+            if (session, channel) in runningEnvelopes: # a tap on the OSC thread may have played its last step
+                session.stepEnvelope(channel)
+    if not runningEnvelopes: 
+        envelopeTimer.stop()
+        # print("Envelope wakeups: " + str(envelopeWakeups) + ", max jitter: " + str(envelopeMaxJitterMs) + " ms")
+
+envelopeTimer = MemoryTimer(DECAY_TIME_MS, envelopeTick, [], True)
+# endregion
+
+# region Statistics
+# With STATS on, every tap is timed at five points: OSC received, handled, state updated (buttonOperations), chord voiced and MIDI sent.
+# Received is when the datagram arrived if the OSC server passed it in, so time spent in its queues counts, otherwise handled.
+# The times between them go into fixed-bucket histograms, next to counters for the fallbacks in handleTouchInput(),
+# the voicings played by width, and MIDI messages sent by taps and releases. With STATS off, the cost is one global check per point.
+try:
+    from java.lang import System # Jython, time.time() can step backwards with the wall clock
+    def clock():
+        return System.nanoTime() / 1e9
+except ImportError:
+    clock = getattr(time, "perf_counter", time.time)
+
+HISTOGRAM_BUCKETS_US = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 20000, 50000] # upper bounds, the last bucket is everything slower
+STAGES = ["queue", "state", "voicing", "emit", "total", "schedule"] # received -> handled -> state updated -> voiced -> MIDI sent,
+                                                                   # received -> MIDI sent,
+                                                                   # and how late a ThreadScheduler ran strum and arpeggio notes
+
+# Counts of samples per bucket of HISTOGRAM_BUCKETS_US
+class Histogram(object):
+    def __init__(self):
+        self.counts = [0] * (len(HISTOGRAM_BUCKETS_US) + 1)
+
+    def add(self, seconds):
+        self.counts[bisect.bisect_left(HISTOGRAM_BUCKETS_US, seconds * 1e6)] += 1
+
+# Histograms and counters shared by every session
+class Stats(object):
+    def __init__(self):
+        self.histograms = dict((stage, Histogram()) for stage in STAGES)
+        self.counters = {}
+
+    def count(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def tap(self, receivedAt, handledAt, updatedAt, voicedAt, sentAt):
+        histograms = self.histograms
+        histograms["queue"].add(handledAt - receivedAt)
+        histograms["state"].add(updatedAt - handledAt)
+        histograms["voicing"].add(voicedAt - updatedAt)
+        histograms["emit"].add(sentAt - voicedAt)
+        histograms["total"].add(sentAt - receivedAt)
+
+    # A copy of everything counted so far, ex: {"buckets": [...], "histograms": {"total": [...]}, "counters": {...}}
+    def snapshot(self):
+        return {"buckets": list(HISTOGRAM_BUCKETS_US),
+                "histograms": dict((stage, list(self.histograms[stage].counts)) for stage in STAGES),
+                "counters": dict(self.counters)}
+
+    # The snapshot as OSC messages, [(address, arguments)]
+    def messages(self):
+        messages = [(STATS_ADDRESS + "/buckets", list(HISTOGRAM_BUCKETS_US))]
+        for stage in STAGES:
+            messages.append((STATS_ADDRESS + "/histogram/" + stage, list(self.histograms[stage].counts)))
+        for name in sorted(self.counters):
+            messages.append((STATS_ADDRESS + "/count/" + name, [self.counters[name]]))
+        return messages
+
+    def reset(self):
+        self.__init__()
+
+stats = Stats()
+# endregion
+
+# region Scheduler
+# Strums and arpeggios play notes after the tap. Every later note goes into one heap, run by one scheduler,
+# instead of a timer per note. A session cancels everything it scheduled in O(1) by bumping its generation,
+# and events of an older generation are skipped when they come due.
+
+# Runs events when runDue() is called, so replays and renders control time
+class Scheduler(object):
+    def __init__(self):
+        self.events = [] # heap of (time, order, session, generation, function, arguments)
+        self.order = 0 # keeps events due at the same time in the order they were scheduled
+        self.lock = threading.Lock()
+        self.cancelled = 0 # events skipped because their session cancelled them
+        self.failed = 0 # events that raised, the events after them still run
+
+    # Call function(*arguments) at clock() time at, unless session cancels it first
+    def schedule(self, at, session, function, arguments):
+        with self.lock:
+            heapq.heappush(self.events, (at, self.order, session, session.scheduleGeneration, function, arguments))
+            self.order += 1
+
+    # When the next event is due, or None
+    def nextAt(self):
+        with self.lock:
+            return self.events[0][0] if self.events else None
+
+    # Run every event due by now, each holding its session's lock
+    def runDue(self, now):
+        while True:
+            with self.lock:
+                if not self.events or self.events[0][0] > now:
+                    return
+                at, order, session, generation, function, arguments = heapq.heappop(self.events)
+            with session.lock:
+                if session.scheduleGeneration != generation:
+                    self.cancelled += 1
+                    continue
+                self.started(at)
+                try:
+                    function(*arguments)
+                except Exception as error:
+                    self.failed += 1
+                    print("\nScheduled " + function.__name__ + " failed: " + repr(error))
+
+    def started(self, at):
+        pass
+
+# Runs events on one thread of its own, as close to when they are due as it can wake up.
+# How late each event ran, measured with clock(), goes into a histogram (and the "schedule" statistics with STATS on).
+class ThreadScheduler(Scheduler):
+    def __init__(self):
+        Scheduler.__init__(self)
+        self.wakeup = threading.Condition(self.lock)
+        self.lateness = Histogram()
+        self.maxLatenessMs = 0.0
+        thread = threading.Thread(target=self.run, name="mncengine scheduler")
+        thread.daemon = True
+        thread.start()
+
+    def schedule(self, at, session, function, arguments):
+        Scheduler.schedule(self, at, session, function, arguments)
+        with self.wakeup:
+            self.wakeup.notify()
+
+    def run(self):
+        while True:
+            with self.wakeup:
+                waitSeconds = self.events[0][0] - clock() if self.events else None
+                while waitSeconds is None or waitSeconds > 0:
+                    self.wakeup.wait(waitSeconds)
+                    waitSeconds = self.events[0][0] - clock() if self.events else None
+            self.runDue(clock())
+
+    def started(self, at):
+        lateness = clock() - at
+        self.lateness.add(lateness)
+        self.maxLatenessMs = max(self.maxLatenessMs, lateness * 1000)
+        if STATS: stats.histograms["schedule"].add(lateness)
+
+scheduler = Scheduler()
+# endregion
+
+# region Continuous Motion
+# With CONTINUOUS_MOTION on, held buttons keep re-voicing from /accxyz:
+# x and y go through a one euro filter, are quantized to scale degrees with hysteresis around the step edges,
+# and a chord is only played when a degree changes, at most MAX_REVOICE_HZ times a second.
+
+# One euro filter (Casiez et al. 2012): a low pass filter whose cutoff rises with speed,
+# so slow tilts are smoothed and fast ones are followed without lag
+class OneEuroFilter(object):
+    def __init__(self, minCutoff, beta, derivativeCutoff=1.0):
+        self.minCutoff = minCutoff
+        self.beta = beta
+        self.derivativeCutoff = derivativeCutoff
+        self.reset()
+
+    def reset(self, value=None, timestamp=None):
+        self.value = value
+        self.derivative = 0.0
+        self.timestamp = timestamp
+
+    def filter(self, value, timestamp):
+        if self.value is None or timestamp <= self.timestamp:
+            if self.value is None: self.value = value
+            self.timestamp = timestamp
+            return self.value
+
+        rate = 1.0 / (timestamp - self.timestamp)
+        self.timestamp = timestamp
+        derivative = (value - self.value) * rate
+        self.derivative += smoothingFactor(rate, self.derivativeCutoff) * (derivative - self.derivative)
+        cutoff = self.minCutoff + self.beta * abs(self.derivative)
+        self.value += smoothingFactor(rate, cutoff) * (value - self.value)
+        return self.value
+
+def smoothingFactor(rate, cutoff):
+    timeConstant = 1.0 / (2 * math.pi * cutoff)
+    return 1.0 / (1.0 + timeConstant * rate)
+
+# mapValue() without rounding, clamped to the result range
+def mapPosition(value, minValue, maxValue, minResult, maxResult):
+    position = (float(value) - minValue) / (maxValue - minValue) * (maxResult - minResult) + minResult
+    return min(max(position, min(minResult, maxResult)), max(minResult, maxResult))
+
+# Quantize a position to a step, only leaving the last step once the position is more than band past its edge
+def hysteresisStep(position, lastStep, band):
+    if position >= lastStep + 1 + band or position < lastStep - band:
+        return int(position)
+    return lastStep
+# endregion
+
+# region Expression
+# The filtered tilt and z sent to MIDI controllers between taps, see EXPRESSION and Session.express()
+AXES = {"x": 0, "y": 1, "z": 2}
+EXPRESSION_GROUPS = ("chord", "bass", "both")
+
+# EXPRESSION for a session's channels, returns [(axis index, controller, channels)].
+# chordChannels are the channels the chord plays on, more than one with VOICE_CHANNELS.
+def expressionRoutes(expression, chordChannels, bassChannel):
+    routes = []
+    for axis, controller, voiceGroup in expression:
+        if axis not in AXES or voiceGroup not in EXPRESSION_GROUPS or not 0 <= controller <= 127:
+            raise ValueError("unknown expression " + repr((axis, controller, voiceGroup)))
+        channels = {"chord": chordChannels, "bass": (bassChannel,), "both": chordChannels + (bassChannel,)}[voiceGroup]
+        routes.append((AXES[axis], controller, channels))
+    return routes
+# endregion
+
+# region Voice Channels
+# With VOICE_CHANNELS, every chord voice sounds on its own MIDI channel, like MPE, so each voice can have its own
+# instrument, pan or controllers. The session still plays the chord on its chord channel,
+# and holdNote() and releaseNote() move each note to the channel the allocator gives it.
+# A note that carries on into the next chord (a common tone) keeps its channel. A new note takes the free channel
+# that has been free the longest, so release tails ring on, or when every channel is taken, the channel of the oldest note.
+# Both are O(1): a deque of free channels and an ordered dict of sounding notes.
+class VoiceAllocator(object):
+    __slots__ = ["channels", "free", "sounding", "steals"]
+
+    def __init__(self, channels):
+        for channel in channels:
+            if not 0 <= channel <= 15:
+                raise ValueError("MIDI channels are 0 to 15, not " + str(channel))
+        self.channels = tuple(channels)
+        self.free = collections.deque(self.channels) # longest free first
+        self.sounding = collections.OrderedDict() # pitch -> channel, oldest first
+        self.steals = 0
+
+    # The channel for a new note, returns (channel, the pitch whose channel was taken or None)
+    def allocate(self, pitch):
+        if self.free:
+            channel, stolen = self.free.popleft(), None
+        else:
+            stolen, channel = self.sounding.popitem(last=False)
+            self.steals += 1
+        self.sounding[pitch] = channel
+        return channel, stolen
+
+    # Free the channel of a note, returns the channel, or None if the note isn't sounding (ex: its channel was taken)
+    def release(self, pitch):
+        channel = self.sounding.pop(pitch, None)
+        if channel is not None:
+            self.free.append(channel)
+        return channel
+
+    # The channel a note is sounding on, or None
+    def channelOf(self, pitch):
+        return self.sounding.get(pitch)
+# endregion
+
+# region Session
+# Everything one performer's phone changes, so one process can host an ensemble of phones
+class Session(object):
+    __slots__ = ["midiOut", "chordChannel", "bassChannel", "channels", "voiceAllocator", "channelGroups",
+                 "state", "history", "scenes", "pivotPitch", "buttonsHeld", "lastChord", "accelerometerValues",
+                 "voiceNotes", "activeNotes", "envelopeVolumes", "midiMessagesSent", "tapMessagesSent",
+                 "xFilter", "yFilter", "motionSteps", "playedSteps", "lastRevoiceAt", "harmony",
+                 "scheduleGeneration", "arpeggio", "arpeggioStep", "leadScale", "batchMidi",
+                 "expressionRoutes", "expressionFilters", "expressionSent", "lock"]
+
+    def __init__(self, midiOut, chordChannel, bassChannel, voiceChannels=()):
+        self.lock = threading.RLock() # held by whatever changes the session: OSC, the scheduler, the envelope timer, settings
+        self.midiOut = midiOut
+        self.chordChannel = chordChannel # channel for top 4 voices
+        self.bassChannel = bassChannel # channel for bass
+        self.channels = (chordChannel, bassChannel)
+        if bassChannel in voiceChannels:
+            raise ValueError("the bass channel " + str(bassChannel) + " can't be a voice channel")
+        self.voiceAllocator = VoiceAllocator(voiceChannels) if voiceChannels else None # see the Voice Channels region
+        # channel -> the channels its notes sound on, for the envelopes and expression
+        self.channelGroups = {chordChannel: tuple(voiceChannels) or (chordChannel,), bassChannel: (bassChannel,)}
+
+        self.harmony = harmony(TRANSPOSE_KEY_SEMITONES, KEY_MODE) # the chords of the key, swapped by setKey()
+        self.state = initialState(self.harmony) # what the buttons have set, an InstrumentState swapped whole by changeState()
+        self.history = collections.deque(maxlen=UNDO_STEPS) # the states before, for undo()
+        self.scenes = {} # scene number -> saved state, see scene()
+        self.pivotPitch = OCTAVE * 5 # the note around which the contrary motion expands/shrinks
+                        # if the pivot pitch is played, only that single pitch will sound
+        self.buttonsHeld = 0
+        self.lastChord = []
+        self.accelerometerValues = []
+        self.voiceNotes = {} # (voice group "chord" or "bass", channel) -> set of pitches it is holding
+        self.activeNotes = {} # (channel, pitch) -> how many voice groups are holding the note
+        self.envelopeVolumes = {} # channel -> last volume the envelopes sent
+        self.midiMessagesSent = 0 # running count of every message sent to midiOut
+        self.tapMessagesSent = 0 # messages sent by the most recent tap
+        self.xFilter = OneEuroFilter(*MOTION_FILTER) # continuous motion
+        self.yFilter = OneEuroFilter(*MOTION_FILTER)
+        self.motionSteps = None # (x step, y step) the filtered tilt is on
+        self.playedSteps = None # (x step, y step) of the chord playing
+        self.lastRevoiceAt = 0.0
+        self.scheduleGeneration = 0 # strum and arpeggio notes, see the Scheduler region
+        self.arpeggio = None # notes of the running arpeggio, in the order they are played
+        self.arpeggioStep = 0
+        self.leadScale = None # (scale of chords id, root) of the last chord voice leading looked at
+        self.batchMidi = getattr(midiOut, "batch", False) # send each chord change as one buffer? see RawMidiOut
+        self.setUpExpression()
+
+    # Build the EXPRESSION controllers, see the Expression region
+    def setUpExpression(self):
+        self.expressionRoutes = []
+        if hasattr(self.midiOut, "controlChange"):
+            self.expressionRoutes = expressionRoutes(EXPRESSION, self.channelGroups[self.chordChannel], self.bassChannel)
+        self.expressionFilters = [OneEuroFilter(*MOTION_FILTER) for axis in AXES]
+        self.expressionSent = {} # (controller, channel) -> (last value sent, when)
+
+    # Catch up with settings changed by reconfigure(), rebuilding only what they affect
+    def settingsChanged(self, settings):
+        with self.lock:
+            if "TRANSPOSE_KEY_SEMITONES" in settings or "KEY_MODE" in settings:
+                self.setKey(TRANSPOSE_KEY_SEMITONES, KEY_MODE)
+            if "MOTION_FILTER" in settings:
+                self.xFilter = OneEuroFilter(*MOTION_FILTER)
+                self.yFilter = OneEuroFilter(*MOTION_FILTER)
+            if "MOTION_FILTER" in settings or "EXPRESSION" in settings:
+                self.setUpExpression()
+            if "BASS" in settings and not BASS:
+                self.releaseVoiceGroup("bass", self.bassChannel) # or a held bass note would never be released
+            if "ARPEGGIO" in settings:
+                self.cancelScheduled() # a running arpeggio stops, the next tap starts the new one
+            if "DECAY" in settings and not DECAY:
+                self.stopEnvelopes()
+
+    # Parse accelerometer data from OSC messages
+    def parseAccelerometerData(self, message):
+        with self.lock:
+            arguments = message.getArguments()
+            if not isNumbers(arguments, 3):
+                if STATS: stats.count("malformedMessages")
+                return # keep the last tilt
+            self.accelerometerValues = arguments
+            if CONTINUOUS_MOTION and self.buttonsHeld > 0 and self.motionSteps is not None: 
+                self.continueMotion()
+            if self.expressionRoutes: 
+                self.express()
+
+    # Send the filtered tilt to the EXPRESSION controllers, from -1.0-1.0 to 0-127 (or 0-16383 as 14 bits).
+    # Values that haven't changed aren't sent, and neither is anything within 1 / EXPRESSION_MAX_HZ
+    # of the controller's last value. The next accelerometer message catches those up.
+    # A 14-bit value whose coarse part hasn't changed only sends the fine part.
+    def express(self):
+        try:
+            x, y, z = self.accelerometerValues
+        except ValueError:
+            return
+        values = (x, y, z)
+
+        now = clock()
+        filtered = [None, None, None]
+        interval = 1.0 / EXPRESSION_MAX_HZ
+        messagesBefore = self.midiMessagesSent
+        if self.batchMidi: self.midiOut.startBatch()
+        try:
+            for axis, controller, channels in self.expressionRoutes:
+                if filtered[axis] is None:
+                    filtered[axis] = self.expressionFilters[axis].filter(min(max(values[axis], -1.0), 1.0), now)
+                fine = EXPRESSION_14_BIT and controller < 32
+                value = int(round((filtered[axis] + 1.0) / 2.0 * (16383 if fine else 127)))
+                for channel in channels:
+                    last = self.expressionSent.get((controller, channel))
+                    if last is not None and (last[0] == value or now - last[1] < interval):
+                        continue
+                    self.expressionSent[(controller, channel)] = (value, now)
+                    if not fine:
+                        self.midiOut.controlChange(controller, value, channel)
+                        self.countMidiMessages(1)
+                        continue
+                    if last is None or last[0] >> 7 != value >> 7:
+                        self.midiOut.controlChange(controller, value >> 7, channel)
+                        self.countMidiMessages(1)
+                    self.midiOut.controlChange(controller + 32, value & 0x7F, channel)
+                    self.countMidiMessages(1)
+        finally:
+            if self.batchMidi: self.midiOut.sendBatch()
+        if STATS: stats.count("controlChanges", self.midiMessagesSent - messagesBefore)
+
+    # Map accelerometer values to pitches
+    def mapAccelerometerToPitch(self, x, y, z):
+        # Ensure x and y are within range
+        if x > 0.0: x = 0.0
+        if y > 0.0: y = 0.0
+    
+        # print("x: " + str(x))
+        # print("y: " + str(y))
+        # print("z: " + str(z))
+        # map acc range to octave + 1 range, ex. C4-C5
+        xMapped = mapValue(x, -1.0, 0.1, 0, 9)
+        yMapped = mapValue(y, -1.0, 0.0, 9, 0)
+        # z goes to the EXPRESSION controllers instead, see express()
+        if CONTINUOUS_MOTION: 
+            self.startMotion(x, y, xMapped, yMapped)
+        return self.mapStepsToPitch(xMapped, yMapped)
+
+    # Map x and y steps (0-9) to pitches, keeping to the chord tones or the tones between them
+    def mapStepsToPitch(self, xMapped, yMapped):
+        state = self.state
+        scaleOfChords = SCALES_OF_CHORDS[state.scaleOfChordsId]
+        if state.offChordLock: 
+            # if off chord locked, only play odd scale degrees
+            if xMapped % 2 == 0: xMapped += 1
+    
+        else: 
+            # if on chord locked, only play even scale degrees
+            if xMapped % 2 == 1: xMapped += 1
+
+        # x
+        octaveX = (xMapped // 8) + 4
+        scaleDegree = xMapped % 8
+        pitchX = scaleOfChords[scaleDegree] + state.scaleOfChordsRoot + (octaveX * OCTAVE)
+
+        # y
+        octaveY = (yMapped // 8) + 5
+        scaleDegree = yMapped % 8
+        pitchY = scaleOfChords[scaleDegree] + state.scaleOfChordsRoot + (octaveY * OCTAVE)
+    
+        # print("Input Pitch: " + str(pitchX))
+        return [pitchX, pitchY]
+
+    # Follow the tilt from the chord a tap played
+    def startMotion(self, x, y, xMapped, yMapped):
+        now = clock()
+        self.xFilter.reset(x, now)
+        self.yFilter.reset(y, now)
+        self.motionSteps = self.playedSteps = (xMapped, yMapped)
+        self.lastRevoiceAt = now
+
+    # Re-voice the held chord when the filtered tilt moves to another step
+    def continueMotion(self):
+        try:
+            x, y, z = self.accelerometerValues
+        except ValueError:
+            return
+        if not ((-1.0 < x < 1.0) and (-1.0 < y < 1.0)): 
+            return
+
+        now = clock()
+        x = self.xFilter.filter(min(x, 0.0), now)
+        y = self.yFilter.filter(min(y, 0.0), now)
+        xStep, yStep = self.motionSteps
+        self.motionSteps = (hysteresisStep(mapPosition(x, -1.0, 0.1, 0, 9), xStep, MOTION_HYSTERESIS),
+                            hysteresisStep(mapPosition(y, -1.0, 0.0, 9, 0), yStep, MOTION_HYSTERESIS))
+        if self.motionSteps == self.playedSteps or now - self.lastRevoiceAt < 1.0 / MAX_REVOICE_HZ:
+            return
+
+        self.playedSteps = self.motionSteps
+        self.lastRevoiceAt = now
+        pitchX, pitchY = self.mapStepsToPitch(*self.motionSteps)
+        self.obliqueMotion(pitchY)
+        try: chord = self.contraryMotion(pitchX)
+        except ValueError: return
+        if chord != self.lastChord:
+            self.lastChord = chord
+            if self.batchMidi: self.midiOut.startBatch()
+            try:
+                self.playChord(chord)
+            finally:
+                if self.batchMidi: self.midiOut.sendBatch()
+            if STATS: stats.count("continuousMotionChords")
+
+    # Look up the contrary motion chord in the voicing table of the key, building it on the first miss.
+    # Pitches that are not in the scale of chords are remembered as None, and still raise ValueError.
+    #
+    # Measured under CPython 3.11 (10.2026), 24640 voicings:
+    #   contraryMotion() from the table:  ~0.4 us per tap
+    #   buildContraryMotion() per tap:    ~3.3 us per tap (the old contraryMotion())
+    # Filling the table takes ~0.3-0.4 s, on a thread after startup (precomputeInBackground()), see benchmarks/coldstart.py.
+    def contraryMotion(self, contraryPitch):
+        state = self.state
+        key = (state.scaleOfChordsId, state.scaleOfChordsRoot, self.pivotPitch, contraryPitch)
+        voicings = self.harmony.voicings
+        try:
+            chord = voicings[key]
+        except KeyError:
+            chord = lookUpVoicing(key)
+            keyOffset = self.harmony.keyOffset
+            if chord is not None and keyOffset:
+                chord = tuple(note + keyOffset for note in chord)
+            voicings[key] = chord
+
+        if chord is None:
+            raise ValueError("pitch " + str(contraryPitch) + " is not in the scale of chords")
+        return chord
+
+    # With VOICE_LEADING, a chord of another scale of chords (a new chord numeral or family member) is played
+    # as its voicing nearest the last chord. Tilting within the same scale of chords plays the chords as voiced.
+    def leadVoices(self, chord):
+        state = self.state
+        scale = (state.scaleOfChordsId, state.scaleOfChordsRoot)
+        if scale == self.leadScale or not self.lastChord:
+            self.leadScale = scale
+            return chord
+        self.leadScale = scale
+
+        key = (tuple(self.lastChord), chord)
+        try:
+            return voiceLeadingTable[key]
+        except KeyError:
+            nearest = voiceLeadingTable[key] = nearestVoicing(key[0], chord, self.harmony.keyOffset)
+            return nearest
+
+    # keep the bottom note the same, while moving the notes above
+    def obliqueMotion(self, inputPitch):
+        # redundant, but named differently for clarity
+        # may add more functionality to obliqueMotion later on
+        self.setPivotPitch(inputPitch)
+
+    # display and play the chord!
+    def playChord(self, chord):
+        volume, chordChannel = 127, self.chordChannel
+        if ARPEGGIO:
+            self.arpeggiate(chord, volume, chordChannel)
+        elif STRUM_MS:
+            self.strum(chord, volume, chordChannel)
+        else:
+            self.playNotes("chord", set(chord), volume, chordChannel)
+
+    # Spread the notes a chord adds over STRUM_MS, lowest first for "up" and highest first for "down".
+    # The first one plays with the tap, notes that left stop and common tones sound right away, like without a strum.
+    def strum(self, chord, volume, channel):
+        self.cancelScheduled()
+        notes = set(chord)
+        arriving = sorted(notes - self.voiceNotes.get(("chord", channel), set()), reverse=STRUM_DIRECTION == "down")
+        self.playNotes("chord", notes.difference(arriving[1:]), volume, channel)
+
+        now = clock()
+        for index in range(1, len(arriving)):
+            at = now + STRUM_MS / 1000.0 * index / (len(arriving) - 1)
+            scheduler.schedule(at, self, self.strumNote, (arriving[index], volume, channel))
+
+    # One of the later notes of a strum
+    def strumNote(self, note, volume, channel):
+        self.holdNote(note, volume, channel)
+        self.voiceNotes.setdefault(("chord", channel), set()).add(note)
+
+    # Play the chord one note at a time, ARPEGGIO_STEPS_PER_BEAT notes per beat of ARPEGGIO_BPM, until every button is released.
+    # Steps after the first fall on one grid for every session, so phones stay in time with each other.
+    # A chord that comes while the arpeggio runs (ex: from continuous motion) takes over at the next step.
+    def arpeggiate(self, chord, volume, channel):
+        notes = sorted(set(chord))
+        if ARPEGGIO == "down":
+            notes.reverse()
+        elif ARPEGGIO == "updown":
+            notes = notes + notes[-2:0:-1]
+        running = self.arpeggio is not None
+        self.arpeggio = notes
+        if not running:
+            self.arpeggioStep = 0
+            self.arpeggiateStep(volume, channel, clock())
+
+    # Play the next note of the arpeggio at time now, and schedule the one after it on the grid, at least half a step away
+    def arpeggiateStep(self, volume, channel, now):
+        notes = self.arpeggio
+        if notes is None:
+            return # cancelled
+        self.playNotes("chord", set([notes[self.arpeggioStep % len(notes)]]), volume, channel)
+        self.arpeggioStep += 1
+        stepSeconds = 60.0 / ARPEGGIO_BPM / ARPEGGIO_STEPS_PER_BEAT
+        nextAt = (math.floor(now / stepSeconds + 0.5) + 1) * stepSeconds
+        scheduler.schedule(nextAt, self, self.arpeggiateStep, (volume, channel, nextAt))
+
+    # Cancel every strum and arpeggio note this session has scheduled
+    def cancelScheduled(self):
+        self.scheduleGeneration += 1
+        self.arpeggio = None
+
+    # Move a voice group from the notes it is holding to a new set of notes.
+    # Only the notes that left get a noteOff and only the notes that arrived get a noteOn,
+    # so oblique motion sends one or two messages instead of silencing and re-striking every voice.
+    # Notes go out lowest first, so the MIDI stream is the same on every Python (sets iterate differently).
+    def playNotes(self, voiceGroup, notes, volume, channel):
+        oldNotes = self.voiceNotes.get((voiceGroup, channel), set())
+
+        for note in sorted(oldNotes - notes):
+            self.releaseNote(note, channel)
+
+        if RESTRIKE_COMMON_TONES:
+            for note in sorted(oldNotes & notes):
+                noteChannel = self.noteChannel(note, channel)
+                if noteChannel is None:
+                    continue # a voice stolen by a newer note while the pool was short, it stays silent
+                self.midiOut.noteOff(note, noteChannel)
+                self.midiOut.noteOn(note, volume, noteChannel)
+                self.countMidiMessages(2)
+
+        for note in sorted(notes - oldNotes):
+            self.holdNote(note, volume, channel)
+
+        self.voiceNotes[(voiceGroup, channel)] = notes
+
+    # Let go of every note a voice group is holding
+    def releaseVoiceGroup(self, voiceGroup, channel):
+        for note in sorted(self.voiceNotes.pop((voiceGroup, channel), ())):
+            self.releaseNote(note, channel)
+
+    # The channel a held note sounds on, its own with VOICE_CHANNELS
+    def noteChannel(self, pitch, channel):
+        if channel == self.chordChannel and self.voiceAllocator is not None:
+            return self.voiceAllocator.channelOf(pitch)
+        return channel
+
+    # Hold a note, only sending noteOn if no other voice group is already holding it
+    def holdNote(self, pitch, volume, channel):
+        if channel == self.chordChannel and self.voiceAllocator is not None:
+            channel, stolen = self.voiceAllocator.allocate(pitch)
+            if stolen is not None:
+                # the oldest voice gives up its channel
+                self.voiceNotes.get(("chord", self.chordChannel), set()).discard(stolen)
+                del self.activeNotes[(channel, stolen)]
+                self.midiOut.noteOff(stolen, channel)
+                self.countMidiMessages(1)
+        key = (channel, pitch)
+        holders = self.activeNotes.get(key, 0)
+        if holders == 0:
+            self.midiOut.noteOn(pitch, volume, channel)
+            self.countMidiMessages(1)
+        self.activeNotes[key] = holders + 1
+
+    # Let go of a note, sending exactly one noteOff when its last holder lets go
+    def releaseNote(self, pitch, channel):
+        if channel == self.chordChannel and self.voiceAllocator is not None:
+            channel = self.voiceAllocator.release(pitch)
+            if channel is None:
+                return # its channel was taken by a newer note, which already stopped it
+        key = (channel, pitch)
+        holders = self.activeNotes.get(key, 0)
+        if holders > 1:
+            self.activeNotes[key] = holders - 1
+        elif holders == 1:
+            del self.activeNotes[key]
+            self.midiOut.noteOff(pitch, channel)
+            self.countMidiMessages(1)
+
+    # Silence every active note on one channel
+    def releaseChannel(self, channel):
+        if channel == self.chordChannel and self.voiceAllocator is not None:
+            self.releaseVoiceGroup("chord", channel) # the chord's notes are on their own channels
+        for key in [key for key in self.voiceNotes if key[1] == channel]:
+            del self.voiceNotes[key]
+        for key in sorted(key for key in self.activeNotes if key[0] == channel):
+            del self.activeNotes[key]
+            self.midiOut.noteOff(key[1], channel)
+            self.countMidiMessages(1)
+
+    # Silence every active note, one noteOff each, instead of a noteOff for all 128 pitches on all channels
+    def releaseAllNotes(self):
+        for channel, pitch in sorted(self.activeNotes):
+            self.midiOut.noteOff(pitch, channel)
+        self.countMidiMessages(len(self.activeNotes))
+        self.activeNotes.clear()
+        self.voiceNotes.clear()
+        if self.voiceAllocator is not None:
+            self.voiceAllocator = VoiceAllocator(self.voiceAllocator.channels)
+
+    # Keep track of how many MIDI messages were sent
+    def countMidiMessages(self, count):
+        self.midiMessagesSent += count
+
+    # Change the pivot pitch
+    def setPivotPitch(self, newPivotPitch):
+        self.pivotPitch = newPivotPitch   
+
+    # Change key, ex: setKey(-3, "minor") for A minor. The chord and bass move to the new key right away,
+    # the next chord numeral tapped plays the chords of the new key.
+    def setKey(self, semitones, mode=None):
+        self.harmony = harmony(semitones, mode or self.harmony.mode)
+
+    # Change key from an OSC message to KEY_ADDRESS, arguments: semitones from C, and optionally "major" or "minor"
+    def handleKeyChange(self, message):
+        with self.lock:
+            arguments = message.getArguments()
+            try: self.setKey(arguments[0], arguments[1] if len(arguments) > 1 else None)
+            except (IndexError, ValueError, TypeError): print("\nUnknown key: " + str(arguments))
+
+    # Play a bass note for the chord numeral
+    def toggleBassNote(self, bassNote, onOrOff):
+        volume, channel = 100, self.bassChannel
+
+        if onOrOff == 1.0:
+            # print("Bass note: " + str(bassNote))
+            self.playNotes("bass", set([bassNote]), volume, channel)
+        elif onOrOff == 0.0:
+            self.releaseVoiceGroup("bass", channel)
+
+    # Play the appropriate chord from a touch input. receivedAt is when the OSC arrived on clock(), if it waited in a queue.
+    def handleTouchInput(self, message, receivedAt=None):
+        with self.lock:
+            if STATS: handledAt, messagesBefore = clock(), self.midiMessagesSent
+            address = message.getAddress()
+            arguments = message.getArguments()
+            if not isNumbers(arguments, 1):
+                if STATS: stats.count("malformedMessages")
+                return # buttons send 1.0 when pressed and 0.0 when released
+            onOrOff = arguments[0]
+            button = layout.buttons.get(address) # (action, arguments, runs on release) of the button, see the Controller Layouts region
+            if button is None:
+                return # not a button of the layout
+
+            if onOrOff != 0 or button[2]: self.buttonOperations(button)
+            if STATS: updatedAt = clock()
+
+            # if releasing a button, stop all sounds. this allows for touch to hold sustain notes on certain instruments, such as SQUARE
+            if onOrOff == 0: 
+                self.buttonsHeld -= 1
+                if self.buttonsHeld == 0:
+                    if ARPEGGIO: self.cancelScheduled() # the last note of the arpeggio rings on, like a chord
+                    if DECAY: self.releaseEnvelopes() # fade the volume out, achieves decay effect
+                    if BASS: self.toggleBassNote(self.state.bassNote + self.harmony.keyOffset, onOrOff)
+                if STATS: stats.count("midiMessages", self.midiMessagesSent - messagesBefore)
+                return
+            else:
+                self.buttonsHeld += 1
+                if DECAY: self.attackEnvelopes()
+
+
+            try: 
+                x, y, z = self.accelerometerValues
+            except:
+                if STATS: stats.count("accelerometerMissing")
+                print("\nTurn on the accelerometer in TouchOSC!!!\nSettings -> Options -> OSC -> Accelerometer (/accxyz)")
+                return
+
+            if  (-1.0 < x < 1.0) and (-1.0 < y < 1.0): 
+                pitchX, pitchY = self.mapAccelerometerToPitch(x, y, z)
+
+            try : self.obliqueMotion(pitchY)
+            except:
+                if STATS: stats.count("obliqueMotionFallback")
+
+            try: chord = self.contraryMotion(pitchX)
+            except: 
+                chord = self.lastChord
+                if STATS: stats.count("contraryMotionFallback")
+            else:
+                if STATS:
+                    state = self.state
+                    stats.count(VOICING_NAMES[voicingWidth(SCALES_OF_CHORDS[state.scaleOfChordsId], state.scaleOfChordsRoot, self.pivotPitch, pitchX)])
+            if VOICE_LEADING: chord = self.leadVoices(chord)
+            if STATS: voicedAt = clock()
+
+            # play the appropriate chord
+            messagesBeforeTap = self.midiMessagesSent
+            self.lastChord = chord
+            if ARPEGGIO: self.cancelScheduled() # every tap starts the arpeggio over
+            if self.batchMidi: self.midiOut.startBatch() # the chord and its bass note go out as one write
+            try:
+                self.playChord(chord)
+                if BASS: self.toggleBassNote(self.state.bassNote + self.harmony.keyOffset, onOrOff)
+            finally:
+                if self.batchMidi: self.midiOut.sendBatch() # even if playing raised, or nothing after it would be sent
+            self.tapMessagesSent = self.midiMessagesSent - messagesBeforeTap
+            if STATS: 
+                stats.tap(handledAt if receivedAt is None else receivedAt, handledAt, updatedAt, voicedAt, clock())
+                stats.count("midiMessages", self.midiMessagesSent - messagesBefore)
+            # print("Chord: " + str(chord))
+            # print("MIDI messages: " + str(self.tapMessagesSent))
+
+    # Update the session based on what button was pressed, button is (action, arguments, runs on release) from the layout
+    def buttonOperations(self, button):
+        action, arguments = button[0], button[1]
+        action(self, *arguments)
+
+    # Swap in the state a button leads to, button is (action name, arguments...), see STATE_ACTIONS
+    def changeState(self, button):
+        state = self.state
+        newState = nextState(self.harmony, state, button)
+        if newState != state:
+            self.history.append(state)
+        self.state = newState
+
+    # Go back to the state before the last button that changed it
+    def undo(self):
+        if self.history:
+            self.state = self.history.pop()
+
+    # Hold any button and press a scene button to save what the buttons have set, press it alone to go back to it
+    def scene(self, number):
+        if self.buttonsHeld > 0:
+            self.scenes[number] = self.state
+        elif number in self.scenes and self.scenes[number] != self.state:
+            self.history.append(self.state)
+            self.state = self.scenes[number]
+
+    # Run the attack and decay of every envelope, cancelling any release still going
+    def attackEnvelopes(self):
+        for envelopeChannel in envelopeTables:
+            onSteps, offSteps, offStart = envelopeTables[envelopeChannel]
+            self.startEnvelope(self.channels[envelopeChannel], onSteps, 0)
+
+    # Run the release of every envelope, from the current volume of its channel
+    def releaseEnvelopes(self):
+        for envelopeChannel in envelopeTables:
+            onSteps, offSteps, offStart = envelopeTables[envelopeChannel]
+            channel = self.channels[envelopeChannel]
+            self.startEnvelope(channel, offSteps, offStart[self.envelopeVolumes.get(channel, 127)])
+
+    # Stop the envelopes of this session where they are and put the volume back to full, ex: when DECAY is turned off
+    def stopEnvelopes(self):
+        for channel in self.channels:
+            runningEnvelopes.pop((self, channel), None)
+            if self.envelopeVolumes.get(channel, 127) != 127:
+                channels = self.channelGroups[channel]
+                for volumeChannel in channels:
+                    self.midiOut.setVolume(127, volumeChannel)
+                self.countMidiMessages(len(channels))
+                self.envelopeVolumes[channel] = 127
+
+    # Play the first step right away, and leave the rest to the envelope timer
+    def startEnvelope(self, channel, steps, startStep):
+        global lastEnvelopeTick
+        runningEnvelopes[(self, channel)] = (steps, startStep)
+        self.stepEnvelope(channel)
+    
+        if not runningEnvelopes: 
+            envelopeTimer.stop() # a tap cancelled the last release
+        elif not envelopeTimer.isRunning():
+            lastEnvelopeTick = None
+            envelopeTimer.start()
+
+    # Send the next volume of one envelope. A release that reaches silence also releases its notes.
+    def stepEnvelope(self, channel):
+        steps, step = runningEnvelopes[(self, channel)]
+        volume = steps[step]
+        if volume != self.envelopeVolumes.get(channel):
+            channels = self.channelGroups[channel]
+            for volumeChannel in channels:
+                self.midiOut.setVolume(volume, volumeChannel)
+            self.countMidiMessages(len(channels))
+            self.envelopeVolumes[channel] = volume
+    
+        if step + 1 < len(steps):
+            runningEnvelopes[(self, channel)] = (steps, step + 1)
+        else:
+            del runningEnvelopes[(self, channel)]
+            if volume == 0: 
+                self.releaseChannel(channel)
+# endregion
+
+# region Controller Layouts
+# A layout maps the OSC address of every button straight to what it does, so a tap costs one dict lookup.
+# Layout files are JSON, ex: layouts/touchosc-simple.json:
+#   {"name": "...", "accelerometer": "/accxyz", "buttons": {"/7/push16": ["numeral", 1], "/7/push5": ["familyDown"], ...}}
+# Every button is [action, arguments...], the actions are the names of STATE_ACTIONS and SESSION_ACTIONS.
+# Addresses not in the layout are ignored.
+
+# Actions that don't change the state themselves, they only act when pressed.
+# action name -> (Session method, arguments every button of the action passes before its own)
+SESSION_ACTIONS = {
+    "undo": (Session.undo, ()),   # back to the state before the last button that changed it
+    "scene": (Session.scene, ()), # ["scene", number], hold any button and press it to save the state, press it alone to recall it
+}
+
+# TouchOSC's LiveControl iPad layout, page 7, the layout Movements, Not Chords was built on
+TOUCHOSC_LIVECONTROL = {
+    "name": "TouchOSC LiveControl, page 7",
+    "accelerometer": ACCELEROMETER_ADDRESS,
+    "buttons": {
+        "/7/push16": ["numeral", 1], "/7/push12": ["numeral", 2], "/7/push8": ["numeral", 3], "/7/push4": ["numeral", 4],
+        "/7/push15": ["numeral", 5], "/7/push11": ["numeral", 6], "/7/push7": ["numeral", 7], "/7/push3": ["numeral", 8],
+        "/7/push10": ["onChord"], "/7/push6": ["offChord"], "/7/push14": ["alternate"], "/7/push2": ["dominant"],
+        "/7/push5": ["familyDown"], "/7/push9": ["familyAcross"], "/7/push13": ["familyUp"],
+        "/7/push1": ["undo"], # the spare button, a layout file can make it ["scene", 1] instead
+    }
+}
+
+# The buttons of a controller, built once when the layout is loaded
+class Layout(object):
+    __slots__ = ["name", "accelerometer", "buttons"]
+
+    def __init__(self, description):
+        self.name = description.get("name", "")
+        self.accelerometer = description.get("accelerometer", ACCELEROMETER_ADDRESS)
+        self.buttons = {} # OSC address -> (Session method, arguments, runs on release)
+        for address in description["buttons"]:
+            button = description["buttons"][address]
+            if isinstance(button, str) or isinstance(button, type(u"")):
+                button = [button]
+            self.buttons[str(address)] = layoutButton(button, address)
+
+# What a layout button does, (Session method, arguments, runs on release), from [action, arguments...].
+# State buttons run again on release, like they always have, so letting go of a button lets go of Off Chord lock.
+def layoutButton(button, address):
+    name = str(button[0])
+    if name == "numeral" and list(button[1:]) not in [[chordNumeral] for chordNumeral in range(1, 9)]:
+        raise ValueError("chord numerals are 1 to 8, not " + str(list(button[1:])) + " for " + address)
+    if name == "scene" and (len(button) != 2 or not isinstance(button[1], int)):
+        raise ValueError("scenes are numbered, not " + str(list(button[1:])) + " for " + address)
+    if name in STATE_ACTIONS:
+        return (Session.changeState, ((name,) + tuple(button[1:]),), True)
+    if name in SESSION_ACTIONS:
+        action, arguments = SESSION_ACTIONS[name]
+        return (action, arguments + tuple(button[1:]), False)
+    raise ValueError("unknown action " + name + " for " + address)
+
+# Read a layout file
+def loadLayout(path):
+    with open(path) as layoutFile:
+        return Layout(json.load(layoutFile))
+
+# Play every session from the buttons of newLayout
+def useLayout(newLayout):
+    global layout
+    layout = newLayout
+
+layout = Layout(TOUCHOSC_LIVECONTROL)
+# endregion
+
+# region Session Host
+# MIDI channel pairs (top 4 voices, bass) handed out to performers, skipping channel 9 (General MIDI drums)
+CHANNEL_PAIRS = [(0, 1), (2, 3), (4, 5), (6, 7), (10, 11), (12, 13), (14, 15)]
+
+# Hosts one Session per phone, telling phones apart by the sender of their OSC (ex: ("192.168.1.20", 9000)).
+# Performers get the next free channel pair, on the next MIDI out once every pair of a MIDI out is taken,
+# so two MIDI outs hold 14 performers. Past that, performers double up on channel pairs.
+# With VOICE_CHANNELS, the first performer of each MIDI out plays its voices on them, like mnc.py,
+# and the others only get the channel pairs outside them.
+class SessionHost(object):
+    def __init__(self, midiOuts, maxSessions=16, onNewSession=None):
+        self.midiOuts = midiOuts
+        self.maxSessions = maxSessions
+        self.onNewSession = onNewSession # called with each new session, ex: to choose its instruments
+        self.sessions = {} # sender -> Session
+        self.channelPairs = CHANNEL_PAIRS[:1] + [pair for pair in CHANNEL_PAIRS[1:] if not set(pair) & set(VOICE_CHANNELS)]
+
+    # Find the session of a sender, adding one if there is room. Returns None for senders that don't fit.
+    def session(self, sender):
+        session = self.sessions.get(sender)
+        if session is None and len(self.sessions) < self.maxSessions:
+            performer = len(self.sessions)
+            pairs = self.channelPairs
+            midiOut = self.midiOuts[(performer // len(pairs)) % len(self.midiOuts)]
+            chordChannel, bassChannel = pairs[performer % len(pairs)]
+            session = Session(midiOut, chordChannel, bassChannel, VOICE_CHANNELS if performer % len(pairs) == 0 else ())
+            self.sessions[sender] = session
+            if self.onNewSession is not None:
+                self.onNewSession(session)
+        return session
+
+    # Route an OSC message to the session of its sender, receivedAt is when it arrived, see handleTouchInput()
+    def receive(self, sender, address, arguments, receivedAt=None):
+        session = self.session(sender)
+        if session is None:
+            return
+        
+        message = MemoryOscMessage(address, arguments)
+        if address == layout.accelerometer:
+            session.parseAccelerometerData(message)
+        elif address in layout.buttons:
+            session.handleTouchInput(message, receivedAt)
+        elif address == KEY_ADDRESS:
+            session.handleKeyChange(message)
+# endregion
@@ -0,0 +1,403 @@
+# oscserver.py
+# Movements, Not Chords by Trevor Ritchie
+#
+# An OSC front end for mncengine that runs under CPython 3 with asyncio, instead of JythonMusic's OscIn.
+# It decodes the UDP datagrams itself and hands them to a SessionHost, one session per phone.
+# Accelerometer messages waiting in the queue collapse to the newest one per phone,
+# and touch messages are always handled before accelerometer traffic.
+# A message to /mnc/stats is answered right away, to its sender, with mncengine's statistics and the server counters.
+# With --jitter-buffer, messages in timetagged bundles are played a steady delay after they were sent, see the Jitter Buffer region.
+#
+# With --settings, the engine settings saved in a JSON file are applied to every session, and again whenever it is saved.
+#
+# Run from the repository folder: python oscserver.py [port] [--record performance.mncr] [--layout layouts/touchosc-simple.json] [--jitter-buffer]
+#                                                     [--settings settings.json]
+
+import asyncio
+import collections
+import heapq
+import struct
+
+import mncengine
+
+OSC_LISTENER_PORT = 50380
+MAX_TOUCH_QUEUE = 1024 # touch messages waiting past this are dropped, oldest first
+SETTINGS_POLL_SECONDS = 1.0 # how often --settings checks if the file was saved
+NTP_EPOCH = 2208988800 # seconds from 1900, where OSC timetags count from, to 1970
+
+# region OSC Encoding
+# Read a null terminated string padded to a multiple of 4 bytes, returns (string, next offset)
+def readString(data, offset):
+    end = data.index(b"\0", offset)
+    return data[offset:end].decode("utf-8", "replace"), (end + 4) & ~3
+
+# Decode one OSC message, returns (address, arguments)
+def decodeMessage(data):
+    address, offset = readString(data, 0)
+    if offset >= len(data):
+        return address, [] # no type tags, an old style message without arguments
+
+    typeTags, offset = readString(data, offset)
+    arguments = []
+    for tag in typeTags[1:]:
+        if tag == "f":
+            arguments.append(struct.unpack_from(">f", data, offset)[0])
+            offset += 4
+        elif tag == "i":
+            arguments.append(struct.unpack_from(">i", data, offset)[0])
+            offset += 4
+        elif tag == "d":
+            arguments.append(struct.unpack_from(">d", data, offset)[0])
+            offset += 8
+        elif tag == "h":
+            arguments.append(struct.unpack_from(">q", data, offset)[0])
+            offset += 8
+        elif tag == "s":
+            string, offset = readString(data, offset)
+            arguments.append(string)
+        elif tag == "T":
+            arguments.append(True)
+        elif tag == "F":
+            arguments.append(False)
+        else:
+            raise ValueError("unsupported OSC type tag " + tag)
+    return address, arguments
+
+# Decode a datagram, which is one message or a bundle of them, returns a list of (address, arguments)
+def decodePacket(data):
+    return [(address, arguments) for timetag, address, arguments in decodeTimedPacket(data)]
+
+# Decode a datagram, returns a list of (timetag, address, arguments).
+# The timetag is the time its bundle was sent at in seconds since 1970, or None for "immediately" and messages outside bundles.
+def decodeTimedPacket(data, timetag=None):
+    if not data.startswith(b"#bundle\0"):
+        address, arguments = decodeMessage(data)
+        return [(timetag, address, arguments)]
+
+    seconds, fraction = struct.unpack_from(">II", data, 8)
+    bundleTime = None if (seconds, fraction) == (0, 1) else seconds - NTP_EPOCH + fraction / 4294967296.0
+    messages = []
+    offset = 16 # "#bundle" and the 8 byte timetag
+    while offset + 4 <= len(data):
+        size = struct.unpack_from(">i", data, offset)[0]
+        offset += 4
+        messages.extend(decodeTimedPacket(data[offset:offset + size], bundleTime))
+        offset += size
+    return messages
+
+# Pad bytes with nulls to a multiple of 4
+def pad(data):
+    return data + b"\0" * (4 - len(data) % 4)
+
+# Encode one OSC message of ints, floats and strings
+def encodeMessage(address, arguments):
+    typeTags = ","
+    encoded = b""
+    for argument in arguments:
+        if isinstance(argument, float):
+            typeTags += "f"
+            encoded += struct.pack(">f", argument)
+        elif isinstance(argument, int):
+            typeTags += "i"
+            encoded += struct.pack(">i", argument)
+        else:
+            typeTags += "s"
+            encoded += pad(str(argument).encode("utf-8"))
+    return pad(address.encode("utf-8")) + pad(typeTags.encode("utf-8")) + encoded
+
+# Encode a bundle of encoded messages, timetagged with seconds since 1970
+def encodeBundle(seconds, messages):
+    seconds += NTP_EPOCH
+    bundle = b"#bundle\0" + struct.pack(">II", int(seconds), int((seconds - int(seconds)) * 4294967296.0))
+    for message in messages:
+        bundle += struct.pack(">i", len(message)) + message
+    return bundle
+# endregion
+
+# region Jitter Buffer
+# Wi-Fi delivers OSC in bursts. With bundle timetags, every message is played a steady delay after it was sent,
+# instead of whenever it happens to arrive. The delay is the clock offset between phone and server
+# (the smallest recent difference between arrival and send time, so it includes the fastest trip through the network)
+# plus a buffer deep enough for JITTER_QUANTILE of the recent jitter. The buffer grows as soon as a message
+# arrives later than it covers, and shrinks back slowly once the network calms down.
+JITTER_WINDOW = 256              # messages per phone the clock offset and jitter are estimated over
+JITTER_QUANTILE = 0.95           # how much of the recent jitter the buffer covers
+MIN_BUFFER_SECONDS = 0.002
+MAX_BUFFER_SECONDS = 0.25        # messages later than this are played as soon as they arrive
+BUFFER_SHRINK = 0.98             # how much of its depth the buffer keeps every 16 messages while the jitter is lower
+
+# The clock offset and buffer depth of one phone
+class JitterClock(object):
+    def __init__(self):
+        self.count = 0
+        self.delays = collections.deque() # (message number, arrival - send time), rising, the front is the window's smallest
+        self.jitters = collections.deque(maxlen=JITTER_WINDOW)
+        self.depth = MIN_BUFFER_SECONDS
+
+    # Time to play a message sent at sentAt that arrived at arrivedAt, returns (play time, whether it came later than the buffer covers)
+    def update(self, sentAt, arrivedAt):
+        delay = arrivedAt - sentAt
+        while self.delays and self.delays[-1][1] >= delay:
+            self.delays.pop()
+        self.delays.append((self.count, delay))
+        if self.delays[0][0] <= self.count - JITTER_WINDOW:
+            self.delays.popleft()
+        self.count += 1
+
+        offset = self.delays[0][1]
+        jitter = delay - offset
+        self.jitters.append(jitter)
+        late = jitter > self.depth
+        if late:
+            self.depth = min(jitter, MAX_BUFFER_SECONDS)
+        elif self.count % 16 == 0:
+            covered = sorted(self.jitters)[int(len(self.jitters) * JITTER_QUANTILE)]
+            self.depth = min(max(covered, MIN_BUFFER_SECONDS, self.depth * BUFFER_SHRINK), MAX_BUFFER_SECONDS)
+        return sentAt + offset + self.depth, late
+
+# Holds timetagged messages until it is time to play them
+class JitterBuffer(object):
+    def __init__(self):
+        self.clocks = {} # sender -> JitterClock
+        self.waiting = [] # heap of (play time, arrival order, sender, address, arguments, when it arrived on mncengine.clock())
+        self.arrivals = 0
+        self.timedMessages = 0
+        self.lateMessages = 0 # arrived later than the buffer covered
+
+    def push(self, sender, sentAt, address, arguments, now, receivedAt=None):
+        jitterClock = self.clocks.get(sender)
+        if jitterClock is None:
+            jitterClock = self.clocks[sender] = JitterClock()
+        playAt, late = jitterClock.update(sentAt, now)
+        self.timedMessages += 1
+        if late:
+            self.lateMessages += 1
+        heapq.heappush(self.waiting, (playAt, self.arrivals, sender, address, arguments, receivedAt))
+        self.arrivals += 1
+
+    # When the next message is due, or None
+    def nextAt(self):
+        return self.waiting[0][0] if self.waiting else None
+
+    # Take every message due by now, returns [(sender, address, arguments, when it arrived)] in play order
+    def due(self, now):
+        messages = []
+        while self.waiting and self.waiting[0][0] <= now:
+            playAt, arrival, sender, address, arguments, receivedAt = heapq.heappop(self.waiting)
+            messages.append((sender, address, arguments, receivedAt))
+        return messages
+
+    # The deepest buffer of any phone, in seconds
+    def depth(self):
+        return max([jitterClock.depth for jitterClock in self.clocks.values()] or [0.0])
+# endregion
+
+# region OSC Server
+# Receives OSC datagrams and queues them. Touch messages keep their order,
+# accelerometer messages only keep the newest one per phone until they are handled.
+# With a jitterBuffer, timetagged messages wait in it until they are due.
+# Every message keeps the time its datagram arrived, so STATS times taps from there, through the queues.
+class OscServer(asyncio.DatagramProtocol):
+    def __init__(self, receive, jitterBuffer=None):
+        self.receive = receive # called with (sender, address, arguments, when it arrived), ex: SessionHost.receive
+        self.jitterBuffer = jitterBuffer
+        self.releaseAt = None # when release() is next called for the jitter buffer
+        self.touchQueue = collections.deque() # (sender, address, arguments, when it arrived, accelerometer arguments that came before)
+        self.accelerometerQueue = collections.OrderedDict() # sender -> newest accelerometer arguments
+        self.ready = asyncio.Event()
+        self.transport = None
+
+        # counters
+        self.packetsReceived = 0
+        self.accelerometerDropped = 0 # replaced by a newer accelerometer message before being handled
+        self.touchDropped = 0 # pushed out of a full touch queue
+        self.malformedDropped = 0 # datagrams that could not be decoded
+        self.malformedMessages = 0 # messages whose handler raised, ex: a button message without arguments
+        self.maxQueueDepth = 0
+
+    def queueDepth(self):
+        return len(self.touchQueue) + len(self.accelerometerQueue)
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.loop = asyncio.get_event_loop()
+
+    def datagram_received(self, data, sender):
+        receivedAt = mncengine.clock()
+        self.packetsReceived += 1
+        try:
+            messages = decodeTimedPacket(data)
+        except (ValueError, IndexError, struct.error):
+            self.malformedDropped += 1
+            return
+
+        for timetag, address, arguments in messages:
+            if address == mncengine.STATS_ADDRESS:
+                self.sendStats(sender)
+            elif self.jitterBuffer is not None and timetag is not None:
+                self.jitterBuffer.push(sender, timetag, address, arguments, self.loop.time(), receivedAt)
+            else:
+                self.enqueue(sender, address, arguments, receivedAt)
+
+        if self.jitterBuffer is not None:
+            self.scheduleRelease()
+        self.maxQueueDepth = max(self.maxQueueDepth, self.queueDepth())
+        self.ready.set()
+
+    def enqueue(self, sender, address, arguments, receivedAt=None):
+        if address == mncengine.layout.accelerometer:
+            if sender in self.accelerometerQueue:
+                self.accelerometerDropped += 1
+            self.accelerometerQueue[sender] = arguments
+        else:
+            # the tap is played with the tilt the phone had when it was tapped
+            accelerometerBefore = self.accelerometerQueue.pop(sender, None)
+            if len(self.touchQueue) == MAX_TOUCH_QUEUE:
+                self.touchQueue.popleft()
+                self.touchDropped += 1
+            self.touchQueue.append((sender, address, arguments, receivedAt, accelerometerBefore))
+
+    # Call release() when the jitter buffer's next message is due
+    def scheduleRelease(self):
+        nextAt = self.jitterBuffer.nextAt()
+        if nextAt is None or (self.releaseAt is not None and self.releaseAt <= nextAt):
+            return
+        if self.releaseAt is not None:
+            self.releaseHandle.cancel()
+        self.releaseAt = nextAt
+        self.releaseHandle = self.loop.call_at(nextAt, self.release)
+
+    # Play the messages of the jitter buffer that are due, right away instead of waiting for serve()
+    def release(self):
+        self.releaseAt = None
+        for sender, address, arguments, receivedAt in self.jitterBuffer.due(self.loop.time()):
+            self.enqueue(sender, address, arguments, receivedAt)
+        self.drain()
+        self.scheduleRelease()
+
+    # Handle everything queued: every touch message first, then the newest accelerometer message of each phone
+    def drain(self):
+        while self.touchQueue:
+            sender, address, arguments, receivedAt, accelerometerBefore = self.touchQueue.popleft()
+            if accelerometerBefore is not None:
+                self.dispatch(sender, mncengine.layout.accelerometer, accelerometerBefore)
+            self.dispatch(sender, address, arguments, receivedAt)
+
+        while self.accelerometerQueue:
+            sender, arguments = self.accelerometerQueue.popitem(last=False)
+            self.dispatch(sender, mncengine.layout.accelerometer, arguments)
+
+    # Handle one message, a message that makes its handler raise is counted and dropped instead of stopping serve()
+    def dispatch(self, sender, address, arguments, receivedAt=None):
+        try:
+            self.receive(sender, address, arguments, receivedAt)
+        except Exception as error:
+            self.malformedMessages += 1
+            print("Dropped " + address + " " + repr(arguments) + ": " + repr(error))
+
+    # Datagrams that arrive while a slow drain() runs wait in the socket, and are queued (and coalesced) together after it
+    async def serve(self):
+        while True:
+            await self.ready.wait()
+            self.ready.clear()
+            self.drain()
+
+    # Answer a statistics query with one OSC message per histogram and counter
+    def sendStats(self, sender):
+        messages = mncengine.stats.messages()
+        messages.extend((mncengine.STATS_ADDRESS + "/server/" + name, [value]) for name, value in sorted(self.stats().items()))
+        for address, arguments in messages:
+            self.transport.sendto(encodeMessage(address, arguments), sender)
+
+    def stats(self):
+        stats = {
+            "packetsReceived": self.packetsReceived,
+            "queueDepth": self.queueDepth(),
+            "maxQueueDepth": self.maxQueueDepth,
+            "accelerometerDropped": self.accelerometerDropped,
+            "touchDropped": self.touchDropped,
+            "malformedDropped": self.malformedDropped,
+            "malformedMessages": self.malformedMessages,
+        }
+        if self.jitterBuffer is not None:
+            stats["jitterBufferMs"] = round(self.jitterBuffer.depth() * 1000.0, 2)
+            stats["jitterBuffered"] = len(self.jitterBuffer.waiting)
+            stats["timedMessages"] = self.jitterBuffer.timedMessages
+            stats["lateMessages"] = self.jitterBuffer.lateMessages
+        return stats
+
+# Listen for OSC on a UDP port, returns (transport, server)
+async def startServer(receive, port=OSC_LISTENER_PORT, host="0.0.0.0", jitterBuffer=None):
+    loop = asyncio.get_running_loop()
+    transport, server = await loop.create_datagram_endpoint(lambda: OscServer(receive, jitterBuffer), local_addr=(host, port))
+    asyncio.ensure_future(server.serve())
+    return transport, server
+# endregion
+
+# Engine settings read when the server starts, but not changed while it runs.
+# The SessionHost hands out channel pairs around VOICE_CHANNELS when it is built.
+RESTART_SETTINGS = ["VOICE_CHANNELS"]
+
+# Apply the engine settings saved in settingsFile since the last check to every session of host,
+# host is None for the settings read before the server starts
+def applySettings(settingsFile, host):
+    settings = settingsFile.changes()
+    engineSettings = dict((name, settings[name]) for name in settings if name in mncengine.SETTINGS)
+    if host is not None:
+        for name in sorted(set(engineSettings) & set(RESTART_SETTINGS)):
+            print(name + " changes when oscserver.py is restarted")
+            del engineSettings[name]
+    if engineSettings:
+        try:
+            mncengine.reconfigure(list(host.sessions.values()) if host is not None else [], **engineSettings)
+            print("Settings changed: " + ", ".join(sorted(engineSettings)))
+        except (ValueError, TypeError, KeyError) as error:
+            print("Can't use the settings in " + settingsFile.path + ": " + str(error))
+    for name in sorted(set(settings) - set(mncengine.SETTINGS)):
+        print(name + " is a setting of mnc.py, not of the engine")
+
+async def watchSettings(settingsFile, host):
+    while True:
+        await asyncio.sleep(SETTINGS_POLL_SECONDS)
+        applySettings(settingsFile, host)
+
+async def main(port, recordFile=None, jitterBuffer=False, midiPort=None, settingsPath=None):
+    midiOut = mncengine.RawMidiOut(midiPort) if midiPort else mncengine.MemoryMidiOut()
+    mncengine.connect(midiOut, mncengine.ThreadTimer, mncengine.ThreadScheduler)
+    mncengine.precomputeInBackground() # the first taps build what they need until the tables are ready
+    if settingsPath:
+        settingsFile = mncengine.SettingsFile(settingsPath)
+        applySettings(settingsFile, None)
+    host = mncengine.SessionHost([midiOut])
+    if settingsPath:
+        asyncio.ensure_future(watchSettings(settingsFile, host))
+    receive = host.receive
+    if recordFile:
+        import recorder
+        receive = recorder.Recorder(recordFile).recording(receive)
+    transport, server = await startServer(receive, port, jitterBuffer=JitterBuffer() if jitterBuffer else None)
+    print("Listening for OSC on port " + str(port))
+    try:
+        while True:
+            await asyncio.sleep(5)
+            if midiPort:
+                print(str(server.stats()))
+            else:
+                print(str(len(midiOut.messages)) + " MIDI messages, " + str(server.stats()))
+                del midiOut.messages[:]
+    finally:
+        transport.close()
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Movements, Not Chords OSC server")
+    parser.add_argument("port", type=int, nargs="?", default=OSC_LISTENER_PORT)
+    parser.add_argument("--record", help="record the OSC to this file, replay it with recorder.py")
+    parser.add_argument("--jitter-buffer", action="store_true", help="play timetagged bundles a steady delay after they were sent")
+    parser.add_argument("--layout", help="a controller layout file, instead of TouchOSC LiveControl page 7")
+    parser.add_argument("--midi-port", help="write raw MIDI to this port, ex: /dev/snd/midiC1D0, instead of keeping it in memory")
+    parser.add_argument("--settings", help="a JSON file of engine settings, applied again whenever it is saved")
+    options = parser.parse_args()
+    if options.layout:
+        mncengine.useLayout(mncengine.loadLayout(options.layout))
+    asyncio.run(main(options.port, options.record, options.jitter_buffer, options.midi_port, options.settings))
@@ -0,0 +1,225 @@
+# recorder.py
+# Movements, Not Chords by Trevor Ritchie
+#
+# Records the OSC that drives the instrument to a compact binary file, and replays it through mncengine.
+# Every record has the same size, so a recording can be memory-mapped and jumped through by index.
+# Replays start from fresh sessions with the engine settings the recording started with, and step the envelopes
+# on the recorded clock, so replaying a file always gives the same MIDI stream, bit for bit.
+# Settings changed live while recording aren't in the file, --settings replays with others.
+#
+# Record with mnc.py (RECORD_FILE) or oscserver.py (--record), then replay from the repository folder:
+#   python recorder.py performance.mncr [--realtime] [--out midi.txt] [--settings settings.json]
+
+import atexit
+import json
+import struct
+import time
+
+import mncengine
+
+# region File Format
+# Header: magic, format version, record size
+HEADER = struct.Struct("<4sHH")
+MAGIC = b"MNCR"
+VERSION = 3
+
+# Version 3 follows the header with the engine settings, their length then mncengine.currentSettings() as JSON
+SETTINGS_LENGTH = struct.Struct("<I")
+
+# Record: seconds since the recording started, phone, kind, button, 3 values (x, y, z or the button value).
+# The button is the address of a button of the layout, ex: "/7/push16".
+# Key changes keep the semitones in x and the mode's index in mncengine.MODE_NAMES in y.
+BUTTON_BYTES = 24
+RECORD = struct.Struct("<dHBx%ds3f" % BUTTON_BYTES)
+ACCELEROMETER, TOUCH, KEY = 0, 1, 2
+
+# Version 1 recordings only kept what follows "/7/push" in the button address, ex: "16" or "8"
+RECORD_VERSION_1 = struct.Struct("<dHBx4s3f4x")
+TOUCH_PREFIX = "/7/push"
+# endregion
+
+# region Recorder
+FLUSH_SECONDS = 1.0 # records are written out at most this long after they were made, and when the recording is closed
+
+# Appends OSC messages to a recording. Phones are numbered in the order they are first heard from.
+class Recorder(object):
+    def __init__(self, path):
+        self.file = open(path, "wb")
+        settings = json.dumps(mncengine.currentSettings(), sort_keys=True).encode("utf-8")
+        self.file.write(HEADER.pack(MAGIC, VERSION, RECORD.size) + SETTINGS_LENGTH.pack(len(settings)) + settings)
+        self.startTime = time.time()
+        self.flushedAt = self.startTime
+        self.phones = {} # sender -> phone number
+        self.skipped = 0 # malformed messages, not recorded since the sessions ignore them too
+        atexit.register(self.close) # keep the recording if the instrument is stopped without close()
+
+    # Never raises for a message, so recording can't stop the instrument: malformed messages are counted in skipped
+    def record(self, sender, address, arguments):
+        if address == mncengine.layout.accelerometer:
+            if not mncengine.isNumbers(arguments, 3):
+                self.skipped += 1
+                return
+            kind, button = ACCELEROMETER, b""
+            values = arguments
+        elif address in mncengine.layout.buttons:
+            if len(address) > BUTTON_BYTES:
+                return # too long to record
+            if not mncengine.isNumbers(arguments, 1):
+                self.skipped += 1
+                return
+            kind, button = TOUCH, address.encode("ascii")
+            values = [arguments[0], 0.0, 0.0]
+        elif address == mncengine.KEY_ADDRESS:
+            mode = arguments[1] if len(arguments) == 2 else None
+            if not mncengine.isNumbers(arguments[:1], 1) or len(arguments) > 2 or (len(arguments) == 2 and mode not in mncengine.MODE_NAMES):
+                self.skipped += 1
+                return # played as an unknown key, nothing to replay
+            kind, button = KEY, b""
+            values = [arguments[0], -1.0 if mode is None else mncengine.MODE_NAMES.index(mode), 0.0]
+        else:
+            return # not something the instrument plays
+
+        phone = self.phones.get(sender)
+        if phone is None:
+            phone = self.phones[sender] = len(self.phones)
+        now = time.time()
+        self.file.write(RECORD.pack(now - self.startTime, phone, kind, button, values[0], values[1], values[2]))
+        if now - self.flushedAt >= FLUSH_SECONDS:
+            self.file.flush()
+            self.flushedAt = now
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+    # Record every message before passing it on to receive(sender, address, arguments), ex: SessionHost.receive
+    def recording(self, receive):
+        def recordAndReceive(sender, address, arguments, receivedAt=None):
+            self.record(sender, address, arguments)
+            receive(sender, address, arguments, receivedAt)
+        return recordAndReceive
+# endregion
+
+# region Replayer
+# Read a recording, returns (engine settings, [(seconds, phone, address, arguments) for each record]).
+# Recordings from before version 3 have no settings, {}.
+def readRecording(path):
+    with open(path, "rb") as recordingFile:
+        try:
+            import mmap
+            data = mmap.mmap(recordingFile.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ImportError, ValueError):
+            data = recordingFile.read() # no mmap (Jython), or an empty file
+
+        magic, version, recordSize = HEADER.unpack_from(data, 0)
+        record = {VERSION: RECORD, 2: RECORD, 1: RECORD_VERSION_1}.get(version)
+        if magic != MAGIC or record is None or recordSize != record.size:
+            raise ValueError(path + " is not a version 1 to " + str(VERSION) + " recording")
+        buttonPrefix = TOUCH_PREFIX if version == 1 else ""
+
+        settings = {}
+        start = HEADER.size
+        if version >= 3:
+            settingsLength, = SETTINGS_LENGTH.unpack_from(data, start)
+            start += SETTINGS_LENGTH.size
+            settings = mncengine.fromJson(json.loads(data[start:start + settingsLength].decode("utf-8")))
+            start += settingsLength
+
+        records = []
+        for offset in range(start, len(data) - record.size + 1, record.size):
+            seconds, phone, kind, button, x, y, z = record.unpack_from(data, offset)
+            if kind == ACCELEROMETER:
+                records.append((seconds, phone, mncengine.layout.accelerometer, [x, y, z]))
+            elif kind == KEY:
+                records.append((seconds, phone, mncengine.KEY_ADDRESS, [int(x)] + ([mncengine.MODE_NAMES[int(y)]] if y >= 0 else [])))
+            else:
+                records.append((seconds, phone, buttonPrefix + button.rstrip(b"\0").decode("ascii"), [x]))
+        return settings, records
+
+# Read the records of a recording, returns (seconds, phone, address, arguments) for each
+def readRecords(path):
+    return readRecording(path)[1]
+
+# Move the MIDI a session sent into stream, at seconds
+def collect(stream, seconds, midiOut):
+    stream.extend((seconds, message) for message in midiOut.messages)
+    del midiOut.messages[:]
+
+# Run the strum and arpeggio notes scheduled up to seconds, collecting their MIDI into stream at the time each was due
+def stepScheduler(seconds, midiOut, stream):
+    nextAt = mncengine.scheduler.nextAt()
+    while nextAt is not None and nextAt <= seconds:
+        mncengine.scheduler.runDue(nextAt)
+        collect(stream, nextAt, midiOut)
+        nextAt = mncengine.scheduler.nextAt()
+
+# Tick the envelopes every DECAY_TIME_MS of recorded time up to seconds, collecting their MIDI into stream.
+# Returns the time of the last tick, pass it back in next time.
+def stepEnvelopes(envelopeTime, seconds, midiOut, stream):
+    tickSeconds = mncengine.DECAY_TIME_MS / 1000.0
+    while envelopeTime + tickSeconds <= seconds:
+        envelopeTime += tickSeconds
+        if mncengine.envelopeTimer.isRunning():
+            mncengine.envelopeTimer.tick()
+            collect(stream, envelopeTime, midiOut)
+    if not mncengine.envelopeTimer.isRunning():
+        envelopeTime = seconds
+    return envelopeTime
+
+# Feed a recording through fresh sessions, returns [(seconds, MIDI message)].
+# The engine plays with the settings the recording started with, changed by settings (ex: {"BASS": False}),
+# and goes back to its own settings afterwards.
+# Envelopes, strums and arpeggios are stepped by the recorded clock instead of a real timer.
+# With realTime, events are fed at the pace they were recorded, otherwise as fast as possible.
+def replay(path, realTime=False, settings=None):
+    recordedSettings, records = readRecording(path)
+    engineSettings = mncengine.currentSettings()
+    stream = []
+    envelopeTime = 0.0
+    startTime = time.time()
+    recordedTime = [0.0]
+    engineClock = mncengine.clock
+    mncengine.clock = lambda: recordedTime[0] # continuous motion filters and rate limits on the recorded clock
+    try:
+        mncengine.useSettings(recordedSettings)
+        mncengine.configure(**(settings or {}))
+        midiOut = mncengine.MemoryMidiOut()
+        mncengine.connect(midiOut, mncengine.MemoryTimer)
+        mncengine.runningEnvelopes.clear()
+        host = mncengine.SessionHost([midiOut])
+
+        for seconds, phone, address, arguments in records:
+            if realTime:
+                time.sleep(max(0.0, startTime + seconds - time.time()))
+            recordedTime[0] = seconds
+            stepScheduler(seconds, midiOut, stream)
+            envelopeTime = stepEnvelopes(envelopeTime, seconds, midiOut, stream)
+            host.receive(phone, address, arguments)
+            collect(stream, seconds, midiOut)
+    finally:
+        mncengine.clock = engineClock
+        mncengine.useSettings(engineSettings)
+    return stream
+# endregion
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Replay a Movements, Not Chords recording")
+    parser.add_argument("recording")
+    parser.add_argument("--realtime", action="store_true", help="replay at the recorded pace")
+    parser.add_argument("--out", help="write the MIDI stream here instead of printing it")
+    parser.add_argument("--settings", help="a JSON file of engine settings to replay with, over the recorded ones")
+    options = parser.parse_args()
+
+    settings = None
+    if options.settings:
+        with open(options.settings) as settingsFile:
+            settings = mncengine.fromJson(json.load(settingsFile))
+    mncengine.precomputeVoicings()
+    lines = ["%.6f %s" % (seconds, " ".join(str(part) for part in message))
+             for seconds, message in replay(options.recording, options.realtime, settings)]
+    if options.out:
+        with open(options.out, "w") as outFile:
+            outFile.write("\n".join(lines) + "\n")
+    else:
+        print("\n".join(lines))
@@ -0,0 +1,293 @@
+# render.py
+# Movements, Not Chords by Trevor Ritchie
+#
+# Renders gesture trajectories to Standard MIDI Files without a phone, for accompaniment and test material.
+# A trajectory is samples of (seconds, x, y, button): the tilt, and the button held at that moment ("" for none).
+# When the button changes, the old one is released and the new one is tapped, like one finger moving between buttons.
+#
+# With NumPy installed, the accelerometer mapping runs over the whole trajectory at once,
+# otherwise each tap is mapped as it is played. Only the taps go through a Session,
+# so the MIDI is note for note what mnc.py plays for the same gestures.
+# With CONTINUOUS_MOTION on, every sample under a held button goes through the Session instead,
+# and with EXPRESSION on every sample does, since the tilt plays controllers between taps too.
+#
+# Run from the repository folder:
+#   python render.py trajectory.csv out.mid    (csv columns: seconds, x, y, button)
+#   python render.py --demo 10 out.mid         (a made up 10 minute, 100 Hz performance)
+#   [--layout layouts/touchosc-simple.json]      (the buttons of another layout)
+
+import csv
+import math
+import random
+import struct
+import sys
+import time
+
+import mncengine
+import recorder
+
+try:
+    import numpy
+except ImportError:
+    numpy = None # the mapping falls back to plain Python
+
+TICKS_PER_BEAT = 480
+TEMPO_US_PER_BEAT = 500000 # 120 bpm, so 960 ticks per second
+PROGRAMS = {0: 24, 1: 81} # General MIDI programs per channel, NYLON_GUITAR and SAWTOOTH like mnc.py, VOICE_CHANNELS get channel 0's
+RELEASE_SECONDS = 10.0 # how long after the last sample envelopes may run
+
+# region Mapping
+# mapAccelerometerToPitch()'s mapValue() steps for every sample with NumPy, returns (valid, x steps, y steps).
+# Samples outside -1 < x, y < 1 are not valid, and handleTouchInput() would not map them.
+def mapTrajectory(x, y):
+    x = numpy.asarray(x, dtype=float)
+    y = numpy.asarray(y, dtype=float)
+    valid = (-1.0 < x) & (x < 1.0) & (-1.0 < y) & (y < 1.0)
+    xClamped = numpy.minimum(numpy.where(valid, x, 0.0), 0.0)
+    yClamped = numpy.minimum(numpy.where(valid, y, 0.0), 0.0)
+    # the same operations, in the same order, as mapValue(), so the steps round exactly like it
+    xSteps = ((xClamped - -1.0) / (0.1 - -1.0) * (9 - 0) + 0).astype(int)
+    ySteps = ((yClamped - -1.0) / (0.0 - -1.0) * (0 - 9) + 9).astype(int)
+    return valid, xSteps, ySteps
+
+# Indexes of the samples where the held button changes, the first sample counts if it holds a button
+def buttonChanges(buttons):
+    if numpy is not None:
+        buttons = numpy.asarray(buttons, dtype=str)
+        changed = numpy.flatnonzero(buttons[1:] != buttons[:-1]) + 1
+        return ([0] if len(buttons) and buttons[0] else []) + changed.tolist()
+    return [index for index in range(len(buttons)) if buttons[index] != (buttons[index - 1] if index else "")]
+
+# A Session that maps taps from steps worked out ahead of time, instead of from the accelerometer values
+class RenderSession(mncengine.Session):
+    __slots__ = ["steps"]
+
+    def __init__(self, midiOut, chordChannel, bassChannel, voiceChannels=()):
+        mncengine.Session.__init__(self, midiOut, chordChannel, bassChannel, voiceChannels)
+        self.steps = None
+
+    def mapAccelerometerToPitch(self, x, y, z):
+        if self.steps is None:
+            return mncengine.Session.mapAccelerometerToPitch(self, x, y, z)
+        return self.mapStepsToPitch(*self.steps)
+# endregion
+
+# region Rendering
+# The OSC address of a button of the layout in use (mncengine.layout), named by its address, its number on the page,
+# ex: "16" -> "/7/push16" ("h5" from older trajectories is "5"), or what it does, ex: "numeral 1" or "familyDown"
+def buttonAddress(buttonName):
+    buttons = mncengine.layout.buttons
+    if buttonName in buttons:
+        return buttonName
+    number = buttonName[1:] if buttonName.startswith("h") else buttonName
+    if number.isdigit():
+        for address in sorted(buttons):
+            if address.endswith("push" + number):
+                return address
+    else:
+        parts = buttonName.split()
+        button = mncengine.layoutButton([parts[0]] + [int(part) for part in parts[1:]], buttonName)
+        for address in sorted(buttons):
+            if buttons[address] == button:
+                return address
+    raise ValueError("no button " + buttonName + " in the layout " + mncengine.layout.name)
+
+# Play a trajectory, returns [(seconds, MIDI message)] like recorder.replay()
+def render(seconds, x, y, buttons):
+    midiOut = mncengine.MemoryMidiOut()
+    mncengine.connect(midiOut, mncengine.MemoryTimer)
+    mncengine.runningEnvelopes.clear()
+    session = RenderSession(midiOut, 0, 1, mncengine.VOICE_CHANNELS)
+
+    continuous = mncengine.CONTINUOUS_MOTION or mncengine.EXPRESSION
+    mapped = numpy is not None and not continuous
+    if mapped:
+        valid, xSteps, ySteps = mapTrajectory(x, y)
+    changes = buttonChanges(buttons)
+    if mncengine.EXPRESSION: # every sample is played
+        changes = range(len(buttons))
+    elif continuous: # every sample under a held button is played, not only the taps
+        changed = set(changes)
+        changes = [index for index in range(len(buttons)) if buttons[index] or index in changed]
+
+    stream = []
+    envelopeTime = 0.0
+    sampleTime = [0.0]
+    engineClock = mncengine.clock
+    mncengine.clock = lambda: sampleTime[0]
+    try:
+        lastButton = ""
+        for index in changes:
+            now = sampleTime[0] = float(seconds[index])
+            recorder.stepScheduler(now, midiOut, stream)
+            envelopeTime = recorder.stepEnvelopes(envelopeTime, now, midiOut, stream)
+            session.accelerometerValues = [float(x[index]), float(y[index]), 0.0]
+            if continuous:
+                session.parseAccelerometerData(mncengine.MemoryOscMessage(mncengine.layout.accelerometer, session.accelerometerValues))
+            elif mapped:
+                session.steps = (int(xSteps[index]), int(ySteps[index])) if valid[index] else None
+
+            button = buttons[index]
+            if button != lastButton:
+                if lastButton:
+                    session.handleTouchInput(mncengine.MemoryOscMessage(buttonAddress(lastButton), [0.0]))
+                if button:
+                    session.handleTouchInput(mncengine.MemoryOscMessage(buttonAddress(button), [1.0]))
+                lastButton = button
+            recorder.collect(stream, now, midiOut)
+
+        if len(seconds): # let the last release finish
+            recorder.stepScheduler(float(seconds[-1]) + RELEASE_SECONDS, midiOut, stream)
+            recorder.stepEnvelopes(envelopeTime, float(seconds[-1]) + RELEASE_SECONDS, midiOut, stream)
+    finally:
+        mncengine.clock = engineClock
+    return stream
+
+# The same trajectory as OSC events: [(seconds, address, arguments)]
+def trajectoryEvents(seconds, x, y, buttons):
+    events = []
+    lastButton = ""
+    for index in range(len(seconds)):
+        events.append((float(seconds[index]), mncengine.layout.accelerometer, [float(x[index]), float(y[index]), 0.0]))
+        if buttons[index] != lastButton:
+            if lastButton:
+                events.append((float(seconds[index]), buttonAddress(lastButton), [0.0]))
+            if buttons[index]:
+                events.append((float(seconds[index]), buttonAddress(buttons[index]), [1.0]))
+            lastButton = buttons[index]
+    return events
+
+# Play a trajectory one OSC message at a time through a SessionHost, like mnc.py would, returns [(seconds, MIDI message)]
+def renderInteractive(seconds, x, y, buttons):
+    midiOut = mncengine.MemoryMidiOut()
+    mncengine.connect(midiOut, mncengine.MemoryTimer)
+    mncengine.runningEnvelopes.clear()
+    host = mncengine.SessionHost([midiOut])
+
+    stream = []
+    envelopeTime = 0.0
+    eventTime = [0.0]
+    engineClock = mncengine.clock
+    mncengine.clock = lambda: eventTime[0]
+    try:
+        for eventTime[0], address, arguments in trajectoryEvents(seconds, x, y, buttons):
+            recorder.stepScheduler(eventTime[0], midiOut, stream)
+            envelopeTime = recorder.stepEnvelopes(envelopeTime, eventTime[0], midiOut, stream)
+            host.receive("phone", address, arguments)
+            recorder.collect(stream, eventTime[0], midiOut)
+        if len(seconds):
+            recorder.stepScheduler(float(seconds[-1]) + RELEASE_SECONDS, midiOut, stream)
+            recorder.stepEnvelopes(envelopeTime, float(seconds[-1]) + RELEASE_SECONDS, midiOut, stream)
+    finally:
+        mncengine.clock = engineClock
+    return stream
+# endregion
+
+# region Standard MIDI File
+def variableLength(value):
+    encoded = [value & 0x7F]
+    value >>= 7
+    while value:
+        encoded.insert(0, (value & 0x7F) | 0x80)
+        value >>= 7
+    return bytes(bytearray(encoded))
+
+# Write [(seconds, MIDI message)] as a format 0 Standard MIDI File. setVolume() becomes controller 7.
+def writeMidiFile(path, stream, programs=None):
+    if programs is None:
+        programs = dict(PROGRAMS)
+        programs.update((channel, PROGRAMS[0]) for channel in mncengine.VOICE_CHANNELS)
+    ticksPerSecond = TICKS_PER_BEAT * 1000000.0 / TEMPO_US_PER_BEAT
+    track = bytearray()
+    track += b"\x00\xff\x51\x03" + struct.pack(">I", TEMPO_US_PER_BEAT)[1:]
+    for channel in sorted(programs):
+        track += b"\x00" + bytes(bytearray([0xC0 | channel, programs[channel]]))
+
+    lastTick = 0
+    for seconds, message in stream:
+        tick = int(round(seconds * ticksPerSecond))
+        if message[0] == "noteOn":
+            pitch, volume, channel = message[1:]
+            event = [0x90 | channel, pitch, volume]
+        elif message[0] == "noteOff":
+            pitch, channel = message[1:]
+            event = [0x80 | channel, pitch, 0]
+        elif message[0] == "controlChange":
+            controller, value, channel = message[1:]
+            event = [0xB0 | channel, controller, value]
+        else: # setVolume
+            volume, channel = message[1:]
+            event = [0xB0 | channel, 7, volume]
+        track += variableLength(tick - lastTick) + bytes(bytearray(event))
+        lastTick = tick
+    track += b"\x00\xff\x2f\x00"
+
+    with open(path, "wb") as midiFile:
+        midiFile.write(b"MThd" + struct.pack(">IHHH", 6, 0, 1, TICKS_PER_BEAT))
+        midiFile.write(b"MTrk" + struct.pack(">I", len(track)) + bytes(track))
+# endregion
+
+# region Trajectories
+# Read a csv of seconds, x, y, button
+def readTrajectory(path):
+    seconds, x, y, buttons = [], [], [], []
+    with open(path) as csvFile:
+        for row in csv.reader(csvFile):
+            if not row or row[0].startswith("#") or row[0] == "seconds":
+                continue
+            seconds.append(float(row[0]))
+            x.append(float(row[1]))
+            y.append(float(row[2]))
+            buttons.append(row[3].strip() if len(row) > 3 else "")
+    return seconds, x, y, buttons
+
+# A made up performance: slow pours at rate Hz, a chord numeral held for a bar, with the odd family tap
+def demoTrajectory(minutes, rate=100, seed=1):
+    rng = random.Random(seed)
+    numerals = ["numeral " + str(chordNumeral) for chordNumeral in range(1, 9)]
+    modifiers = ["familyDown", "familyAcross", "familyUp", "alternate", "dominant", "offChord"]
+    seconds, x, y, buttons = [], [], [], []
+    button = ""
+    for index in range(int(minutes * 60 * rate)):
+        now = index / float(rate)
+        if index % (2 * rate) == 0:
+            button = rng.choice(numerals) if rng.random() < 0.8 else rng.choice(modifiers)
+        elif index % (2 * rate) == int(1.6 * rate):
+            button = "" # lift the finger before the next chord
+        seconds.append(now)
+        x.append(-0.5 + 0.45 * math.sin(now * 0.9) + rng.gauss(0, 0.01))
+        y.append(-0.5 + 0.45 * math.sin(now * 0.37) + rng.gauss(0, 0.01))
+        buttons.append(button)
+    return seconds, x, y, buttons
+# endregion
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Render gesture trajectories to a Standard MIDI File")
+    parser.add_argument("trajectory", nargs="?", help="csv of seconds, x, y, button")
+    parser.add_argument("out", help="the .mid file to write")
+    parser.add_argument("--demo", type=float, metavar="MINUTES", help="render a made up performance instead")
+    parser.add_argument("--check", action="store_true", help="also play the trajectory as OSC through a SessionHost and compare")
+    parser.add_argument("--layout", help="a controller layout file, instead of TouchOSC LiveControl page 7")
+    options = parser.parse_args()
+    if options.demo is None and options.trajectory is None:
+        parser.error("give a trajectory or --demo")
+    if options.layout:
+        mncengine.useLayout(mncengine.loadLayout(options.layout))
+
+    mncengine.precomputeVoicings()
+    trajectory = demoTrajectory(options.demo) if options.demo is not None else readTrajectory(options.trajectory)
+    if numpy is not None:
+        trajectory = (numpy.asarray(trajectory[0]), numpy.asarray(trajectory[1]), numpy.asarray(trajectory[2]), trajectory[3])
+
+    start = time.time()
+    stream = render(*trajectory)
+    elapsed = time.time() - start
+    writeMidiFile(options.out, stream)
+    print("%d samples, %d MIDI messages in %.3f s%s" % (len(trajectory[0]), len(stream), elapsed, "" if numpy is not None else " (without NumPy)"))
+
+    if options.check:
+        start = time.time()
+        interactive = renderInteractive(*trajectory)
+        print("interactive path in %.3f s, %s" % (time.time() - start, "same MIDI" if interactive == stream else "DIFFERENT MIDI"))
+        sys.exit(0 if interactive == stream else 1)
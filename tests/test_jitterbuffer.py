@@ -0,0 +1,84 @@
+# tests/test_jitterbuffer.py
+# Movements, Not Chords by Trevor Ritchie
+#
+# The jitter buffer of oscserver.py plays timetagged messages a steady delay after they were sent,
+# in the order they were sent, and grows when a message comes later than it covers.
+#
+# Run from the repository folder: python -m pytest tests
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import oscserver
+
+SENDER = ("192.168.1.20", 9000)
+PHONE_CLOCK = 1000.0 # the phone's clock is far from the server's, only the differences count
+NETWORK = 0.005 # the fastest a message gets to the server
+
+class JitterClockTest(unittest.TestCase):
+    # Steady messages play the minimum buffer after they arrive
+    def testPlayoutDelay(self):
+        jitterClock = oscserver.JitterClock()
+        for step in range(32):
+            sentAt = PHONE_CLOCK + step * 0.02
+            playAt, late = jitterClock.update(sentAt, sentAt - PHONE_CLOCK + NETWORK)
+            self.assertFalse(late)
+            self.assertAlmostEqual(playAt - (sentAt - PHONE_CLOCK + NETWORK), oscserver.MIN_BUFFER_SECONDS)
+
+    # A message later than the buffer covers plays as it arrives, and the buffer grows to cover the next one
+    def testLateMessage(self):
+        jitterClock = oscserver.JitterClock()
+        for step in range(10):
+            jitterClock.update(PHONE_CLOCK + step * 0.02, step * 0.02 + NETWORK)
+        sentAt = PHONE_CLOCK + 0.2
+        playAt, late = jitterClock.update(sentAt, 0.2 + NETWORK + 0.03)
+        self.assertTrue(late)
+        self.assertAlmostEqual(playAt, 0.2 + NETWORK + 0.03)
+        self.assertAlmostEqual(jitterClock.depth, 0.03)
+        playAt, late = jitterClock.update(sentAt + 0.02, 0.22 + NETWORK + 0.02)
+        self.assertFalse(late)
+        self.assertAlmostEqual(playAt, 0.22 + NETWORK + 0.03)
+
+    # The buffer never waits longer than MAX_BUFFER_SECONDS, and shrinks back once the jitter is gone
+    def testDepthLimits(self):
+        jitterClock = oscserver.JitterClock()
+        jitterClock.update(PHONE_CLOCK, NETWORK)
+        jitterClock.update(PHONE_CLOCK + 0.02, 0.02 + NETWORK + 1.0)
+        self.assertEqual(jitterClock.depth, oscserver.MAX_BUFFER_SECONDS)
+        for step in range(2, 16 * 300):
+            jitterClock.update(PHONE_CLOCK + step * 0.02, step * 0.02 + NETWORK)
+            self.assertLessEqual(jitterClock.depth, oscserver.MAX_BUFFER_SECONDS)
+        self.assertEqual(jitterClock.depth, oscserver.MIN_BUFFER_SECONDS)
+
+class JitterBufferTest(unittest.TestCase):
+    # Messages that arrive out of order within the buffer come out in the order they were sent, once they are due
+    def testReordered(self):
+        jitterBuffer = oscserver.JitterBuffer()
+        jitterBuffer.push(SENDER, PHONE_CLOCK, "/accxyz", [0.0, 0.0, 0.0], NETWORK)
+        jitterBuffer.push(SENDER, PHONE_CLOCK + 0.02, "/accxyz", [0.1, 0.0, 0.0], 0.02 + NETWORK + 0.03) # late, 30 ms buffer
+        self.assertEqual(len(jitterBuffer.due(1.0)), 2)
+        jitterBuffer.push(SENDER, PHONE_CLOCK + 0.06, "/7/push12", [1.0], 0.06 + NETWORK)
+        jitterBuffer.push(SENDER, PHONE_CLOCK + 0.05, "/7/push16", [1.0], 0.06 + NETWORK + 0.001)
+        self.assertEqual(jitterBuffer.due(0.06 + NETWORK + 0.001), [])
+        self.assertAlmostEqual(jitterBuffer.nextAt(), 0.05 + NETWORK + 0.03)
+        self.assertEqual([message[1] for message in jitterBuffer.due(0.05 + NETWORK + 0.03)], ["/7/push16"])
+        self.assertEqual([message[1] for message in jitterBuffer.due(1.0)], ["/7/push12"])
+        self.assertEqual(jitterBuffer.nextAt(), None)
+        self.assertEqual(jitterBuffer.lateMessages, 1)
+
+    # Late messages are counted, each phone has a clock of its own
+    def testLateMessagesPerPhone(self):
+        jitterBuffer = oscserver.JitterBuffer()
+        otherSender = ("192.168.1.21", 9000)
+        for step in range(4):
+            jitterBuffer.push(SENDER, PHONE_CLOCK + step * 0.02, "/accxyz", [0.0, 0.0, 0.0], step * 0.02 + NETWORK)
+            jitterBuffer.push(otherSender, 5.0 + step * 0.02, "/accxyz", [0.0, 0.0, 0.0], step * 0.02 + NETWORK)
+        jitterBuffer.push(SENDER, PHONE_CLOCK + 0.08, "/7/push16", [1.0], 0.08 + NETWORK + 0.05)
+        self.assertEqual((jitterBuffer.timedMessages, jitterBuffer.lateMessages), (9, 1))
+        self.assertAlmostEqual(jitterBuffer.depth(), 0.05)
+        self.assertEqual(jitterBuffer.clocks[otherSender].depth, oscserver.MIN_BUFFER_SECONDS)
+
+if __name__ == "__main__":
+    unittest.main()
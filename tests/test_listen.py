@@ -0,0 +1,51 @@
+# tests/test_listen.py
+# Movements, Not Chords by Trevor Ritchie
+#
+# listen() registers one handler with an OscIn and looks the address up in the layout.
+#
+# Run from the repository folder: python -m pytest tests
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import mncengine
+
+class ListenTest(unittest.TestCase):
+    def setUp(self):
+        mncengine.configure(VOICE_CHANNELS=[])
+        mncengine.connect(mncengine.MemoryMidiOut(), mncengine.MemoryTimer)
+        mncengine.runningEnvelopes.clear()
+
+    # "/7/push1" is registered too, but a tap on "/7/push16" only reaches the session once
+    def testButtonHandledOnce(self):
+        oscIn = mncengine.MemoryOscIn()
+        session = mncengine.listen(oscIn)
+        oscIn.receive("/accxyz", [-0.45, -0.5, 0.0])
+        oscIn.receive("/7/push16", [1.0])
+        self.assertEqual(session.buttonsHeld, 1)
+
+    # One pattern for every message, the address is looked up in the layout
+    def testOneHandler(self):
+        oscIn = mncengine.MemoryOscIn()
+        session = mncengine.listen(oscIn)
+        self.assertEqual(len(oscIn.handlers), 1)
+        oscIn.receive("/mnc/key", [2, "minor"])
+        self.assertEqual((session.harmony.keyOffset, session.harmony.mode), (2, "minor"))
+        oscIn.receive("/not/a/button", [1.0])
+        self.assertEqual(session.buttonsHeld, 0)
+
+    # Statistics are only answered with an oscOut
+    def testStats(self):
+        sent = []
+        class OscOut(object):
+            def sendMessage(self, address, *arguments):
+                sent.append(address)
+        oscIn = mncengine.MemoryOscIn()
+        mncengine.listen(oscIn, oscOut=OscOut())
+        oscIn.receive(mncengine.STATS_ADDRESS, [])
+        self.assertTrue(sent)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+# tests/test_motionfilter.py
+# Movements, Not Chords by Trevor Ritchie
+#
+# Continuous motion smooths the tilt with a one euro filter, and only changes a scale degree
+# once the tilt goes MOTION_HYSTERESIS past the edge of its step.
+#
+# Run from the repository folder: python -m pytest tests
+
+import math
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import mncengine
+
+RATE = 100.0 # accelerometer messages per second
+
+class OneEuroFilterTest(unittest.TestCase):
+    # The first value passes through, and a value that doesn't change stays put
+    def testSteady(self):
+        motionFilter = mncengine.OneEuroFilter(1.0, 0.5)
+        for step in range(50):
+            self.assertEqual(motionFilter.filter(-0.4, step / RATE), -0.4)
+
+    # With beta 0 the filter is a low pass at minCutoff, each step moving smoothingFactor() of the way
+    def testLowPass(self):
+        motionFilter = mncengine.OneEuroFilter(1.0, 0.0)
+        motionFilter.filter(0.0, 0.0)
+        alpha = 1.0 / (1.0 + RATE / (2 * math.pi))
+        self.assertAlmostEqual(mncengine.smoothingFactor(RATE, 1.0), alpha)
+        self.assertAlmostEqual(motionFilter.filter(1.0, 1 / RATE), alpha)
+        self.assertAlmostEqual(motionFilter.filter(1.0, 2 / RATE), alpha + (1 - alpha) * alpha)
+
+    # A jump is followed without overshoot, and faster the higher beta is
+    def testJump(self):
+        slow = mncengine.OneEuroFilter(1.0, 0.0)
+        fast = mncengine.OneEuroFilter(1.0, 5.0)
+        slow.filter(0.0, 0.0)
+        fast.filter(0.0, 0.0)
+        lastSlow = lastFast = 0.0
+        for step in range(1, 20):
+            valueSlow = slow.filter(-1.0, step / RATE)
+            valueFast = fast.filter(-1.0, step / RATE)
+            self.assertTrue(-1.0 <= valueSlow < lastSlow)
+            self.assertTrue(-1.0 <= valueFast < lastFast)
+            self.assertLess(valueFast, valueSlow)
+            lastSlow, lastFast = valueSlow, valueFast
+
+    # A message with the same or an earlier timestamp doesn't move the filter, reset() starts it again
+    def testTimestamps(self):
+        motionFilter = mncengine.OneEuroFilter(1.0, 0.5)
+        motionFilter.filter(0.0, 1.0)
+        self.assertEqual(motionFilter.filter(-1.0, 1.0), 0.0)
+        self.assertEqual(motionFilter.filter(-1.0, 0.5), 0.0)
+        motionFilter.reset(-0.5, 2.0)
+        self.assertEqual(motionFilter.value, -0.5)
+        self.assertEqual(motionFilter.derivative, 0.0)
+        self.assertLess(motionFilter.filter(-1.0, 2.01), -0.5)
+
+class HysteresisTest(unittest.TestCase):
+    # From step 3 with a quarter step band, the step changes past 4.25 and below 2.75
+    def testThresholds(self):
+        self.assertEqual(hysteresisSteps([3.5, 4.2, 3.9, 2.8, 2.75], 3, 0.25), [3, 3, 3, 3, 3])
+        self.assertEqual(mncengine.hysteresisStep(4.25, 3, 0.25), 4)
+        self.assertEqual(mncengine.hysteresisStep(2.74, 3, 0.25), 2)
+        self.assertEqual(mncengine.hysteresisStep(7.1, 3, 0.25), 7) # big moves go straight to their step
+
+    # Wobbling around an edge doesn't flip between steps, once the band is crossed it doesn't flip back
+    def testWobble(self):
+        self.assertEqual(hysteresisSteps([3.9, 4.1, 3.95, 4.2, 4.3, 3.9, 3.8, 4.1], 3, 0.25), [3, 3, 3, 3, 4, 4, 4, 4])
+
+    # With no band the step is where the tilt is
+    def testNoBand(self):
+        self.assertEqual(hysteresisSteps([3.9, 4.0, 3.99, 2.5], 3, 0.0), [3, 4, 3, 2])
+
+# The step after each position, starting from lastStep
+def hysteresisSteps(positions, lastStep, band):
+    steps = []
+    for position in positions:
+        lastStep = mncengine.hysteresisStep(position, lastStep, band)
+        steps.append(lastStep)
+    return steps
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+# tests/test_oscserver.py
+# Movements, Not Chords by Trevor Ritchie
+#
+# A bad OSC message is dropped without stopping the messages after it.
+#
+# Run from the repository folder: python -m pytest tests
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import mncengine
+import oscserver
+
+SENDER = ("192.168.1.20", 9000)
+
+class MalformedMessageTest(unittest.TestCase):
+    def setUp(self):
+        mncengine.configure(VOICE_CHANNELS=[])
+        self.midiOut = mncengine.MemoryMidiOut()
+        mncengine.connect(self.midiOut, mncengine.MemoryTimer)
+        mncengine.runningEnvelopes.clear()
+        self.host = mncengine.SessionHost([self.midiOut])
+
+    def noteOns(self):
+        return [message for message in self.midiOut.messages if message[0] == "noteOn"]
+
+    # A button without arguments and a tilt that isn't numbers, then a good tap
+    def testBadArgumentsThenGoodTap(self):
+        server = oscserver.OscServer(self.host.receive)
+        server.enqueue(SENDER, "/7/push16", [])
+        server.enqueue(SENDER, "/accxyz", ["x", "y"])
+        server.drain()
+        server.enqueue(SENDER, "/accxyz", [-0.45, -0.5, 0.0])
+        server.enqueue(SENDER, "/7/push16", [1.0])
+        server.drain()
+        self.assertTrue(self.noteOns())
+
+    # A message whose handler raises is counted, and the next one still plays
+    def testHandlerRaisesThenGoodTap(self):
+        def receive(sender, address, arguments, receivedAt=None):
+            if address == "/broken":
+                raise RuntimeError("broken handler")
+            self.host.receive(sender, address, arguments, receivedAt)
+        server = oscserver.OscServer(receive)
+        server.enqueue(SENDER, "/accxyz", [-0.45, -0.5, 0.0])
+        server.enqueue(SENDER, "/broken", [1.0])
+        server.enqueue(SENDER, "/7/push16", [1.0])
+        server.drain()
+        self.assertEqual(server.stats()["malformedMessages"], 1)
+        self.assertTrue(self.noteOns())
+
+if __name__ == "__main__":
+    unittest.main()
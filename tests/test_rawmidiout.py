@@ -0,0 +1,92 @@
+# tests/test_rawmidiout.py
+# Movements, Not Chords by Trevor Ritchie
+#
+# RawMidiOut writes MIDI bytes with running status, one write per chord change,
+# and every write starts with a status byte.
+#
+# Run from the repository folder: python -m pytest tests
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import mncengine
+
+# A port that keeps every write apart
+class WritesPort(object):
+    def __init__(self):
+        self.writes = []
+
+    def write(self, data):
+        self.writes.append(bytearray(data))
+
+class RawMidiOutTest(unittest.TestCase):
+    def setUp(self):
+        self.port = WritesPort()
+        self.midiOut = mncengine.RawMidiOut(self.port)
+
+    # Outside a batch every message is written whole, status byte and all
+    def testUnbatchedBytes(self):
+        self.midiOut.noteOn(60, 100, 0)
+        self.midiOut.noteOn(64, 90, 0)
+        self.midiOut.noteOff(60, 0)
+        self.midiOut.setVolume(80, 1)
+        self.midiOut.controlChange(74, 5, 15)
+        self.midiOut.setInstrument(19, 2)
+        self.assertEqual(self.port.writes, [bytearray([0x90, 60, 100]), bytearray([0x90, 64, 90]), bytearray([0x90, 60, 0]),
+                                            bytearray([0xB1, 7, 80]), bytearray([0xBF, 74, 5]), bytearray([0xC2, 19])])
+
+    # A batch is one write, sending each status byte once while it doesn't change
+    def testRunningStatus(self):
+        self.midiOut.startBatch()
+        self.midiOut.noteOff(60, 0) # noteOff is noteOn with velocity 0, so it shares the status
+        self.midiOut.noteOn(62, 127, 0)
+        self.midiOut.noteOn(67, 127, 0)
+        self.midiOut.noteOff(43, 1)
+        self.midiOut.noteOn(45, 100, 1)
+        self.midiOut.setVolume(127, 0)
+        self.midiOut.noteOn(72, 127, 0)
+        self.assertEqual(self.port.writes, [])
+        self.midiOut.sendBatch()
+        self.assertEqual(self.port.writes, [bytearray([0x90, 60, 0, 62, 127, 67, 127, 0x91, 43, 0, 45, 100,
+                                                       0xB0, 7, 127, 0x90, 72, 127])])
+
+    # A program change breaks running status, and an empty batch writes nothing
+    def testProgramChangeInBatch(self):
+        self.midiOut.startBatch()
+        self.midiOut.noteOn(60, 100, 0)
+        self.midiOut.setInstrument(0, 0)
+        self.midiOut.noteOn(64, 100, 0)
+        self.midiOut.sendBatch()
+        self.midiOut.startBatch()
+        self.midiOut.sendBatch()
+        self.assertEqual(self.port.writes, [bytearray([0x90, 60, 100, 0xC0, 0, 0x90, 64, 100])])
+
+    # The next write starts with its status byte again
+    def testStatusAfterWrite(self):
+        self.midiOut.startBatch()
+        self.midiOut.noteOn(60, 100, 0)
+        self.midiOut.sendBatch()
+        self.midiOut.startBatch()
+        self.midiOut.noteOn(64, 100, 0)
+        self.midiOut.sendBatch()
+        self.assertEqual(self.port.writes, [bytearray([0x90, 60, 100]), bytearray([0x90, 64, 100])])
+
+    # A chord change through a session is one write
+    def testOneWritePerChordChange(self):
+        mncengine.configure(VOICE_CHANNELS=[], STRUM_MS=0, ARPEGGIO=None)
+        mncengine.connect(self.midiOut, mncengine.MemoryTimer)
+        session = mncengine.Session(self.midiOut, 0, 1)
+        oscIn = mncengine.MemoryOscIn()
+        mncengine.listen(oscIn, session=session)
+        oscIn.receive("/accxyz", [-0.45, -0.5, 0.0])
+        for address in ["/7/push16", "/7/push12", "/7/push8"]:
+            writes = len(self.port.writes)
+            oscIn.receive(address, [1.0])
+            self.assertEqual(len(self.port.writes), writes + 1)
+            self.assertTrue(self.port.writes[-1][0] & 0x80)
+            oscIn.receive(address, [0.0])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+# tests/test_recorder.py
+# Movements, Not Chords by Trevor Ritchie
+#
+# Recording never makes the instrument less robust, and a recording replays to the MIDI played live.
+#
+# Run from the repository folder: python -m pytest tests
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import mncengine
+import recorder
+
+MALFORMED = [("/7/push16", []), ("/7/push16", ["on"]), ("/accxyz", []), ("/accxyz", [0.1, "y", 0.0]),
+             ("/mnc/key", []), ("/mnc/key", ["D"]), ("/mnc/key", [2, "dorian"])]
+
+def noteMessages(messages):
+    return [message for message in messages if message[0] in ("noteOn", "noteOff")]
+
+class RecorderTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, "performance.mncr")
+        self.midiOut = mncengine.MemoryMidiOut()
+        mncengine.connect(self.midiOut, mncengine.MemoryTimer)
+        mncengine.runningEnvelopes.clear()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    # Malformed messages reach listen()'s recording wrapper before the session, and are skipped instead of raising
+    def testMalformedThenGood(self):
+        performanceRecorder = recorder.Recorder(self.path)
+        oscIn = mncengine.MemoryOscIn()
+        mncengine.listen(oscIn, performanceRecorder)
+        for address, arguments in MALFORMED:
+            oscIn.receive(address, arguments)
+        oscIn.receive("/accxyz", [-0.45, -0.5, 0.0])
+        oscIn.receive("/7/push16", [1.0])
+        oscIn.receive("/7/push16", [0.0])
+        performanceRecorder.close()
+
+        self.assertEqual(performanceRecorder.skipped, len(MALFORMED))
+        self.assertEqual(len(recorder.readRecords(self.path)), 3)
+        live = noteMessages(self.midiOut.messages)
+        self.assertTrue(live)
+        self.assertEqual(noteMessages(message for seconds, message in recorder.replay(self.path)), live)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+# tests/test_scheduler.py
+# Movements, Not Chords by Trevor Ritchie
+#
+# A scheduled event that raises doesn't stop the events after it, and a cancelled arpeggio plays no more notes.
+#
+# Run from the repository folder: python -m pytest tests
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import mncengine
+
+class SchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.settings = mncengine.currentSettings()
+        self.connected = (mncengine.midiOut, mncengine.envelopeTimer, mncengine.scheduler)
+        self.midiOut = mncengine.MemoryMidiOut()
+        mncengine.connect(self.midiOut, mncengine.MemoryTimer)
+        self.session = mncengine.Session(self.midiOut, 0, 1)
+
+    def tearDown(self):
+        mncengine.configure(**self.settings)
+        mncengine.midiOut, mncengine.envelopeTimer, mncengine.scheduler = self.connected
+
+    def testFailingEventThenNext(self):
+        played = []
+        def fail():
+            raise RuntimeError("broken event")
+        mncengine.scheduler.schedule(1.0, self.session, fail, ())
+        mncengine.scheduler.schedule(2.0, self.session, played.append, (2.0,))
+        mncengine.scheduler.runDue(3.0)
+        self.assertEqual(mncengine.scheduler.failed, 1)
+        self.assertEqual(played, [2.0])
+
+    # Letting go of the chord cancels its arpeggio, and the steps already scheduled play nothing
+    def testCancelledArpeggioStep(self):
+        mncengine.configure(ARPEGGIO="up", BASS=False)
+        oscIn = mncengine.MemoryOscIn()
+        mncengine.listen(oscIn, session=self.session)
+        oscIn.receive("/accxyz", [-0.45, -0.5, 0.0])
+        oscIn.receive("/7/push16", [1.0])
+        stepSeconds = 60.0 / mncengine.ARPEGGIO_BPM / mncengine.ARPEGGIO_STEPS_PER_BEAT
+        mncengine.scheduler.runDue(mncengine.clock() + 3 * stepSeconds)
+        noteOns = [message for message in self.midiOut.messages if message[0] == "noteOn"]
+        self.assertTrue(len(noteOns) >= 3) # the arpeggio was playing
+
+        oscIn.receive("/7/push16", [0.0])
+        self.assertTrue(mncengine.scheduler.nextAt() is not None) # its next step is still waiting
+        cancelledAt = len(self.midiOut.messages)
+        mncengine.scheduler.runDue(mncengine.clock() + 100 * stepSeconds)
+        self.assertEqual([message for message in self.midiOut.messages[cancelledAt:] if message[0] == "noteOn"], [])
+        self.assertEqual(mncengine.scheduler.cancelled, 1)
+        self.assertEqual(mncengine.scheduler.nextAt(), None)
+
+if __name__ == "__main__":
+    unittest.main()
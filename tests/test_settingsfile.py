@@ -0,0 +1,88 @@
+# tests/test_settingsfile.py
+# Movements, Not Chords by Trevor Ritchie
+#
+# SettingsFile reads a settings file again only when it is saved, skips a file it can't read,
+# and hands its values to the engine in the types the engine uses.
+#
+# Run from the repository folder: python -m pytest tests
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import mncengine
+
+class SettingsFileTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, "settings.json")
+        self.settingsFile = mncengine.SettingsFile(self.path)
+        self.savedAt = 1000000000
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    # Write the file with a new modification time, like saving it
+    def save(self, text):
+        with open(self.path, "w") as settingsFile:
+            settingsFile.write(text)
+        self.savedAt += 10
+        os.utime(self.path, (self.savedAt, self.savedAt))
+
+    def testNoFile(self):
+        self.assertEqual(self.settingsFile.changes(), {})
+
+    def testOnlyReadWhenSaved(self):
+        self.save(json.dumps({"BASS": False}))
+        self.assertEqual(self.settingsFile.changes(), {"BASS": False})
+        self.assertEqual(self.settingsFile.changes(), {})
+
+    def testOnlyChangedSettings(self):
+        self.save(json.dumps({"BASS": False, "TRANSPOSE_KEY_SEMITONES": 2}))
+        self.settingsFile.changes()
+        self.save(json.dumps({"BASS": False, "TRANSPOSE_KEY_SEMITONES": 5}))
+        self.assertEqual(self.settingsFile.changes(), {"TRANSPOSE_KEY_SEMITONES": 5})
+
+    # A file saved half way is skipped, and read once it is saved whole
+    def testBadFile(self):
+        self.save('{"BASS": fal')
+        self.assertEqual(self.settingsFile.changes(), {})
+        self.save("[1, 2]")
+        self.assertEqual(self.settingsFile.changes(), {})
+        self.save(json.dumps({"BASS": False}))
+        self.assertEqual(self.settingsFile.changes(), {"BASS": False})
+
+    # Lists become tuples, channel keys become ints, strings become str
+    def testJsonTypes(self):
+        self.save(json.dumps({"ENVELOPES": {"1": [0, 0, 127, 200]}, "KEY_MODE": "minor"}))
+        changes = self.settingsFile.changes()
+        self.assertEqual(changes["ENVELOPES"], {1: (0, 0, 127, 200)})
+        self.assertTrue(isinstance(changes["KEY_MODE"], str))
+
+    # A dict setting only changes the keys in the file
+    def testDictMerge(self):
+        envelopes = mncengine.ENVELOPES
+        try:
+            self.save(json.dumps({"ENVELOPES": {"1": [0, 0, 127, 200]}}))
+            mncengine.configure(**self.settingsFile.changes())
+            self.assertEqual(mncengine.ENVELOPES, {0: envelopes[0], 1: (0, 0, 127, 200)})
+            self.assertEqual(sorted(mncengine.envelopeTables), [0, 1])
+        finally:
+            mncengine.useSettings({"ENVELOPES": envelopes})
+
+    # MIDI_PORT from the file opens as a path, and MIDI goes out through it
+    def testMidiPort(self):
+        portPath = os.path.join(self.folder, "midi")
+        self.save(json.dumps({"MIDI_PORT": portPath}))
+        midiOut = mncengine.RawMidiOut(self.settingsFile.changes()["MIDI_PORT"])
+        midiOut.noteOn(60, 100, 0)
+        midiOut.close()
+        with open(portPath, "rb") as port:
+            self.assertEqual(bytearray(port.read()), bytearray([0x90, 60, 100]))
+
+if __name__ == "__main__":
+    unittest.main()
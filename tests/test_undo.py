@@ -0,0 +1,87 @@
+# tests/test_undo.py
+# Movements, Not Chords by Trevor Ritchie
+#
+# The undo button of the LiveControl page and scene buttons, tapped through listen().
+#
+# Run from the repository folder: python -m pytest tests
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import mncengine
+
+UNDO = "/7/push1"
+NUMERAL_1 = "/7/push16"
+NUMERAL_2 = "/7/push12"
+DOMINANT = "/7/push2"
+SCENE = "/scene/1"
+
+class UndoTest(unittest.TestCase):
+    def setUp(self):
+        mncengine.configure(VOICE_CHANNELS=[])
+        mncengine.connect(mncengine.MemoryMidiOut(), mncengine.MemoryTimer)
+        mncengine.runningEnvelopes.clear()
+        self.layout = mncengine.layout
+        self.oscIn = mncengine.MemoryOscIn()
+        self.session = mncengine.listen(self.oscIn)
+        self.oscIn.receive("/accxyz", [-0.45, -0.5, 0.0])
+
+    def tearDown(self):
+        mncengine.useLayout(self.layout)
+
+    def tap(self, address):
+        self.oscIn.receive(address, [1.0])
+        self.oscIn.receive(address, [0.0])
+
+    def testUndoIsTheSpareButton(self):
+        self.assertEqual(mncengine.layout.buttons[UNDO][0], mncengine.Session.undo)
+
+    def testUndo(self):
+        self.tap(NUMERAL_1)
+        first = self.session.state
+        self.tap(NUMERAL_2)
+        self.assertNotEqual(self.session.state, first)
+        self.tap(UNDO)
+        self.assertEqual(self.session.state, first)
+        self.assertEqual(self.session.buttonsHeld, 0)
+
+    # Undo with nothing to go back to leaves the state alone
+    def testUndoEmptyHistory(self):
+        state = self.session.state
+        self.session.history.clear()
+        self.tap(UNDO)
+        self.assertEqual(self.session.state, state)
+        self.assertEqual(len(self.session.history), 0)
+
+    # Hold a button and press the scene button to save, press it alone to go back, and undo the recall
+    def testSceneRecall(self):
+        buttons = dict(mncengine.TOUCHOSC_LIVECONTROL["buttons"])
+        buttons[SCENE] = ["scene", 1]
+        mncengine.useLayout(mncengine.Layout({"buttons": buttons}))
+
+        self.oscIn.receive(NUMERAL_2, [1.0])
+        self.tap(DOMINANT) # numeral 2 made dominant, still held
+        saved = self.session.state
+        self.tap(SCENE)
+        self.oscIn.receive(NUMERAL_2, [0.0])
+        self.assertEqual(self.session.scenes[1], saved)
+
+        self.tap(NUMERAL_1)
+        changed = self.session.state
+        self.assertNotEqual(changed, saved)
+        self.tap(SCENE)
+        self.assertEqual(self.session.state, saved)
+        self.tap(UNDO)
+        self.assertEqual(self.session.state, changed)
+
+    # A scene that was never saved does nothing
+    def testUnsavedScene(self):
+        mncengine.useLayout(mncengine.Layout({"buttons": {SCENE: ["scene", 2]}}))
+        state = self.session.state
+        self.tap(SCENE)
+        self.assertEqual(self.session.state, state)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+# tests/test_voicechannels.py
+# Movements, Not Chords by Trevor Ritchie
+#
+# VoiceAllocator hands out channels in pool order, steals the oldest voice when the pool runs out and reuses released channels.
+# A VOICE_CHANNELS pool smaller than a chord steals voices without breaking the chord changes after it.
+#
+# Run from the repository folder: python -m pytest tests
+
+import io
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import mncengine
+
+NUMERALS = ["/7/push16", "/7/push12", "/7/push8", "/7/push4"]
+
+class AllocatorTest(unittest.TestCase):
+    def testPoolOrder(self):
+        allocator = mncengine.VoiceAllocator([2, 3, 4])
+        self.assertEqual([allocator.allocate(pitch) for pitch in [60, 64, 67]], [(2, None), (3, None), (4, None)])
+        self.assertEqual([allocator.channelOf(pitch) for pitch in [60, 64, 67, 72]], [2, 3, 4, None])
+
+    # A short pool takes the channel of the oldest sounding voice
+    def testStealOldest(self):
+        allocator = mncengine.VoiceAllocator([2, 3])
+        allocator.allocate(60)
+        allocator.allocate(64)
+        self.assertEqual(allocator.allocate(67), (2, 60))
+        self.assertEqual(allocator.allocate(72), (3, 64))
+        self.assertEqual(allocator.steals, 2)
+        self.assertEqual(allocator.channelOf(60), None)
+        self.assertEqual(allocator.release(60), None) # its channel was taken, 67 keeps it
+        self.assertEqual(allocator.channelOf(67), 2)
+
+    # A released channel goes to the back of the free channels, and is reused once they are taken
+    def testReleaseAndReuse(self):
+        allocator = mncengine.VoiceAllocator([2, 3, 4])
+        allocator.allocate(60)
+        allocator.allocate(64)
+        self.assertEqual(allocator.release(60), 2)
+        self.assertEqual(allocator.allocate(67), (4, None))
+        self.assertEqual(allocator.allocate(72), (2, None))
+        self.assertEqual(allocator.steals, 0)
+        self.assertEqual(allocator.allocate(76), (3, 64))
+
+    def testBadChannel(self):
+        self.assertRaises(ValueError, mncengine.VoiceAllocator, [2, 16])
+
+class StealingTest(unittest.TestCase):
+    def tearDown(self):
+        mncengine.configure(VOICE_CHANNELS=[])
+
+    # Common tones of stolen voices aren't restruck, and every chord change is sent
+    def testShortPool(self):
+        mncengine.configure(VOICE_CHANNELS=[2, 3])
+        port = io.BytesIO()
+        midiOut = mncengine.RawMidiOut(port)
+        mncengine.connect(midiOut, mncengine.MemoryTimer)
+        host = mncengine.SessionHost([midiOut])
+        for tap in range(40):
+            host.receive(1, "/accxyz", [-0.1 * (tap % 9), -0.1 * (tap % 5), 0.0])
+            host.receive(1, NUMERALS[tap % 4], [1.0])
+            host.receive(1, NUMERALS[tap % 4], [0.0])
+        self.assertFalse(midiOut.batching)
+        self.assertTrue(host.sessions[1].voiceAllocator.steals > 0)
+        self.assertTrue(port.getvalue())
+
+    # A chord of four voices on two channels: the two newest voices sound, each alone on its channel
+    def testChordOnShortPool(self):
+        mncengine.configure(VOICE_CHANNELS=[2, 3], STRUM_MS=0)
+        midiOut = mncengine.MemoryMidiOut()
+        mncengine.connect(midiOut, mncengine.MemoryTimer)
+        session = mncengine.Session(midiOut, 0, 1, [2, 3])
+        session.playChord((60, 64, 67, 72))
+        sounding = {}
+        for message in midiOut.messages:
+            if message[0] == "noteOn" and message[2] > 0:
+                sounding[message[3]] = message[1]
+            elif message[0] == "noteOff" and sounding.get(message[2]) == message[1]:
+                del sounding[message[2]]
+        self.assertEqual(sounding, {2: 67, 3: 72})
+        self.assertEqual(session.voiceAllocator.steals, 2)
+
+if __name__ == "__main__":
+    unittest.main()
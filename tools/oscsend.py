@@ -0,0 +1,99 @@
+# tools/oscsend.py
+# Movements, Not Chords by Trevor Ritchie
+#
+# Pretends to be a phone running TouchOSC: sends /accxyz at a steady rate, sweeping the tilt,
+# and taps chord numeral buttons on the /7/push addresses. Used to test oscserver.py locally.
+# With --jitter, every datagram is held back a random time like on venue Wi-Fi,
+# and --bundle timetags them with when they should have been sent, for oscserver.py --jitter-buffer.
+# Run from the repository folder: python tools/oscsend.py --rate 200 --taps 4 --seconds 10 [--bundle] [--jitter 20]
+
+import argparse
+import heapq
+import itertools
+import math
+import os
+import random
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from oscserver import encodeBundle, encodeMessage, OSC_LISTENER_PORT
+
+CHORD_NUMERAL_BUTTONS = ["16", "12", "8", "4", "15", "11", "7", "3"]
+
+# Random network delays: mostly short ones averaging jitter seconds, and now and then a stall of stallSeconds
+# where everything sent is held until it ends, then arrives in a burst
+class Jitter(object):
+    def __init__(self, rng, jitter, burstChance, stallSeconds):
+        self.rng = rng
+        self.jitter = jitter
+        self.burstChance = burstChance
+        self.stallSeconds = stallSeconds
+        self.stallUntil = 0.0
+
+    # How long a datagram sent at now is delayed
+    def delay(self, now):
+        if self.burstChance and now >= self.stallUntil and self.rng.random() < self.burstChance:
+            self.stallUntil = now + self.stallSeconds
+        delay = self.rng.expovariate(1.0 / self.jitter) if self.jitter else 0.0
+        return max(delay, self.stallUntil - now)
+
+def main():
+    parser = argparse.ArgumentParser(description="Send TouchOSC style messages over UDP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=OSC_LISTENER_PORT)
+    parser.add_argument("--rate", type=float, default=100.0, help="/accxyz messages per second")
+    parser.add_argument("--taps", type=float, default=2.0, help="button taps per second")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--bundle", action="store_true", help="send every message in a bundle timetagged with when it was meant to be sent")
+    parser.add_argument("--jitter", type=float, default=0.0, help="mean extra delay of each datagram in ms")
+    parser.add_argument("--burst", type=float, default=0.0, help="chance per datagram of a stall, 0.01 = 1%%")
+    parser.add_argument("--stall", type=float, default=100.0, help="how long a stall holds datagrams back in ms")
+    options = parser.parse_args()
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    target = (options.host, options.port)
+    rng = random.Random(0)
+    jitter = Jitter(rng, options.jitter / 1000.0, options.burst, options.stall / 1000.0)
+
+    start = time.time()
+    nextTap = start
+    outgoing = [] # heap of (send time, order, datagram)
+    order = itertools.count()
+    def send(now, address, arguments):
+        datagram = encodeMessage(address, arguments)
+        if options.bundle:
+            datagram = encodeBundle(now, [datagram])
+        heapq.heappush(outgoing, (now + jitter.delay(now), next(order), datagram))
+
+    sent = 0
+    for tick in range(int(options.rate * options.seconds)):
+        now = start + tick / options.rate
+        while outgoing and outgoing[0][0] < now:
+            sendAt, sequence, datagram = heapq.heappop(outgoing)
+            time.sleep(max(0.0, sendAt - time.time()))
+            sock.sendto(datagram, target)
+            sent += 1
+        time.sleep(max(0.0, now - time.time()))
+
+        # pour the water slowly off the left edge and back, while tilting toward the chest and back
+        x = -0.5 - 0.45 * math.sin(now * 0.7)
+        y = -0.5 - 0.45 * math.sin(now * 0.3)
+        send(now, "/accxyz", [x, y, 0.0])
+
+        if options.taps > 0 and now >= nextTap:
+            button = rng.choice(CHORD_NUMERAL_BUTTONS)
+            send(now, "/7/push" + button, [1.0])
+            send(now, "/7/push" + button, [0.0])
+            nextTap = now + 1.0 / options.taps
+
+    while outgoing:
+        sendAt, sequence, datagram = heapq.heappop(outgoing)
+        time.sleep(max(0.0, sendAt - time.time()))
+        sock.sendto(datagram, target)
+        sent += 1
+    print("Sent " + str(sent) + " OSC messages to " + options.host + ":" + str(options.port))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+# tools/verifyharmony.py
+# Movements, Not Chords by Trevor Ritchie
+#
+# Plays every tap the instrument can be asked for and checks what comes out, to gate changes to the hot path:
+# every key and mode, chord numeral, Alt and Make Dominant, family down, across and up, and Off Chord lock,
+# each reached by pressing the buttons through buttonOperations(), then every x and y step the accelerometer reaches
+# through mapAccelerometerToPitch(), obliqueMotion() and contraryMotion(), without handleTouchInput()'s fallbacks.
+# Cases that raise, or voice anything but 1 to 4 notes between 0 and 127, are flagged.
+# Every output is compared with a golden table, tools/harmony.golden.gz, and every difference is reported.
+#
+# Run from the repository folder: python tools/verifyharmony.py [--record]
+# Exits with status 1 if a case is flagged or differs. --record writes the golden table from this run instead,
+# after a change that is meant to change what is played.
+
+import argparse
+import gzip
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import mncengine
+
+GOLDEN_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "harmony.golden.gz")
+MODIFIERS = [(), ("alternate",), ("dominant",), ("alternate", "dominant")]
+FAMILIES = [(), ("familyDown",), ("familyAcross",), ("familyUp",)]
+LOCKS = [(), ("offChord",)]
+REPORT_LIMIT = 20 # cases printed for each kind of problem
+
+# One accelerometer value for every step mapAccelerometerToPitch() maps x or y to, {step: value}.
+# Values come from a scan of -1.0 < value < 1.0, the range handleTouchInput() maps.
+def stepValues(minValue, maxValue, minStep, maxStep):
+    values = {}
+    for index in range(1, 2000):
+        value = -1.0 + index * 0.001
+        values.setdefault(mncengine.mapValue(min(value, 0.0), minValue, maxValue, minStep, maxStep), value)
+    return values
+
+# Every button sequence, [(name of the state, [button...])], a button is [action, arguments...]
+def buttonSequences():
+    sequences = []
+    for numeral in range(1, 9):
+        for modifiers in MODIFIERS:
+            for family in FAMILIES:
+                for lock in LOCKS:
+                    presses = modifiers + family + lock
+                    sequences.append(("%d %s" % (numeral, "+".join(presses) or "-"), [["numeral", numeral]] + [[press] for press in presses]))
+    return sequences
+
+# The output of one case: the chord as "60.64.67.71", or the name of what it raised
+def playCase(session, x, y):
+    try:
+        pitchX, pitchY = session.mapAccelerometerToPitch(x, y, 0.0)
+        session.obliqueMotion(pitchY)
+        return ".".join(str(pitch) for pitch in session.contraryMotion(pitchX))
+    except Exception as error:
+        return type(error).__name__
+
+# Why an output is wrong, or None
+def flag(output):
+    if not output[0].isdigit():
+        return "raised " + output
+    pitches = [int(pitch) for pitch in output.split(".")]
+    if not 1 <= len(pitches) <= 4:
+        return "%d voices" % len(pitches)
+    if min(pitches) < 0 or max(pitches) > 127:
+        return "pitch outside 0-127"
+    return None
+
+# Play every case, returns the table: one line per key, mode and button sequence,
+# "mode semitones state | bass note | output for every (x step, y step)"
+def buildTable():
+    xValues = stepValues(-1.0, 0.1, 0, 9)
+    yValues = stepValues(-1.0, 0.0, 9, 0)
+    steps = [(xStep, yStep, xValues[xStep], yValues[yStep]) for xStep in sorted(xValues) for yStep in sorted(yValues)]
+    sequences = buttonSequences()
+    lines = ["# x steps " + " ".join(str(step) for step in sorted(xValues)) + ", y steps " + " ".join(str(step) for step in sorted(yValues))]
+    for mode in mncengine.MODE_NAMES:
+        for semitones in range(mncengine.OCTAVE):
+            for state, buttons in sequences:
+                session = mncengine.Session(mncengine.MemoryMidiOut(), 0, 1)
+                session.setKey(semitones, mode)
+                for button in buttons:
+                    session.buttonOperations(mncengine.layoutButton(button, state))
+                outputs = [playCase(session, x, y) for xStep, yStep, x, y in steps]
+                bassNote = session.state.bassNote + session.harmony.keyOffset
+                lines.append("%s %d %s | %d | %s" % (mode, semitones, state, bassNote, " ".join(outputs)))
+    return lines, steps
+
+def readGolden():
+    with gzip.open(GOLDEN_FILE, "rt") as goldenFile:
+        return goldenFile.read().splitlines()
+
+def writeGolden(lines):
+    with gzip.GzipFile(GOLDEN_FILE, "wb", mtime=0) as goldenFile: # the same table always writes the same file
+        goldenFile.write(("\n".join(lines) + "\n").encode("ascii"))
+
+# Report the flagged cases and the cases that differ from the golden table, returns how many problems there were
+def check(lines, steps, golden):
+    flagged = []
+    differ = []
+    goldenRows = dict(line.split(" | ", 1) for line in golden[1:]) if golden is not None else {}
+    if golden is not None and golden[:1] != lines[:1]:
+        differ.append("the accelerometer steps changed: " + lines[0][2:])
+    for line in lines[1:]:
+        state, bassNote, outputs = line.split(" | ")
+        outputs = outputs.split(" ")
+        goldenRow = goldenRows.pop(state, None)
+        if golden is not None and goldenRow is None:
+            differ.append(state + ": not in the golden table")
+        elif goldenRow is not None:
+            goldenBass, goldenOutputs = goldenRow.split(" | ")
+            if goldenBass != bassNote:
+                differ.append("%s: bass %s, was %s" % (state, bassNote, goldenBass))
+            goldenOutputs = goldenOutputs.split(" ")
+            for index, output in enumerate(outputs):
+                if output != goldenOutputs[index]:
+                    differ.append("%s, x step %d, y step %d: %s, was %s" % ((state,) + steps[index][:2] + (output, goldenOutputs[index])))
+        for index, output in enumerate(outputs):
+            problem = flag(output)
+            if problem:
+                flagged.append("%s, x step %d, y step %d: %s" % ((state,) + steps[index][:2] + (problem,)))
+    differ.extend(state + ": missing, it is in the golden table" for state in sorted(goldenRows))
+
+    for name, problems in [("flagged", flagged), ("differ from the golden table", differ)]:
+        for problem in problems[:REPORT_LIMIT]:
+            print("  " + problem)
+        if len(problems) > REPORT_LIMIT:
+            print("  ... and %d more" % (len(problems) - REPORT_LIMIT))
+        print("%d %s" % (len(problems), name))
+    return len(flagged) + len(differ)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check every chord the instrument can play against a golden table")
+    parser.add_argument("--record", action="store_true", help="write the golden table from this run")
+    options = parser.parse_args()
+
+    start = time.time()
+    mncengine.precomputeVoicings()
+    lines, steps = buildTable()
+    print("%d cases in %.2f s" % ((len(lines) - 1) * len(steps), time.time() - start))
+
+    if options.record:
+        problems = check(lines, steps, None)
+        writeGolden(lines)
+        print("Recorded " + os.path.relpath(GOLDEN_FILE))
+    else:
+        problems = check(lines, steps, readGolden() if os.path.exists(GOLDEN_FILE) else None)
+        if not os.path.exists(GOLDEN_FILE):
+            print("No golden table yet, record one with --record")
+            problems += 1
+    sys.exit(1 if problems else 0)